@@ -0,0 +1,314 @@
+"""
+离线基准测试用的 akshare 模拟数据
+列名与真实接口保持一致 (中文列名、字符串/数值类型)，scale 控制行数倍数
+"""
+import contextlib
+import datetime
+
+import akshare as ak
+import numpy as np
+import pandas as pd
+
+from config import TARGET_LOFS
+
+# 各接口 1x 规模下的行数 (接近真实接口)
+BASE_ROWS = {
+    "fund_lof_spot_em": 400,
+    "fund_value_estimation_em": 10000,
+    "fund_open_fund_rank_em": 20000,
+    "bond_cov_comparison": 550,
+    "bond_cov_issue_cninfo": 300,
+    "stock_new_ipo_cninfo": 500,
+}
+
+LOF_NAMES = ["纳指科技", "标普500", "国投白银", "华宝油气", "恒生指数", "白酒", "军工", "券商", "新能源车", "黄金"]
+
+
+def _codes(prefix, n, width=6):
+    return [f"{prefix}{i:0{width - len(prefix)}d}" for i in range(n)]
+
+
+def _fund_universe(scale):
+    """全市场基金代码：白名单 + LOF + 其他开放式基金，LOF 是全市场的子集"""
+    n_lof = BASE_ROWS["fund_lof_spot_em"] * scale
+    n_all = BASE_ROWS["fund_open_fund_rank_em"] * scale
+    lof = list(dict.fromkeys(list(TARGET_LOFS) + _codes("16", n_lof, 6 + len(str(scale)) - 1)))[:n_lof]
+    others = _codes("0", n_all - len(lof), 6 + len(str(scale)) - 1)
+    return lof, lof + others
+
+
+def make_lof_spot(scale=1, seed=0):
+    rng = np.random.default_rng(seed)
+    lof, _ = _fund_universe(scale)
+    n = len(lof)
+    close = rng.uniform(0.5, 3.0, n).round(3)
+    price = (close * (1 + rng.normal(0, 0.02, n))).round(3)
+    price[rng.random(n) < 0.05] = np.nan  # 停牌
+    return pd.DataFrame({
+        "代码": lof,
+        "名称": [f"{LOF_NAMES[i % len(LOF_NAMES)]}LOF{i}" for i in range(n)],
+        "最新价": price,
+        "涨跌额": (price - close).round(3),
+        "涨跌幅": ((price - close) / close * 100).round(2),
+        "成交量": rng.integers(0, 500000, n).astype(float),
+        "成交额": rng.lognormal(13, 2, n).round(2),
+        "开盘价": close,
+        "最高价": np.maximum(price, close),
+        "最低价": np.minimum(price, close),
+        "昨收": close,
+        "换手率": rng.uniform(0, 5, n).round(2),
+        "流通市值": rng.lognormal(19, 1, n).round(0),
+        "总市值": rng.lognormal(19, 1, n).round(0),
+    })
+
+
+# 各名称模板对应的天天基金类型
+LOF_FUND_TYPES = {"纳指科技": "QDII-指数", "标普500": "指数型-海外股票", "国投白银": "商品（不含QDII）",
+                  "华宝油气": "QDII-指数", "恒生指数": "QDII-指数", "黄金": "QDII-商品"}
+
+
+def make_fund_names(scale=1):
+    """全市场基金名称/类型 (fund_name_em)，LOF 的类型与行情表里的名称模板一致"""
+    lof, universe = _fund_universe(scale)
+    types = [LOF_FUND_TYPES.get(LOF_NAMES[i % len(LOF_NAMES)], "指数型-股票") for i in range(len(lof))]
+    types += ["混合型-偏股"] * (len(universe) - len(lof))
+    return pd.DataFrame({
+        "基金代码": universe,
+        "拼音缩写": "",
+        "基金简称": [f"基金{c}" for c in universe],
+        "基金类型": types,
+        "拼音全称": "",
+    })
+
+
+def make_value_estimation(scale=1, seed=1):
+    rng = np.random.default_rng(seed)
+    lof, universe = _fund_universe(scale)
+    n = BASE_ROWS["fund_value_estimation_em"] * scale
+    # 白银等商品基没有实时估值
+    codes = [c for c in universe if c != "161226"][:n]
+    n = len(codes)
+    cal_day = datetime.date.today().strftime("%Y-%m-%d")
+    value_day = (datetime.date.today() - datetime.timedelta(days=1)).strftime("%Y-%m-%d")
+    nav = rng.uniform(0.5, 3.0, n)
+    est = nav * (1 + rng.normal(0, 0.01, n))
+    est_str = np.char.mod("%.4f", est).astype(object)
+    est_str[rng.random(n) < 0.03] = "---"
+    return pd.DataFrame({
+        "序号": np.arange(1, n + 1),
+        "基金代码": codes,
+        "基金名称": [f"基金{c}" for c in codes],
+        f"{cal_day}-估算数据-估算值": est_str,
+        f"{cal_day}-估算数据-估算增长率": np.char.mod("%.2f%%", rng.normal(0, 1, n)),
+        f"{cal_day}-公布数据-单位净值": "",
+        f"{cal_day}-公布数据-日增长率": "",
+        "估算偏差": "",
+        f"{value_day}-单位净值": np.char.mod("%.4f", nav),
+    })
+
+
+def make_fund_rank(scale=1, seed=2):
+    rng = np.random.default_rng(seed)
+    _, universe = _fund_universe(scale)
+    n = len(universe)
+    nav_date = datetime.date.today() - datetime.timedelta(days=1)
+    df = pd.DataFrame({
+        "序号": np.arange(1, n + 1),
+        "基金代码": universe,
+        "基金简称": [f"基金{c}" for c in universe],
+        "日期": [nav_date] * n,
+        "单位净值": rng.uniform(0.5, 3.0, n).round(4),
+        "累计净值": rng.uniform(0.5, 5.0, n).round(4),
+        "日增长率": rng.normal(0, 1, n).round(2),
+    })
+    for col in ["近1周", "近1月", "近3月", "近6月", "近1年", "近2年", "近3年", "今年来", "成立来", "自定义"]:
+        df[col] = rng.normal(0, 10, n).round(2)
+    df["手续费"] = "0.15%"
+    return df
+
+
+def make_cb_comparison(scale=1, seed=3):
+    rng = np.random.default_rng(seed)
+    n = BASE_ROWS["bond_cov_comparison"] * scale
+    conv_price = rng.uniform(3, 50, n).round(2)
+    stock_price = (conv_price * rng.uniform(0.4, 1.6, n)).round(2)
+    conv_value = (stock_price / conv_price * 100).round(2)
+    price = np.maximum(conv_value * rng.uniform(1.0, 1.6, n), rng.uniform(95, 115, n)).round(3)
+    return pd.DataFrame({
+        "序号": np.arange(1, n + 1),
+        "转债代码": _codes("11", n, 6 + len(str(scale)) - 1),
+        "转债名称": [f"转债{i}" for i in range(n)],
+        "转债最新价": price,
+        "转债涨跌幅": rng.normal(0, 1, n).round(2),
+        "正股代码": _codes("60", n, 6 + len(str(scale)) - 1),
+        "正股名称": [f"正股{i}" for i in range(n)],
+        "正股最新价": stock_price,
+        "正股涨跌幅": rng.normal(0, 2, n).round(2),
+        "转股价": conv_price,
+        "转股价值": conv_value,
+        "转股溢价率": ((price / conv_value - 1) * 100).round(2),
+        "纯债溢价率": rng.uniform(0, 60, n).round(2),
+        "回售触发价": (conv_price * 0.7).round(2),
+        "强赎触发价": (conv_price * 1.3).round(2),
+        "到期赎回价": rng.uniform(106, 115, n).round(2),
+        "纯债价值": rng.uniform(85, 105, n).round(2),
+        "开始转股日": "20240101",
+        "上市日期": "20230601",
+        "申购日期": "20230501",
+    })
+
+
+def make_bond_issue_cninfo(scale=1, seed=4):
+    rng = np.random.default_rng(seed)
+    n = BASE_ROWS["bond_cov_issue_cninfo"] * scale
+    today = datetime.date.today()
+    days = [today - datetime.timedelta(days=int(d)) for d in rng.integers(0, 365, n)]
+    return pd.DataFrame({
+        "债券代码": _codes("12", n, 6 + len(str(scale)) - 1),
+        "债券简称": [f"新债{i}" for i in range(n)],
+        "公告日期": days,
+        "发行起始日": days,
+        "发行终止日": days,
+        "计划发行总量": rng.uniform(1e4, 1e6, n).round(0),
+        "发行面值": 100.0,
+        "发行价格": 100.0,
+        "初始转股价格": rng.uniform(3, 50, n).round(2),
+        "网上申购日期": days,
+        "网上申购代码": _codes("07", n, 6 + len(str(scale)) - 1),
+        "交易市场": "上交所",
+        "债券名称": [f"新债{i}转债" for i in range(n)],
+    })
+
+
+def make_stock_ipo_cninfo(scale=1, seed=5):
+    rng = np.random.default_rng(seed)
+    n = BASE_ROWS["stock_new_ipo_cninfo"] * scale
+    today = datetime.date.today()
+    days = [today - datetime.timedelta(days=int(d)) for d in rng.integers(-10, 365, n)]
+    return pd.DataFrame({
+        "证劵代码": _codes("30", n, 6 + len(str(scale)) - 1),
+        "证券简称": [f"新股{i}" for i in range(n)],
+        "上市日期": days,
+        "申购日期": days,
+        "发行价": rng.uniform(5, 80, n).round(2),
+        "总发行数量": rng.uniform(1e3, 1e5, n).round(0),
+        "发行市盈率": rng.uniform(10, 60, n).round(2),
+        "上网发行中签率": rng.uniform(0.01, 0.1, n).round(4),
+    })
+
+
+def make_stock_news(symbol="600000", seed=6):
+    rng = np.random.default_rng(seed)
+    now = datetime.datetime.now()
+    titles = ["关于向下修正转股价格的提示性公告", "关于不向下修正转股价格的公告", "年度报告摘要", "股东减持计划公告"]
+    return pd.DataFrame({
+        "关键词": symbol,
+        "新闻标题": [titles[i] for i in rng.integers(0, len(titles), 10)],
+        "新闻内容": "",
+        "发布时间": [(now - datetime.timedelta(days=int(d))).strftime("%Y-%m-%d %H:%M:%S") for d in range(10)],
+        "文章来源": "东方财富",
+        "新闻链接": "",
+    })
+
+
+def make_fund_fee(symbol="161128", indicator="赎回费率"):
+    """单只基金费率表 (fund_fee_em)，申购费/赎回费分档与天天基金页面同构"""
+    if indicator == "赎回费率":
+        return pd.DataFrame({
+            "适用金额": "---",
+            "适用期限": ["小于7天", "大于等于7天，小于30天", "大于等于30天，小于1年", "大于等于1年"],
+            "赎回费率": ["1.50%", "0.75%", "0.50%", "0.00%"],
+        })
+    return pd.DataFrame({
+        "适用金额": ["小于100万元", "大于等于100万元，小于500万元", "大于等于500万元"],
+        "适用期限": "---",
+        "原费率": ["1.20%", "0.80%", "每笔1000元"],
+        "天天基金优惠费率-银行卡购买": ["0.12%", "0.08%", "每笔1000元"],
+        "天天基金优惠费率-活期宝购买": ["0.12%", "0.08%", "每笔1000元"],
+    })
+
+
+def make_proxy_quotes(symbols, seed=7):
+    """代理估值用的标的行情 (期货/指数/汇率)，与 SinaQuoteClient.fetch_proxies 的输出同构"""
+    rng = np.random.default_rng(seed)
+    prev_close = rng.uniform(5, 8000, len(symbols)).round(2)
+    return pd.DataFrame({
+        "proxy": symbols,
+        "name": [f"标的{s}" for s in symbols],
+        "price": (prev_close * (1 + rng.normal(0, 0.01, len(symbols)))).round(2),
+        "prev_close": prev_close,
+    })
+
+
+def make_fixtures(scale=1):
+    """生成一整套 scale 倍规模的接口数据 {akshare 函数名: DataFrame}"""
+    return {
+        "fund_lof_spot_em": make_lof_spot(scale),
+        "fund_value_estimation_em": make_value_estimation(scale),
+        "fund_open_fund_rank_em": make_fund_rank(scale),
+        "fund_name_em": make_fund_names(scale),
+        "bond_cov_comparison": make_cb_comparison(scale),
+        "bond_cov_issue_cninfo": make_bond_issue_cninfo(scale),
+        "stock_new_ipo_cninfo": make_stock_ipo_cninfo(scale),
+    }
+
+
+@contextlib.contextmanager
+def offline_akshare(fixtures):
+    """
+    临时把 ak.* 替换成返回模拟数据的函数，代理估值的标的行情也改为模拟数据，
+    并关闭 _call_api 的限速等待、本地缓存、数据源统计、估值锚点、LOF 分类索引和费率表落盘
+    每次调用返回副本，避免调用方的 inplace 修改污染下一轮
+    """
+    import utils.cache as cache
+    import utils.data_fetcher as data_fetcher
+
+    def _fake(name, df):
+        def func(*args, **kwargs):
+            return df.copy()
+        func.__name__ = name
+        return func
+
+    fakes = {name: _fake(name, df) for name, df in fixtures.items()}
+    fakes["stock_news_em"] = _fake("stock_news_em", make_stock_news())
+    fakes["fund_fee_em"] = make_fund_fee
+
+    saved_ak = {name: getattr(ak, name) for name in fakes}
+    limiter = data_fetcher._limiter
+    saved_limiter = (limiter._sleep, limiter._buckets, limiter.state_file)
+    saved_bypass = cache.CACHE_BYPASS
+    saved_put = data_fetcher.cache_put
+    stats = data_fetcher._provider_stats
+    saved_stats_file = stats.state_file
+    quote_client = data_fetcher._quote_client
+    anchors = data_fetcher._anchors
+    saved_anchors = (anchors.state_file, anchors._anchors)
+    lof_index = data_fetcher._lof_index
+    saved_index = (lof_index.state_file, lof_index._entries)
+    fee_store = data_fetcher._fee_store
+    saved_fees = (fee_store.state_file, fee_store._fees)
+    try:
+        for name, func in fakes.items():
+            setattr(ak, name, func)
+        limiter._sleep = lambda seconds: None
+        limiter._buckets = {}
+        limiter.state_file = None
+        cache.CACHE_BYPASS = True
+        data_fetcher.cache_put = lambda *args, **kwargs: None
+        stats.state_file = None
+        quote_client.fetch_proxies = make_proxy_quotes
+        anchors.state_file, anchors._anchors = None, {}
+        lof_index.state_file, lof_index._entries = None, {}
+        fee_store.state_file, fee_store._fees = None, {}
+        yield
+    finally:
+        for name, func in saved_ak.items():
+            setattr(ak, name, func)
+        limiter._sleep, limiter._buckets, limiter.state_file = saved_limiter
+        cache.CACHE_BYPASS = saved_bypass
+        data_fetcher.cache_put = saved_put
+        stats.state_file = saved_stats_file
+        del quote_client.fetch_proxies
+        anchors.state_file, anchors._anchors = saved_anchors
+        lof_index.state_file, lof_index._entries = saved_index
+        fee_store.state_file, fee_store._fees = saved_fees
@@ -0,0 +1,157 @@
+"""
+离线基准测试：用模拟的 akshare 数据给各阶段计时，并记录峰值内存
+用法：
+  python -m benchmarks.run                       # 1x/10x/100x 全部跑一遍并与基线对比
+  python -m benchmarks.run --scales 1,10         # 只跑部分规模
+  python -m benchmarks.run --update-baseline     # 把本次结果写为新基线
+发现退化 (耗时或峰值内存超过基线容差) 时退出码为 1
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+from tabulate import tabulate
+
+from benchmarks.fixtures import make_fixtures, offline_akshare
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+DEFAULT_SCALES = [1, 10, 100]
+REPEAT = 3                 # 每个阶段重复次数，取最快的一次
+TIME_TOLERANCE = 0.25      # 耗时超过基线 25% 视为退化
+MEMORY_TOLERANCE = 0.10    # 峰值内存超过基线 10% 视为退化
+MIN_TIME = 0.005           # 小于该耗时(秒)的阶段噪声太大，不参与耗时对比
+
+
+def _stages():
+    """按执行顺序返回 (阶段名, 函数)，函数接收上一阶段的上下文 dict"""
+    from main import filter_opportunities
+    from utils.cb_pricing import attach_theoretical_values
+    from utils.data_fetcher import fetch_cb_data, fetch_lof_data
+    from utils.formatter import format_text_report
+    from utils.strategy import filter_double_low_cb
+
+    def lof_merge(ctx):
+        ctx["lof_df"] = fetch_lof_data()
+
+    def lof_filter(ctx):
+        ctx["lof_opps"] = filter_opportunities(ctx["lof_df"])
+
+    def cb_fetch(ctx):
+        ctx["cb_df"] = fetch_cb_data()
+
+    def cb_price(ctx):
+        ctx["cb_priced"] = attach_theoretical_values(ctx["cb_df"])
+
+    def cb_filter(ctx):
+        ctx["cb_opps"] = filter_double_low_cb(ctx["cb_priced"], limit=5)
+
+    def report(ctx):
+        ctx["report"] = format_text_report(ctx["lof_df"], ctx["lof_opps"], ctx["cb_opps"],
+                                           {"stocks": [], "bonds": []}, [])
+
+    return [
+        ("fetch_lof_data", lof_merge),
+        ("filter_opportunities", lof_filter),
+        ("fetch_cb_data", cb_fetch),
+        ("price_convertibles", cb_price),
+        ("filter_double_low_cb", cb_filter),
+        ("format_text_report", report),
+    ]
+
+
+def _measure(func, ctx):
+    """返回 (最快耗时秒数, 峰值内存字节)，阶段自身的打印输出被吞掉"""
+    best = float("inf")
+    for _ in range(REPEAT):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            func(ctx)
+            best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            func(ctx)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return best, peak
+
+
+def run(scales):
+    results = {}
+    stages = _stages()
+    for scale in scales:
+        print(f"⚙️ 生成 {scale}x 模拟数据...")
+        fixtures = make_fixtures(scale)
+        ctx = {}
+        with offline_akshare(fixtures):
+            for name, func in stages:
+                seconds, peak = _measure(func, ctx)
+                results[f"{name}@{scale}x"] = {"seconds": seconds, "peak_bytes": peak}
+    return results
+
+
+def compare(results, baseline):
+    """返回 (表格行, 退化列表)"""
+    rows = []
+    regressions = []
+    for key, cur in results.items():
+        base = baseline.get(key)
+        flag = ""
+        if base:
+            slow = cur["seconds"] > base["seconds"] * (1 + TIME_TOLERANCE) and cur["seconds"] > MIN_TIME
+            fat = cur["peak_bytes"] > base["peak_bytes"] * (1 + MEMORY_TOLERANCE)
+            if slow or fat:
+                flag = "❌ " + ("耗时" if slow else "") + ("内存" if fat else "")
+                regressions.append(key)
+        rows.append([
+            key,
+            f"{cur['seconds'] * 1000:.1f}",
+            f"{base['seconds'] * 1000:.1f}" if base else "-",
+            f"{cur['peak_bytes'] / 1024 / 1024:.1f}",
+            f"{base['peak_bytes'] / 1024 / 1024:.1f}" if base else "-",
+            flag,
+        ])
+    return rows, regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="LOF/可转债 流水线离线基准测试")
+    parser.add_argument("--scales", default=",".join(str(s) for s in DEFAULT_SCALES),
+                        help="数据规模倍数，逗号分隔")
+    parser.add_argument("--update-baseline", action="store_true", help="把本次结果写为基线")
+    args = parser.parse_args(argv)
+
+    scales = [int(s) for s in args.scales.split(",") if s]
+    results = run(scales)
+
+    baseline = {}
+    if os.path.exists(BASELINE_FILE):
+        with open(BASELINE_FILE, "r") as f:
+            baseline = json.load(f)
+
+    rows, regressions = compare(results, baseline)
+    print(tabulate(rows, headers=["阶段@规模", "耗时ms", "基线ms", "峰值MB", "基线MB", ""], stralign="right"))
+
+    if args.update_baseline:
+        baseline.update(results)
+        with open(BASELINE_FILE, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"💾 基线已更新: {BASELINE_FILE}")
+        return 0
+
+    if regressions:
+        print(f"❌ 发现 {len(regressions)} 项性能退化: {', '.join(regressions)}")
+        return 1
+    print("✅ 未发现性能退化。")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
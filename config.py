@@ -13,17 +13,81 @@ if not WECOM_WEBHOOK_URL:
 # 如果你的券商没有免五，或者申购费不打折，请调高此值
 COST_RATE = 0.20  # 0.2%
 
+# --- 净套利测算 (utils/fees.py) ---
+# 有费率表的基金按 实际申购费/赎回费 + 佣金 + 资金占用成本 计算净收益并排序，没有费率表的仍扣 COST_RATE
+COMMISSION_RATE = 0.03        # 场内买卖佣金(%)
+SUBSCRIBE_FEE_DISCOUNT = 0.1  # 申购费折扣 (券商/代销渠道通常 1 折)
+CAPITAL_COST_RATE = 2.0       # 资金占用的年化成本(%)，参考逆回购利率
+FEE_REFRESH_MAX = 20          # 每次运行最多刷新多少只基金的费率表 (溢价/折价幅度大的优先，每只 2 次请求)
+
 # --- 筛选门槛 ---
 MIN_VOLUME = 500000        # 最小成交额 (50万)
 THRESHOLD_QDII = 3.5       # QDII 溢价报警线 (因为有T+2风险，要求高)
-THRESHOLD_LOCAL = 2.0      # 国内/商品LOF 报警线
+THRESHOLD_LOCAL = 2.0      # 国内LOF 报警线
+THRESHOLD_COMMODITY = 2.0  # 国内商品LOF 报警线 (白银/黄金等，无实时估值)
+
+# --- 折价门槛 (场内买入 -> 赎回，赎回费较高，门槛按折价幅度%计，None 表示不看折价) ---
+DISCOUNT_QDII = 3.0
+DISCOUNT_LOCAL = 2.0
+DISCOUNT_COMMODITY = 2.0
+
+# --- 全市场扫描 ---
+# True: 全部 LOF 按分类索引 (utils/lof_index.py，按基金类型自动识别 QDII/商品/国内) 一次性筛选溢价和折价
+# False: 只看下方 TARGET_LOFS 白名单，类型以白名单里手工填写的为准
+LOF_UNIVERSE_SCAN = True
+
+# --- 历史分位数门槛 (可选) ---
+# 设置后，历史样本充足的基金改用"当前溢价处于自身历史第 N 百分位以上"作为报警条件
+# 历史不足的基金仍使用上面的固定门槛；None 表示完全使用固定门槛
+PREMIUM_PERCENTILE_ALERT = None    # 例如 95
+PREMIUM_PERCENTILE_LOOKBACK = 365  # 回看天数
+
+# --- 窄抓取 (可选) ---
+# True: 只为白名单基金逐只请求估值/净值，不再下载两张全市场大表，速度快、内存小
+#       但日报里的"全市场溢价 Top10"也只会在白名单内排名
+# 白名单超过 data_fetcher.NARROW_FETCH_MAX 只时自动退回全表抓取
+LOF_NARROW_FETCH = False
+
+# --- 代理估值 ---
+# 没有实时估值的基金 (商品基、部分 QDII)，用 最新官方净值 x 跟踪标的实时涨跌 (x 汇率变动) 自算 IOPV
+# proxy: 新浪行情代码 (nf_ 国内期货 / hf_ 外盘期货 / gb_ 美股及指数 / rt_hk 港股 / sh sz 指数)
+# weight: 仓位，标的涨跌传导到净值的比例；fx: 外币资产的汇率代码，人民币资产不填
+IOPV_PROXIES = {
+    '161226': {"proxy": "nf_AG0", "weight": 0.95},                          # 国投白银 -> 沪银主力
+    '161116': {"proxy": "hf_GC", "weight": 0.95, "fx": "fx_susdcny"},       # 易方达黄金 -> COMEX 黄金
+    '164701': {"proxy": "hf_GC", "weight": 0.95, "fx": "fx_susdcny"},       # 汇添富黄金 -> COMEX 黄金
+    '160723': {"proxy": "hf_CL", "weight": 0.95, "fx": "fx_susdcny"},       # 嘉实原油 -> NYMEX 原油
+    '161129': {"proxy": "hf_CL", "weight": 0.95, "fx": "fx_susdcny"},       # 广发石油 -> NYMEX 原油
+    '162411': {"proxy": "gb_xop", "weight": 0.95, "fx": "fx_susdcny"},      # 华宝油气 -> XOP
+}
+# True: 映射基金一律用代理估值 (覆盖天天基金的实时估值)；False: 只给没有实时估值的基金补上
+IOPV_PROXY_OVERRIDE = False
+
+# --- 策略规则 (可选) ---
+# LOF 标签/建议、可转债筛选/评级、逆回购标签的规则默认写在 utils/strategy.py (LOF_RULES / CB_RULES / REPO_RULES)
+# 填 YAML 文件路径可覆盖同名策略 (顶层键 lof / cb / repo，写法见 utils/rules.py)，不改代码即可调整策略
+# 需要安装 PyYAML
+STRATEGY_RULES_FILE = None
+
+# --- 多账户 (可选) ---
+# 行情只抓一次，按每个账户的白名单/门槛/费率/可转债条件各出一份报告，推送到各自的 Webhook
+# 未填写的字段沿用本文件的全局设置；列表为空时只有一个默认账户
+# 可用字段：name, whitelist (None 表示全市场扫描), cost_rate, min_volume, threshold_qdii, threshold_local,
+#          threshold_commodity, discount_qdii, discount_local, discount_commodity, percentile, commission,
+#          cb_limit, cb_price_low, cb_price_high, cb_min_volume, webhook
+PROFILES = [
+    # {"name": "低佣账户", "cost_rate": 0.12, "threshold_local": 1.5,
+    #  "webhook": os.environ.get("WECOM_WEBHOOK_URL_B", "")},
+    # {"name": "QDII专户", "whitelist": {'161128': 'QDII', '161130': 'QDII'}, "cb_limit": 0},
+]
 
 
 # 全局配置
 MIN_VOLUME = 500000  # 最小成交额 50万 (过滤流动性差的)
 
 # 监控白名单 (你关注的核心标的)
-# 格式: '代码': '类型' (QDII 或 LOCAL)
+# 格式: '代码': '类型' (QDII / LOCAL / COMMODITY)
+# LOF_UNIVERSE_SCAN = True 时白名单只用于窄抓取，筛选和回测覆盖全市场 (类别取自 LOF 分类索引)
 TARGET_LOFS = {
     # ==============================
     # 🟢 第一梯队：美股/全球科技 (QDII)
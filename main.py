@@ -1,73 +1,122 @@
 import datetime
+import functools
+import importlib
 import os
+import sys
+import time
 
-from config import TARGET_LOFS, MIN_VOLUME, THRESHOLD_QDII, THRESHOLD_LOCAL, WECOM_WEBHOOK_URL
-from utils.data_fetcher import fetch_lof_data, fetch_cb_data, fetch_today_ipo, fetch_repo_data
-from utils.strategy import analyze_single_lof, filter_double_low_cb, analyze_repo_strategy
-from utils.formatter import format_text_report
-from utils.notifier import send_wecom_webhook
+# 快速启动：这里只导入标准库和轻量模块
+# akshare/pandas/tabulate 等重依赖要好几秒，留到通过 "今日已完成/执行窗口" 检查之后再加载
+from config import TARGET_LOFS, COST_RATE, MIN_VOLUME, THRESHOLD_QDII, THRESHOLD_LOCAL, WECOM_WEBHOOK_URL
+from config import PREMIUM_PERCENTILE_ALERT, PREMIUM_PERCENTILE_LOOKBACK, LOF_NARROW_FETCH
+from utils import profiler
+from utils.checkpoint import CheckpointStore
+
+# 窄抓取模式只抓白名单基金的估值/净值
+LOF_FETCH_SYMBOLS = list(TARGET_LOFS) if LOF_NARROW_FETCH else None
 
 # --- 时间窗口配置 ---
 EXEC_START_HOUR = 9       # 执行窗口开始 (14:00)
 EXEC_END_HOUR = 18        # 执行窗口结束 (15:00)
-MARK_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".today_done")
+# 运行检查点库 (SQLite)：各阶段结果/状态按交易日保存，中途失败后重跑从没完成的阶段继续
+STATE_DB = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".run_state.db")
+# 已完成阶段结果的有效期(秒)，超过后重跑时重新抓取；未列出的当日一直有效
+STAGE_FRESHNESS = {
+    "repo": 600,       # 逆回购利率盘中变化快
+    "lof": 1800,
+    "cb": 1800,
+}
+# 推送失败的消息存放处 (与 utils.notifier.OUTBOX_FILE 相同)，入口处只判断文件是否存在，不提前加载推送模块
+OUTBOX_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".notify_outbox.json")
+
+# --- 延迟加载配置 ---
+# 按顺序计时导入，先导入底层库，后面模块里的同名导入就不再重复计入
+HEAVY_MODULES = ["numpy", "pandas", "requests", "tabulate", "akshare"]
+# 设置环境变量 LOF_IMPORT_TIMES=1 (或命令行 --import-times) 打印各模块导入耗时
+SHOW_IMPORT_TIMES = os.environ.get("LOF_IMPORT_TIMES", "") not in ("", "0")
 
 
-def filter_opportunities(df):
+def load_modules(show=SHOW_IMPORT_TIMES):
     """
-    根据白名单和阈值筛选机会
+    导入重依赖和数据源/策略模块，每个模块记一个 import:模块名 区间
+    show=True 时打印导入耗时明细
     """
-    opps = []
-
-    # 遍历白名单配置
-    for code, lof_type in TARGET_LOFS.items():
-        # 在大表中找数据
-        matches = df[df['symbol'] == code]
-        if matches.empty: continue
-
-        row = matches.iloc[0]
+    timings = {}
+    for name in HEAVY_MODULES + ["utils.data_fetcher", "utils.strategy", "utils.formatter",
+                                 "utils.history", "utils.notifier", "utils.orchestrator", "utils.watcher"]:
+        start = time.perf_counter()
+        with profiler.span(f"import:{name}"):
+            importlib.import_module(name)
+        timings[name] = time.perf_counter() - start
 
-        # 基础过滤
-        if row['volume'] < MIN_VOLUME: continue
+    if show:
+        summary = " | ".join(f"{name.replace('utils.', '')} {seconds:.2f}s" for name, seconds in timings.items())
+        print(f"📦 导入耗时: {summary} | 总计 {sum(timings.values()):.2f}s")
+    return timings
 
-        threshold = THRESHOLD_QDII if lof_type == 'QDII' else THRESHOLD_LOCAL
 
-        if row['premium_rate'] > threshold:
-            # 调用策略分析
-            analysis = analyze_single_lof(row)
-
-            opps.append({
-                "code": code,
-                "name": row['name'],
-                "price": row['price'],
-                "premium": round(row['premium_rate'], 2),
-                "volume": int(row['volume']),
-                "tag": analysis['risk_tag'],
-                "net_prem": analysis['net_premium'],
-                "advice": analysis['advice']
-            })
+@profiler.timed()
+def filter_opportunities(df, whitelist=None, min_volume=MIN_VOLUME,
+                         threshold_qdii=THRESHOLD_QDII, threshold_local=THRESHOLD_LOCAL,
+                         percentile=PREMIUM_PERCENTILE_ALERT):
+    """
+    根据白名单和阈值筛选机会 (按 symbol 连接 + 整列运算)
+    whitelist: {'代码': '类型'}，默认按 config.LOF_UNIVERSE_SCAN 扫描全市场或使用 config.TARGET_LOFS
+    percentile: 若 df 带有 premium_pctl 列，历史充足的基金改用分位数门槛
+    """
+    from utils.profiles import default_profile, evaluate_lof_profiles
 
-    # 按溢价率排序
-    opps.sort(key=lambda x: x['premium'], reverse=True)
-    return opps
+    profile = {
+        **default_profile(),
+        "name": "_",
+        "cost_rate": COST_RATE,
+        "min_volume": min_volume,
+        "threshold_qdii": threshold_qdii,
+        "threshold_local": threshold_local,
+        "percentile": percentile,
+    }
+    if whitelist is not None:
+        profile["whitelist"] = whitelist
+    # 单账户即批量评估的特例，规则只维护一份
+    return evaluate_lof_profiles(df, [profile])["_"]
 
 
 def is_today_done():
     """检查今日是否已成功执行过"""
-    if not os.path.exists(MARK_FILE):
-        return False
     try:
-        with open(MARK_FILE, "r") as f:
-            done_date = f.read().strip()
-        return done_date == datetime.datetime.now().strftime("%Y-%m-%d")
-    except:
+        return CheckpointStore(STATE_DB).day_done()
+    except Exception as e:
+        print(f"⚠️ 检查点库读取失败，按未完成处理: {e}")
         return False
 
 
-def mark_today_done():
+def mark_today_done(store=None):
     """标记今日已成功执行"""
-    with open(MARK_FILE, "w") as f:
-        f.write(datetime.datetime.now().strftime("%Y-%m-%d"))
+    (store or CheckpointStore(STATE_DB)).mark_day_done()
+
+
+def print_ledger(day=None):
+    """打印某个交易日的运行台账 (python main.py --ledger [YYYY-MM-DD])"""
+    store = CheckpointStore(STATE_DB, day=day)
+    rows = store.ledger()
+    if not rows:
+        print(f"📒 {store.day} 没有运行记录。")
+        return
+    print(f"📒 {store.day} 运行台账:")
+    last_run = None
+    for run_id, run_status, stage, status, seconds, count, error, at in rows:
+        if run_id != last_run:
+            print(f"  #{run_id} [{run_status}]")
+            last_run = run_id
+        if stage is None:
+            continue
+        clock = datetime.datetime.fromtimestamp(at).strftime("%H:%M:%S")
+        detail = "".join([
+            f" {seconds:.1f}s" if seconds else "",
+            f" {count}行" if count is not None else "",
+            f" ({error})" if error else "",
+        ])
+        print(f"    {clock} {stage:<16} {status}{detail}")
 
 
 def is_in_exec_window():
@@ -76,60 +125,164 @@ def is_in_exec_window():
     return EXEC_START_HOUR <= now.hour < EXEC_END_HOUR
 
 
-if __name__ == "__main__":
-    print(">>> 启动 A股全能挖掘机 <<<")
+def run_watch():
+    """盘中盯盘模式：执行窗口内循环刷新 LOF 行情，出现新机会即推送"""
+    from utils.formatter import format_watch_alert
+    from utils.notifier import send_wecom_webhook
+    from utils.watcher import LofWatcher
 
-    # 检查今日是否已完成
-    if is_today_done():
-        print("✅ 今日已成功执行过，无需重复运行。")
-        exit(0)
+    def notify(alerts):
+        text = format_watch_alert(alerts)
+        print(text)
+        send_wecom_webhook(WECOM_WEBHOOK_URL, "LOF 盘中提醒", text)
 
-    # 检查是否在执行时间窗口内
-    if not is_in_exec_window():
-        now = datetime.datetime.now()
-        print(f"⏰ 当前时间 {now.strftime('%H:%M')}，不在执行窗口 {EXEC_START_HOUR}:00~{EXEC_END_HOUR}:00 内，今日放弃。")
-        exit(0)
+    watcher = LofWatcher(filter_opportunities, notify, symbols=LOF_FETCH_SYMBOLS)
+    watcher.run(keep_running=is_in_exec_window)
 
-    # 1. [新增] 获取今日打新数据
-    ipo_data = fetch_today_ipo()
+
+def run_daily():
+    """
+    每日主流程：并发抓取 -> 策略筛选 -> 入历史库 -> 生成报告推送
+    每个阶段完成后写检查点；同一交易日重跑时复用有效期内的抓取结果，已入库/已推送的不再重复
+    """
+    import pandas as pd
+    from utils.cb_pricing import attach_theoretical_values
+    from utils.data_fetcher import fetch_lof_data, fetch_cb_data, fetch_today_ipo, fetch_repo_data
+    from utils.strategy import analyze_repo_strategy
+    from utils.formatter import format_text_report
+    from utils.history import premium_percentile, record_snapshots
+    from utils.notifier import send_wecom_webhook
+    from utils.orchestrator import run_stages
+    from utils.profiles import evaluate_cb_profiles, evaluate_lof_profiles, load_profiles
+
+    # 行情只抓一次，所有账户共用
+    profiles = load_profiles()
+    store = CheckpointStore(STATE_DB)
+    run_id = store.start_run()
+
+    # 1~4. 并发获取 打新 / 国债逆回购 / LOF / 可转债 数据
+    # 东财、巨潮、新浪互不等待，总耗时约等于最慢的那个数据源
+    # 本交易日已完成且仍在有效期内的阶段直接复用检查点
+    reused, pending = store.resume(run_id, {
+        "ipo": fetch_today_ipo,
+        "repo": fetch_repo_data,
+        "lof": functools.partial(fetch_lof_data, symbols=LOF_FETCH_SYMBOLS),
+        "cb": fetch_cb_data,
+    }, freshness=STAGE_FRESHNESS)
+    if reused:
+        print(f"♻️ 复用今日已完成的阶段: {', '.join(reused)}")
+    stage_results = dict(reused)
+    if pending:
+        fetched, _ = run_stages(
+            pending,
+            fallbacks={
+                "ipo": {"stocks": [], "bonds": []},
+                "repo": pd.DataFrame(),
+                "lof": pd.DataFrame(),
+                "cb": pd.DataFrame(),
+            },
+        )
+        stage_results.update(fetched)
+    ipo_data = stage_results["ipo"]
 
     # 2.国债逆回购
-    repo_df = fetch_repo_data()
+    repo_df = stage_results["repo"]
     repo_opps = []
     if not repo_df.empty:
         repo_opps = analyze_repo_strategy(repo_df)
 
-    # 3. 获取 LOF 数据
-    lof_df = fetch_lof_data()
-    lof_opps = []
+    # 3. LOF 机会筛选 (所有账户一次批量评估)
+    lof_df = stage_results["lof"]
+    lof_results = {p["name"]: [] for p in profiles}
     if not lof_df.empty:
+        # 有账户开启分位数门槛时，先算出当前溢价在各自历史中的位置
+        if any(p["percentile"] is not None for p in profiles):
+            lof_df['premium_pctl'] = premium_percentile(lof_df, PREMIUM_PERCENTILE_LOOKBACK)
         # 使用全市场扫描模式 (我们在上一步讨论过的优化)
-        lof_opps = filter_opportunities(lof_df)
+        lof_results = evaluate_lof_profiles(lof_df, profiles)
 
-    # 4. 获取 可转债 数据
-    cb_df = fetch_cb_data()
-    cb_opps = []
+    # 4. 可转债 理论定价 (全市场二叉树，独立于抓取阶段) + 双低筛选
+    cb_df = stage_results["cb"]
+    cb_results = {p["name"]: [] for p in profiles}
     if not cb_df.empty:
-        cb_opps = filter_double_low_cb(cb_df, limit=5)
-
-    # 5. 生成综合报告
-    # 只要有任意一种机会，就发送推送
-    has_opportunity = (
-            (ipo_data['stocks'] or ipo_data['bonds']) or
-            repo_opps or
-            lof_opps or
-            cb_opps
-    )
-
-    if has_opportunity:
-        # 注意参数顺序要对应 formatter 的定义
-        report_text = format_text_report(lof_df, lof_opps, cb_opps, ipo_data,repo_opps)
-
-        print(report_text)  # 本地预览
-        send_wecom_webhook(WECOM_WEBHOOK_URL, "A股投资日报", report_text)
-    else:
-        print("今日全市场静悄悄，无任何机会。")
+        cb_df = attach_theoretical_values(cb_df)
+        cb_results = evaluate_cb_profiles(cb_df, profiles)
+
+    # 保存本次快照到历史库 (只追加)，本交易日已入库的不再重复追加
+    store.step(run_id, "history", lambda: record_snapshots({"lof": lof_df, "cb": cb_df}))
+
+    # 5. 每个账户生成各自的综合报告
+    for profile in profiles:
+        name = profile["name"]
+        lof_opps, cb_opps = lof_results[name], cb_results[name]
+        single = len(profiles) == 1
+        title = "A股投资日报" if single else f"A股投资日报 · {name}"
+
+        # 只要有任意一种机会，就发送推送
+        has_opportunity = (
+                (ipo_data['stocks'] or ipo_data['bonds']) or
+                repo_opps or
+                lof_opps or
+                cb_opps
+        )
+
+        if has_opportunity:
+            # 注意参数顺序要对应 formatter 的定义
+            report_text = format_text_report(lof_df, lof_opps, cb_opps, ipo_data, repo_opps,
+                                             cost_rate=profile["cost_rate"])
+
+            print(report_text)  # 本地预览
+            # 已推送过的账户不再重复推送 (发送失败的消息由发件箱补发)
+            if not store.step(run_id, f"notify:{name}",
+                              lambda: send_wecom_webhook(profile["webhook"], title, report_text)):
+                print(("" if single else f"[{name}] ") + "今日报告已推送过，跳过。")
+        else:
+            print(("" if single else f"[{name}] ") + "今日全市场静悄悄，无任何机会。")
+
+    # 写出本次运行档案 (JSON + Prometheus textfile)
+    profiler.write_run_profile()
 
     # 标记今日完成（无论是否有机会，只要流程跑完就算成功）
-    mark_today_done()
+    mark_today_done(store)
+    store.finish_run(run_id)
     print("✅ 今日流程执行完成，已标记。")
+
+
+if __name__ == "__main__":
+    print(">>> 启动 A股全能挖掘机 <<<")
+
+    # 上次推送失败的消息先补发，不受 "今日已完成/执行窗口" 限制
+    if os.path.exists(OUTBOX_FILE):
+        from utils.notifier import flush_outbox
+        flush_outbox()
+
+    # 查看运行台账：python main.py --ledger [YYYY-MM-DD]
+    if "--ledger" in sys.argv:
+        args = sys.argv[sys.argv.index("--ledger") + 1:]
+        print_ledger(args[0] if args else None)
+        exit(0)
+
+    # 盯盘模式：python main.py --watch (不受每日一次的限制)
+    if "--watch" in sys.argv:
+        if not is_in_exec_window():
+            print(f"⏰ 不在执行窗口 {EXEC_START_HOUR}:00~{EXEC_END_HOUR}:00 内，不启动盯盘。")
+            exit(0)
+        load_modules(show=SHOW_IMPORT_TIMES or "--import-times" in sys.argv)
+        run_watch()
+        exit(0)
+
+    # 检查今日是否已完成
+    if is_today_done():
+        print("✅ 今日已成功执行过，无需重复运行。")
+        exit(0)
+
+    # 检查是否在执行时间窗口内
+    if not is_in_exec_window():
+        now = datetime.datetime.now()
+        print(f"⏰ 当前时间 {now.strftime('%H:%M')}，不在执行窗口 {EXEC_START_HOUR}:00~{EXEC_END_HOUR}:00 内，今日放弃。")
+        exit(0)
+
+    # 从这里开始计入本次运行档案
+    profiler.reset()
+    load_modules(show=SHOW_IMPORT_TIMES or "--import-times" in sys.argv)
+    run_daily()
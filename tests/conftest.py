@@ -0,0 +1,39 @@
+import http.server
+import os
+import sys
+import threading
+
+import pytest
+
+# 从仓库根目录导入 config / utils
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    """按 server.respond(path) 返回 (状态码, 正文字节)，记录每次请求的路径"""
+
+    def do_GET(self):
+        self.server.paths.append(self.path)
+        status, body = self.server.respond(self.path)
+        self.send_response(status)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def http_stub():
+    """
+    本地 HTTP 替身服务：测试里设置 server.respond = lambda path: (状态码, 正文字节)
+    返回 server，server.url 为根地址，server.paths 为收到的请求路径
+    """
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    server.paths = []
+    server.respond = lambda path: (404, b"")
+    server.url = f"http://127.0.0.1:{server.server_address[1]}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,75 @@
+"""历史回填：按日期合并写入、按覆盖区间续跑"""
+import pandas as pd
+import pytest
+
+from utils import history
+
+
+@pytest.fixture
+def history_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(history, "HISTORY_DIR", str(tmp_path / "history"))
+    return tmp_path
+
+
+def _daily(start, end, price=1.0):
+    dates = pd.bdate_range(start, end).strftime("%Y-%m-%d")
+    return pd.DataFrame({"date": dates, "price": price, "iopv": 1.0, "source": "历史净值",
+                         "premium_rate": (price - 1.0) * 100, "volume": 1e6})
+
+
+def test_write_daily_keeps_earlier_ranges(history_dir):
+    history.write_daily("lof", "161128", _daily("2024-01-01", "2024-01-31"))
+    history.write_daily("lof", "161128", _daily("2024-03-01", "2024-03-29"))
+    hist = history.read_history("lof", symbols=["161128"], backfill=True)
+    assert hist["date"].min() == "2024-01-01"
+    assert hist["date"].max() == "2024-03-29"
+    assert len(hist) == len(pd.bdate_range("2024-01-01", "2024-01-31")) + len(pd.bdate_range("2024-03-01", "2024-03-29"))
+
+
+def test_write_daily_overlap_keeps_latest(history_dir):
+    history.write_daily("lof", "161128", _daily("2024-01-01", "2024-01-31", price=1.0))
+    history.write_daily("lof", "161128", _daily("2024-01-15", "2024-02-15", price=1.1))
+    hist = history.read_history("lof", symbols=["161128"], backfill=True).set_index("date")
+    assert not hist.index.duplicated().any()
+    assert hist.loc["2024-01-12", "price"] == pytest.approx(1.0)
+    assert hist.loc["2024-01-15", "price"] == pytest.approx(1.1)
+
+
+def test_read_history_prefers_live_snapshot(history_dir):
+    history.write_daily("lof", "161128", _daily("2024-01-01", "2024-01-05"))
+    live = pd.DataFrame({"symbol": ["161128"], "price": [2.0], "iopv": [1.0], "source": ["实时估值"],
+                         "premium_rate": [100.0], "volume": [1e6]})
+    history.append_snapshot("lof", live, pd.Timestamp("2024-01-03 14:30"))
+    hist = history.read_history("lof", symbols=["161128"], backfill=True)
+    day = hist[hist["date"] == "2024-01-03"]
+    assert len(day) == 1 and day["price"].iloc[0] == pytest.approx(2.0)
+    assert len(hist) == 5
+
+
+def test_run_backfill_resumes_by_coverage(history_dir, monkeypatch):
+    from utils import backfill
+
+    calls = []
+
+    def fake_prices(symbol, start, end):
+        calls.append((symbol, start, end))
+        return _daily(start, end)[["date", "price", "volume"]]
+
+    def fake_navs(symbol, start, end):
+        return _daily(start, end)[["date", "iopv"]]
+
+    monkeypatch.setattr(backfill, "fetch_lof_price_history", fake_prices)
+    monkeypatch.setattr(backfill, "fetch_lof_nav_history", fake_navs)
+    state_db = str(history_dir / "state.db")
+
+    assert backfill.run_backfill(["160001", "160001", "160002"], "2024-01-01", "2024-01-31",
+                                 workers=2, state_db=state_db) == (2, 0, 0)
+    # 次日续跑 (--end 默认值变了)：只补尾巴
+    calls.clear()
+    assert backfill.run_backfill(["160001", "160002"], "2024-01-01", "2024-02-02",
+                                 workers=2, state_db=state_db) == (2, 0, 0)
+    assert sorted(calls) == [("160001", "2024-02-01", "2024-02-02"), ("160002", "2024-02-01", "2024-02-02")]
+    # 已覆盖的区间 (含重复代码) 直接跳过
+    assert backfill.run_backfill(["160001", "160001"], "2024-01-10", "2024-01-20", state_db=state_db) == (0, 0, 1)
+    hist = history.read_history("lof", symbols=["160001"], backfill=True)
+    assert len(hist) == len(pd.bdate_range("2024-01-01", "2024-02-02"))
@@ -0,0 +1,129 @@
+"""LOF 回测：与实盘同一套门槛和净收益口径 (fees.net_arbitrage)，溢价/折价两条路径"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils import backtest
+from utils.fees import FeeStore, net_arbitrage
+from utils.lof_index import LofIndex
+from utils.strategy import analyze_lof_frame
+
+SYMBOLS = ["161125", "161226", "160216"]
+FUND_TYPES = ["QDII-普通股票", "商品（不含QDII）", "指数型-股票"]
+PARAMS = {
+    "threshold_qdii": 3.5, "threshold_local": 2.0, "threshold_commodity": 2.0,
+    "discount_qdii": 3.0, "discount_local": 2.0, "discount_commodity": 2.0,
+    "cost_rate": 0.2, "commission": 0.03, "capital_rate": 2.0, "min_volume": 1000,
+}
+
+
+def _index():
+    index = LofIndex()
+    names = pd.Series(["标普", "白银", "国内"], index=SYMBOLS)
+    index.update(names, pd.Series(FUND_TYPES, index=SYMBOLS))
+    return index
+
+
+def _fees(schedules=None):
+    fees = FeeStore()
+    fees.update(schedules or {})
+    return fees
+
+
+def _panel(premium, days=6, nav=1.0, volume=1e6):
+    """净值恒定、价格 = 净值 * (1 + 溢价) 的平盘面板；premium 为每个代码的溢价率 (%)"""
+    premium = np.tile(np.asarray(premium, dtype=float), (days, 1))
+    nav = np.full_like(premium, nav)
+    return {
+        "dates": pd.date_range("2024-01-01", periods=days), "symbols": SYMBOLS,
+        "price": nav * (1 + premium / 100), "nav": nav, "iopv": nav,
+        "premium_rate": premium, "volume": np.full_like(premium, volume),
+    }
+
+
+@pytest.fixture(autouse=True)
+def _universe_scan(monkeypatch):
+    monkeypatch.setattr(backtest, "LOF_UNIVERSE_SCAN", True)
+
+
+def _prepare(panel, fees=None):
+    return backtest.prepare_lof_panel(panel, whitelist=None, index=_index(), fees=fees or _fees())
+
+
+def test_prepare_lof_panel_sells_on_confirmation_day_plus_one():
+    panel = _panel([0.0, 0.0, 0.0])
+    panel["price"] = panel["price"] * np.arange(1, 7)[:, None]
+    p = _prepare(panel)
+
+    assert p["lag"].tolist() == [2, 1, 1]
+    # QDII：T 日申购，T+2 确认，T+3 卖出；其余 T+2 卖出
+    assert p["premium_gross"][0].tolist() == pytest.approx([300.0, 200.0, 200.0])
+    assert np.isnan(p["premium_gross"][3, 0]) and not np.isnan(p["premium_gross"][3, 1])
+    # 折价：T 日收盘买入，T+1 按净值赎回
+    assert p["discount_gross"][1].tolist() == pytest.approx([-50.0, -50.0, -50.0])
+    assert np.isnan(p["discount_gross"][-1]).all()
+
+
+def test_backtest_premium_net_matches_live_net_premium():
+    premium = [4.0, 2.5, 3.0]
+    schedules = {"161125": (1.2, [[0, 1.5], [7, 0.5]]), "160216": (0.12, [[0, 1.5]])}
+    p = _prepare(_panel(premium), _fees(schedules))
+    result = backtest.backtest_lof(p, PARAMS)
+
+    fees = _fees(schedules).table(SYMBOLS)
+    live = analyze_lof_frame(pd.DataFrame({
+        "symbol": SYMBOLS, "name": ["标普", "白银", "国内"], "premium_rate": premium, "side": "premium",
+        "category": ["QDII", "COMMODITY", "LOCAL"], "lag": [2, 1, 1],
+        "subscribe_fee": fees["subscribe_fee"].to_numpy(), "redeem_fee": fees["redeem_fee"].to_numpy(),
+    }), cost_rate=PARAMS["cost_rate"], commission=PARAMS["commission"], capital_rate=PARAMS["capital_rate"])
+
+    # 平盘时实际成交价差就是信号日溢价：每只基金的回测收益与实盘 net_premium 一致
+    tradable_days = np.array([3, 4, 4])
+    assert result["trades"] == tradable_days.sum()
+    assert result["discount_trades"] == 0
+    assert result["total_return"] == pytest.approx((live["net_premium"].to_numpy() * tradable_days).sum(),
+                                                   abs=0.05)
+
+
+def test_backtest_without_fee_schedule_uses_fallback_cost():
+    p = _prepare(_panel([0.0, 0.0, 2.5]))
+    result = backtest.backtest_lof(p, PARAMS)
+    expected, _ = net_arbitrage(2.5, np.nan, np.nan, 1, 0.03, 2.0, 0.2)
+    assert result["trades"] == 4
+    assert result["avg_return"] == pytest.approx(expected)
+
+
+def test_backtest_discount_side_buys_and_redeems():
+    p = _prepare(_panel([-4.0, 0.0, -2.5]))
+    result = backtest.backtest_lof(p, PARAMS)
+
+    # 折价 4% 买入、次日按净值赎回的实际收益是 4 / 0.96，没有费率表时赎回费按短期持有计
+    gross = np.array([4.0 / 0.96, 2.5 / 0.975])
+    _, net = net_arbitrage(-gross, np.nan, np.nan, np.array([2, 1]), 0.03, 2.0, 0.2)
+    assert result["trades"] == result["discount_trades"] == 10
+    assert result["total_return"] == pytest.approx(net.sum() * 5)
+
+
+@pytest.mark.parametrize("side", ["discount_qdii", "discount_local"])
+def test_backtest_none_discount_threshold_disables_that_side(side):
+    p = _prepare(_panel([-4.0, 0.0, -2.5]))
+    result = backtest.backtest_lof(p, {**PARAMS, side: None})
+    assert result["trades"] == result["discount_trades"] == 5
+
+
+def test_backtest_respects_volume_and_whitelist():
+    panel = _panel([4.0, 2.5, 3.0], volume=500)
+    assert backtest.backtest_lof(_prepare(panel), PARAMS)["trades"] == 0
+
+    p = backtest.prepare_lof_panel(_panel([4.0, 2.5, 3.0]), whitelist={"161125": "QDII"}, index=_index(),
+                                   fees=_fees())
+    assert p["in_whitelist"].tolist() == [True, False, False]
+    assert backtest.backtest_lof(p, PARAMS)["trades"] == 3
+
+
+def test_lof_grid_keeps_live_thresholds():
+    grid = backtest.LOF_GRID
+    assert backtest.THRESHOLD_QDII in grid["threshold_qdii"]
+    assert grid["cost_rate"] == [backtest.COST_RATE] and grid["commission"] == [backtest.COMMISSION_RATE]
+    assert backtest._grid_values([2.0, 3.0], None) == [None, 2.0, 3.0]
+    assert backtest._grid_values([2.0, 3.0], 2.5) == [2.0, 2.5, 3.0]
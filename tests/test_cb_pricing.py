@@ -0,0 +1,98 @@
+"""可转债 CRR 二叉树：到期边界、深度价内、强赎封顶、回售保底只在回售期内生效、数据缺失返回 NaN"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.cb_pricing import CB_PUT_PRICE, CB_PUT_YEARS, binomial_value, price_convertibles
+
+NO_TRIGGER = np.inf
+
+
+def value(stock, conv_price=10.0, term=3.0, redemption=110.0, put=0.0, call=NO_TRIGGER, vol=0.35, **kwargs):
+    """单只转债定价，默认不带回售/强赎条款"""
+    args = [np.atleast_1d(np.asarray(x, dtype=float)) for x in (stock, conv_price, term, redemption, put, call, vol)]
+    n = max(len(a) for a in args)
+    args = [np.broadcast_to(a, n).copy() for a in args]
+    return binomial_value(*args, **kwargs)
+
+
+@pytest.mark.parametrize("stock, expected", [
+    (5.0, 110.0),    # 转股价值 50 < 到期赎回价
+    (10.0, 110.0),   # 转股价值 100
+    (15.0, 150.0),   # 转股价值 150 > 到期赎回价
+])
+def test_value_at_expiry_is_max_of_redemption_and_conversion(stock, expected):
+    assert value(stock, term=1e-8)[0] == pytest.approx(expected, abs=0.01)
+
+
+def test_deep_in_the_money_converges_to_conversion_value():
+    stock = np.array([20.0, 50.0, 100.0])
+    conversion = stock * 10
+    # 不带强赎条款：只多出剩余票息的现值，相对转股价值可以忽略
+    ratio = value(stock, term=3.0) / conversion
+    assert np.all(ratio >= 1.0)
+    assert np.all(np.diff(ratio) < 0)
+    assert ratio[-1] == pytest.approx(1.0, abs=0.01)
+    # 带强赎条款：已达到触发价，价值就是转股价值
+    np.testing.assert_allclose(value(stock, term=3.0, call=13.0), conversion)
+
+
+def test_call_trigger_caps_value():
+    free = value(13.0, call=NO_TRIGGER)[0]
+    called = value(13.0, call=13.0)[0]
+    # 正股已达强赎触发价：持有人只能转股 (130) 或按面值被赎回
+    assert called == pytest.approx(130.0)
+    assert free > called
+    # 触发价越低，封顶越早，价值越低
+    below = value(11.0, call=np.array([12.0, 15.0, NO_TRIGGER]))
+    assert below[0] < below[1] < below[2]
+
+
+def test_put_floor_only_inside_put_years():
+    # 正股远低于回售触发价，高贴现率让纯债价值低于回售价
+    kwargs = dict(stock=2.0, put=7.0, vol=0.2, rate=0.2)
+    inside = value(term=CB_PUT_YEARS - 0.5, **kwargs)[0]
+    outside = value(term=CB_PUT_YEARS + 3, **kwargs)[0]
+    no_put = value(term=CB_PUT_YEARS - 0.5, **{**kwargs, "put": 0.0})[0]
+    assert no_put < CB_PUT_PRICE
+    assert inside == pytest.approx(CB_PUT_PRICE)
+    assert outside < CB_PUT_PRICE
+    # 进入回售期后的保底仍然抬高了回售期外的价值
+    assert outside > value(term=CB_PUT_YEARS + 3, **{**kwargs, "put": 0.0})[0]
+
+
+def test_value_is_monotonic_in_stock_price():
+    prices = value(np.linspace(5, 20, 16))
+    assert np.all(np.diff(prices) > 0)
+
+
+def test_invalid_inputs_return_nan_without_raising():
+    result = value(stock=[10.0, np.nan, 0.0, 10.0, 10.0, 10.0],
+                   conv_price=[10.0, 10.0, 10.0, np.nan, 10.0, 10.0],
+                   term=[3.0, 3.0, 3.0, 3.0, -0.1, 3.0],
+                   redemption=[110.0, 110.0, 110.0, 110.0, 110.0, np.nan])
+    assert np.isfinite(result[0])
+    assert np.isnan(result[1:]).all()
+    assert np.isnan(value(stock=np.nan)).all()
+
+
+def test_price_convertibles_with_missing_data():
+    df = pd.DataFrame({
+        "price": [120.0, 115.0, 99.0, "-"],
+        "正股最新价": [12.0, "-", 8.0, 9.0],
+        "转股价": [10.0, 10.0, None, 10.0],
+        "申购日期": ["2024-01-02", "2024-01-02", "2024-01-02", "2015-01-02"],
+    }, index=["113050", "123100", "127001", "110030"])
+    result = price_convertibles(df, today="2026-10-16")
+    assert list(result.index) == list(df.index)
+    assert np.isfinite(result.loc["113050"]).all()
+    assert result.loc["113050", "mispricing"] == pytest.approx(
+        (120.0 - result.loc["113050", "theo_value"]) / result.loc["113050", "theo_value"] * 100, abs=0.01)
+    # 正股价缺失 / 转股价缺失 / 已过 6 年期限
+    assert result.loc[["123100", "127001", "110030"]].isna().all().all()
+
+
+def test_price_convertibles_without_pricing_columns():
+    df = pd.DataFrame({"price": [120.0]}, index=["113050"])
+    assert price_convertibles(df).isna().all().all()
+    assert price_convertibles(df.iloc[:0]).empty
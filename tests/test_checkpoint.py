@@ -0,0 +1,132 @@
+"""运行检查点：阶段崩溃后重跑从失败阶段继续、有效期内复用结果、有副作用的步骤当日只执行一次"""
+import datetime
+import sqlite3
+
+import pandas as pd
+import pytest
+
+from utils.checkpoint import CheckpointStore, run_day
+from utils.orchestrator import run_stages
+
+DAY = "2026-10-16"
+
+
+class Stage:
+    """可计数的阶段函数，fail=True 时抛异常"""
+
+    def __init__(self, result, fail=False):
+        self.result = result
+        self.fail = fail
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.fail:
+            raise ConnectionError("接口超时")
+        return self.result
+
+
+def run_once(path, stages, freshness=None):
+    """与 main.run_daily 相同的调用方式：resume 后只并发执行需要重跑的阶段"""
+    store = CheckpointStore(path, day=DAY)
+    run_id = store.start_run()
+    reused, pending = store.resume(run_id, stages, freshness)
+    fetched, _ = run_stages(pending, fallbacks={name: None for name in pending})
+    return store, run_id, {**reused, **fetched}
+
+
+@pytest.fixture
+def db(tmp_path):
+    return str(tmp_path / "state.db")
+
+
+def test_crash_resumes_from_failed_stage(db):
+    lof = Stage(pd.DataFrame({"symbol": ["161226"], "premium_rate": [3.2]}))
+    cb = Stage(pd.DataFrame({"symbol": ["113050"]}), fail=True)
+    repo = Stage([{"code": "204001", "rate": 1.9}])
+    store, first_run, results = run_once(db, {"lof": lof, "cb": cb, "repo": repo})
+    assert results["cb"] is None
+    # 第一次运行在推送前崩溃，没有 finish_run
+
+    cb.fail = False
+    store, second_run, results = run_once(db, {"lof": lof, "cb": cb, "repo": repo})
+    store.finish_run(second_run)
+    assert (lof.calls, cb.calls, repo.calls) == (1, 2, 1)
+    pd.testing.assert_frame_equal(results["lof"], lof.result)
+    assert results["repo"] == repo.result
+    assert list(results["cb"]["symbol"]) == ["113050"]
+
+    ledger = {(run_id, stage): (run_status, status) for run_id, run_status, stage, status, *_ in store.ledger()}
+    assert ledger[(first_run, "cb")] == ("aborted", "failed")
+    assert ledger[(first_run, "lof")] == ("aborted", "done")
+    assert ledger[(second_run, "lof")] == ("done", "reused")
+    assert ledger[(second_run, "cb")] == ("done", "done")
+
+
+def test_empty_result_is_not_checkpointed(db):
+    lof = Stage(pd.DataFrame())
+    run_once(db, {"lof": lof})
+    lof.result = pd.DataFrame({"symbol": ["161226"]})
+    _, _, results = run_once(db, {"lof": lof})
+    assert lof.calls == 2
+    assert not results["lof"].empty
+
+
+def test_failure_does_not_overwrite_finished_result(db):
+    store = CheckpointStore(db, day=DAY)
+    store.save("lof", [1, 2, 3])
+    store.fail("lof", "late error")
+    assert store.load("lof") == [1, 2, 3]
+
+
+def test_finished_stage_is_reused_within_freshness_window(db):
+    quotes = Stage(pd.DataFrame({"symbol": ["161226"], "price": [1.52]}))
+    nav = Stage(pd.DataFrame({"symbol": ["161226"], "nav": [1.48]}))
+    freshness = {"quotes": 300}
+
+    run_once(db, {"quotes": quotes, "nav": nav}, freshness)
+    run_once(db, {"quotes": quotes, "nav": nav}, freshness)
+    assert (quotes.calls, nav.calls) == (1, 1)
+
+    # 行情检查点已过 10 分钟：超出 5 分钟有效期重抓；净值当日一直有效
+    with sqlite3.connect(db) as conn:
+        conn.execute("UPDATE stages SET finished_at = finished_at - 600")
+    run_once(db, {"quotes": quotes, "nav": nav}, freshness)
+    assert (quotes.calls, nav.calls) == (2, 1)
+
+
+def test_step_skips_side_effect_already_done_today(db, tmp_path):
+    sent = []
+    store = CheckpointStore(db, day=DAY)
+    run_id = store.start_run()
+    assert store.step(run_id, "notify:默认账户", lambda: sent.append(1)) is True
+    assert store.step(run_id, "notify:默认账户", lambda: sent.append(1)) is False
+
+    # 重启后同一交易日仍跳过，下一个交易日重新执行
+    assert CheckpointStore(db, day=DAY).step(run_id, "notify:默认账户", lambda: sent.append(1)) is False
+    next_day = CheckpointStore(db, day="2026-10-19")
+    assert next_day.step(next_day.start_run(), "notify:默认账户", lambda: sent.append(1)) is True
+    assert sent == [1, 1]
+    assert [row[3] for row in store.ledger() if row[2] == "notify:默认账户"] == ["done", "skipped", "skipped"]
+
+
+def test_step_failure_is_retried_on_rerun(db):
+    store = CheckpointStore(db, day=DAY)
+    run_id = store.start_run()
+    with pytest.raises(RuntimeError):
+        store.step(run_id, "history", lambda: (_ for _ in ()).throw(RuntimeError("disk full")))
+    assert store.step(run_id, "history", lambda: None) is True
+
+
+def test_day_done_marker(db):
+    store = CheckpointStore(db, day=DAY)
+    assert not store.day_done()
+    store.mark_day_done()
+    assert CheckpointStore(db, day=DAY).day_done()
+    assert not CheckpointStore(db, day="2026-10-19").day_done()
+
+
+def test_run_day_rolls_weekends_and_holidays_back():
+    assert run_day(datetime.datetime(2026, 10, 17, 9, 0)) == "2026-10-16"   # 周六
+    assert run_day(datetime.datetime(2026, 10, 7, 9, 0)) == "2026-09-30"    # 国庆假期
+    assert run_day(datetime.datetime(2026, 10, 16, 14, 0)) == "2026-10-16"
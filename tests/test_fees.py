@@ -0,0 +1,169 @@
+"""费率表解析与净套利测算：费率字符串、赎回分档、两条套利路径的净收益 (含资金占用成本)"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.fees import (CALENDAR_PER_TRADING, SHORT_REDEEM_FEE, FeeStore, net_arbitrage, parse_percent,
+                        parse_period_days, parse_redeem_schedule, parse_subscribe_fee, redeem_fee)
+
+SUBSCRIBE = pd.DataFrame({
+    "适用金额": ["小于100万元", "大于等于100万元，小于500万元", "大于等于500万元"],
+    "适用期限": "---",
+    "原费率": ["1.20%", "0.80%", "每笔1000元"],
+    "天天基金优惠费率-银行卡购买": ["0.12%", "0.08%", "每笔1000元"],
+})
+REDEEM = pd.DataFrame({
+    "适用金额": "---",
+    "适用期限": ["小于7天", "大于等于7天，小于30天", "大于等于30天，小于6个月", "大于等于6个月，小于2年", "大于等于2年"],
+    "赎回费率": ["1.50%", "0.75%", "0.50%", "0.25%", "0.00%"],
+})
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("1.50%", 1.5),
+    ("0.00%", 0.0),
+    ("1.50%|0.15%", 1.5),
+    ("每笔1000元", None),
+    ("---", None),
+    (None, None),
+    (np.nan, None),
+])
+def test_parse_percent(text, expected):
+    assert parse_percent(text) == expected
+
+
+@pytest.mark.parametrize("text, days", [
+    ("小于7天", 0),
+    ("大于等于7天，小于30天", 7),
+    ("大于等于6个月，小于2年", 180),
+    ("大于等于2年", 730),
+    ("大于等于1.5年", 547),
+    ("---", 0),
+])
+def test_parse_period_days(text, days):
+    assert parse_period_days(text) == days
+
+
+@pytest.mark.parametrize("table, discount, expected", [
+    (SUBSCRIBE, 1.0, 1.2),
+    (SUBSCRIBE, 0.1, 0.12),  # 渠道 1 折
+    (SUBSCRIBE.assign(原费率=["0.00%", "0.00%", "每笔1000元"]), 0.1, 0.0),  # 免申购费不是缺失
+    (SUBSCRIBE.assign(原费率=["每笔1000元", "0.60%", "---"]), 1.0, 0.6),  # 跳过非百分数的档
+    (SUBSCRIBE.assign(原费率="---"), 1.0, None),
+    (pd.DataFrame({"适用金额": ["小于100万元"], "费率": ["1.00%"]}), 1.0, 1.0),
+    (pd.DataFrame(), 1.0, None),
+    (None, 1.0, None),
+])
+def test_parse_subscribe_fee(table, discount, expected):
+    assert parse_subscribe_fee(table, discount) == expected
+
+
+def test_parse_redeem_schedule_tiers():
+    schedule = parse_redeem_schedule(REDEEM)
+    assert schedule == [(0, 1.5), (7, 0.75), (30, 0.5), (180, 0.25), (730, 0.0)]
+    # 行序打乱也按起始天数升序
+    assert parse_redeem_schedule(REDEEM.iloc[::-1]) == schedule
+
+
+@pytest.mark.parametrize("table", [
+    None,
+    pd.DataFrame(),
+    REDEEM.drop(columns="适用期限"),
+    REDEEM.assign(赎回费率="---"),
+])
+def test_parse_redeem_schedule_missing(table):
+    assert parse_redeem_schedule(table) is None
+
+
+@pytest.mark.parametrize("hold_days, fee", [(0, 1.5), (1, 1.5), (7, 0.75), (29, 0.75), (200, 0.25), (1000, 0.0)])
+def test_redeem_fee_by_holding_days(hold_days, fee):
+    assert redeem_fee(parse_redeem_schedule(REDEEM), hold_days) == fee
+
+
+def test_redeem_fee_without_schedule_is_nan():
+    assert np.isnan(redeem_fee(None, 1))
+    assert np.isnan(redeem_fee([], 1))
+
+
+def test_fee_store_update_keeps_old_values_on_parse_failure(tmp_path):
+    path = str(tmp_path / "fees.json")
+    store = FeeStore(path)
+    day = pd.Timestamp("2026-10-16").date()
+    store.update({"501018": (0.12, [(0, 1.5), (7, 0.5)]), "161226": (None, None)}, today=day)
+    store.update({"501018": (None, None)}, today=day)
+    assert store.stale(["501018", "161226", "160216"], today=day) == ["160216"]
+
+    table = FeeStore(path).table(["501018", "161226", "160216"])
+    assert table.loc["501018"].tolist() == [0.12, 1.5]
+    assert table.loc["161226"].isna().all() and table.loc["160216"].isna().all()
+    assert FeeStore(path).stale(["501018"], today=pd.Timestamp("2026-10-19").date()) == ["501018"]
+
+
+def test_fee_store_table_refreshes_after_update():
+    store = FeeStore()
+    store.update({"501018": (0.12, [(0, 1.5), (7, 0.5)])})
+    assert store.table(["501018"], hold_days=7).loc["501018"].tolist() == [0.12, 0.5]
+    store.update({"501018": (0.15, [(0, 1.0)])})
+    assert store.table(["501018", "501018"], hold_days=7)["subscribe_fee"].tolist() == [0.15, 0.15]
+    assert store.table(["501018"], hold_days=1).loc["501018"].tolist() == [0.15, 1.0]
+
+
+def test_attach_lof_fees_refreshes_only_top_movers(monkeypatch):
+    from utils import data_fetcher
+
+    store = FeeStore()
+    fetched = []
+    monkeypatch.setattr(data_fetcher, "_fee_store", store)
+    monkeypatch.setattr(data_fetcher, "fetch_fund_fees", lambda s: fetched.append(s) or (0.12, None))
+    df = pd.DataFrame({"symbol": ["a", "b", "c", "d"], "premium_rate": [1.0, -8.0, 5.0, 9.0],
+                       "volume": [1e9, 1e9, 1e9, 1.0]})
+
+    result = data_fetcher.attach_lof_fees(df, max_refresh=2)
+    assert sorted(fetched) == ["b", "c"]
+    assert np.isnan(result["subscribe_fee"][0]) and result["subscribe_fee"].tolist()[1:3] == [0.12, 0.12]
+    # 同一天再次调用：前 2 只已经刷新过，不会往下补刷排名靠后的基金
+    data_fetcher.attach_lof_fees(df, max_refresh=2)
+    assert sorted(fetched) == ["b", "c"]
+
+
+COMMISSION = 0.03
+CAPITAL = 2.0
+FALLBACK = 0.2
+DAILY = CAPITAL / 365 * CALENDAR_PER_TRADING
+
+
+@pytest.mark.parametrize("premium, subscribe, redeem, lag, net_subscribe, net_redeem", [
+    # 溢价 3%：申购费 0.12 + 卖出佣金 0.03，T 日申购 T+1 确认、次日卖出，资金占用 2 个交易日
+    (3.0, 0.12, 1.5, 1, 3.0 - 0.15 - DAILY * 2, -3.0 - 1.53 - DAILY * 3),
+    # 折价 2%：买入佣金 0.03 + 7 天内赎回费 1.5，T+1 赎回再等 lag 天到账
+    (-2.0, 0.12, 1.5, 1, -2.0 - 0.15 - DAILY * 2, 2.0 - 1.53 - DAILY * 3),
+    # QDII 到账 T+2，资金多占用一天
+    (3.0, 0.12, 1.5, 2, 3.0 - 0.15 - DAILY * 3, -3.0 - 1.53 - DAILY * 4),
+    # 免申购费/免赎回费
+    (1.0, 0.0, 0.0, 1, 1.0 - 0.03 - DAILY * 2, -1.0 - 0.03 - DAILY * 3),
+    # 没有申购费率：沿用综合成本 (已含佣金)；没有赎回费率：按惩罚性赎回费
+    (3.0, np.nan, np.nan, 1, 3.0 - FALLBACK - DAILY * 2, -3.0 - COMMISSION - SHORT_REDEEM_FEE - DAILY * 3),
+    # 到账周期未知按 T+1
+    (3.0, 0.12, 1.5, np.nan, 3.0 - 0.15 - DAILY * 2, -3.0 - 1.53 - DAILY * 3),
+])
+def test_net_arbitrage_paths(premium, subscribe, redeem, lag, net_subscribe, net_redeem):
+    got_subscribe, got_redeem = net_arbitrage(np.array([premium]), np.array([subscribe]), np.array([redeem]),
+                                              np.array([lag]), COMMISSION, CAPITAL, FALLBACK)
+    assert got_subscribe[0] == pytest.approx(net_subscribe)
+    assert got_redeem[0] == pytest.approx(net_redeem)
+
+
+def test_net_arbitrage_capital_cost_term():
+    args = (np.array([3.0, 3.0]), np.array([0.12, 0.12]), np.array([1.5, 1.5]), np.array([1, 2]))
+    free_subscribe, free_redeem = net_arbitrage(*args, COMMISSION, 0.0, FALLBACK)
+    paid_subscribe, paid_redeem = net_arbitrage(*args, COMMISSION, 3.65, FALLBACK)
+    # 年化 3.65% -> 每个交易日 0.01% x 7/5 个自然日
+    np.testing.assert_allclose(free_subscribe - paid_subscribe, [0.028, 0.042])
+    np.testing.assert_allclose(free_redeem - paid_redeem, [0.042, 0.056])
+
+
+def test_net_arbitrage_per_row_parameters():
+    # 多账户批量评估时佣金/综合成本按行不同
+    net_subscribe, _ = net_arbitrage(np.array([3.0, 3.0]), np.array([np.nan, 0.1]), np.array([1.5, 1.5]),
+                                     np.array([1, 1]), np.array([0.03, 0.01]), 0.0, np.array([0.2, 0.5]))
+    np.testing.assert_allclose(net_subscribe, [2.8, 2.89])
@@ -0,0 +1,40 @@
+"""DataFrame 精简与转换工具：category 转换、代码成员判断、行字典列表"""
+import datetime
+
+import numpy as np
+import pandas as pd
+
+from utils.frames import isin_keys, records, to_category, to_float32, to_float64
+
+
+def test_to_category_stringifies_distinct_values():
+    dates = pd.Series([datetime.date(2026, 10, 16)] * 3 + [np.nan, "2026-10-15"], index=[5, 6, 7, 8, 9])
+    result = to_category(dates)
+    assert result.dtype == "category"
+    assert result.index.tolist() == [5, 6, 7, 8, 9]
+    assert result.tolist()[:3] == ["2026-10-16"] * 3 and result.tolist()[4] == "2026-10-15"
+    assert result.astype(object).equals(dates.astype(str).astype(object))
+
+
+def test_float32_round_trip():
+    values = pd.Series(["1.2345", "abc", "3.5"])
+    narrow = to_float32(values)
+    assert narrow.dtype == np.float32
+    assert to_float64(narrow).tolist()[::2] == [1.2345, 3.5]
+
+
+def test_isin_keys_matches_series_isin():
+    values = pd.Series(["160216", "161226", None, "501018"])
+    keys = ["501018", "160216", "999999"]
+    assert isin_keys(values, keys).tolist() == values.isin(keys).tolist()
+    assert isin_keys(pd.Index(["160216"]), pd.Series(["160216"])).tolist() == [True]
+    assert isin_keys(values, []).tolist() == [False] * 4
+
+
+def test_records_matches_to_dict():
+    df = pd.DataFrame({"code": ["160216", "161226"], "price": [1.2, np.nan], "volume": [1, 2],
+                       "side": ["premium", "discount"]})
+    result = records(df)
+    assert result[0] == df.to_dict("records")[0]
+    assert np.isnan(result[1]["price"]) and type(result[1]["volume"]) is int
+    assert records(df.iloc[:0]) == []
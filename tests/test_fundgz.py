@@ -0,0 +1,74 @@
+"""fundgz 窄抓取：对本地 HTTP 替身离线验证 jsonpgz 解析、未收录基金和请求失败"""
+import json
+
+import pandas as pd
+import pytest
+
+from utils import data_fetcher
+
+ESTIMATES = {
+    "501018": {"fundcode": "501018", "name": "南方原油LOF", "jzrq": "2026-10-15",
+               "dwjz": "1.0912", "gsz": "1.1034", "gszzl": "1.12", "gztime": "2026-10-16 15:00"},
+    "160216": {"fundcode": "160216", "name": "国泰商品LOF", "jzrq": "2026-10-15",
+               "dwjz": "0.5120", "gsz": "0.5087", "gszzl": "-0.64", "gztime": "2026-10-16 15:00"},
+}
+
+
+@pytest.fixture
+def fundgz(http_stub, monkeypatch):
+    """fundgz 替身：收录的基金返回 jsonpgz({...});，161226 返回空的 jsonpgz();，其余 404"""
+    def respond(path):
+        code = path.rsplit("/", 1)[-1].removesuffix(".js")
+        if code in ESTIMATES:
+            return 200, f"jsonpgz({json.dumps(ESTIMATES[code], ensure_ascii=False)});".encode()
+        if code == "161226":
+            return 200, b"jsonpgz();"
+        if code == "999999":
+            return 500, b""
+        return 404, b""
+
+    http_stub.respond = respond
+    monkeypatch.setattr(data_fetcher, "FUNDGZ_BASE_URL", f"{http_stub.url}/js")
+    # 绕开限流/缓存层，不读写仓库根目录的状态文件
+    monkeypatch.setattr(data_fetcher, "_call_api", lambda func, *args, **kwargs: func(*args, **kwargs))
+    return http_stub
+
+
+def test_estimate_parses_jsonp(fundgz):
+    item = data_fetcher.fund_gz_estimate("501018")
+    assert item["gsz"] == "1.1034"
+    assert item["jzrq"] == "2026-10-15"
+    assert fundgz.paths == ["/js/501018.js"]
+
+
+def test_estimate_not_covered_returns_none(fundgz):
+    assert data_fetcher.fund_gz_estimate("161226") is None
+    assert data_fetcher.fund_gz_estimate("123456") is None
+
+
+def test_estimate_server_error_raises(fundgz):
+    with pytest.raises(Exception):
+        data_fetcher.fund_gz_estimate("999999")
+
+
+def test_narrow_fetch_builds_reference_tables(fundgz):
+    df_iopv, df_nav = data_fetcher.fetch_lof_reference_narrow(["501018", "160216", "501018"])
+    iopv = df_iopv.set_index("symbol")["iopv_realtime"]
+    assert iopv.to_dict() == {"160216": pytest.approx(0.5087), "501018": pytest.approx(1.1034)}
+    nav = df_nav.set_index("symbol")
+    assert nav.loc["501018", "nav_official"] == pytest.approx(1.0912)
+    assert nav.loc["501018", "nav_date"] == "2026-10-15"
+
+
+def test_narrow_fetch_fills_uncovered_from_full_table(fundgz, monkeypatch):
+    full = pd.DataFrame({"symbol": ["161226", "501018"], "nav_official": [0.98, 1.09],
+                         "nav_date": ["2026-10-15", "2026-10-15"]})
+    monkeypatch.setattr(data_fetcher, "fetch_lof_nav", lambda: full)
+    df_iopv, df_nav = data_fetcher.fetch_lof_reference_narrow(["501018", "161226"])
+    assert list(df_iopv["symbol"]) == ["501018"]
+    assert sorted(df_nav["symbol"]) == ["161226", "501018"]
+    assert df_nav.set_index("symbol").loc["161226", "nav_official"] == pytest.approx(0.98)
+
+
+def test_narrow_fetch_failure_returns_none(fundgz):
+    assert data_fetcher.fetch_lof_reference_narrow(["501018", "999999"]) is None
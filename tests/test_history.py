@@ -0,0 +1,140 @@
+"""历史快照库：追加/读取往返、日期与代码过滤、压缩小文件、跨分区类型漂移、历史分位数"""
+import datetime
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from utils import history
+
+
+@pytest.fixture
+def history_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(history, "HISTORY_DIR", str(tmp_path / "history"))
+    return tmp_path / "history"
+
+
+def snapshot(premium, volume=(1_000_000, 2_000_000, 3_000_000)):
+    return pd.DataFrame({
+        "symbol": ["161226", "501018", "160216"],
+        "name": ["国投白银LOF", "南方原油LOF", "国泰商品LOF"],   # 不在 DATASET_COLUMNS 中，不入库
+        "price": [1.52, 1.10, 0.51],
+        "iopv": [1.48, 1.09, 0.52],
+        "source": ["实时估值", "实时估值", "历史净值"],
+        "premium_rate": premium,
+        "volume": list(volume),
+    })
+
+
+def ts(day, hour=10):
+    return datetime.datetime.combine(datetime.date.fromisoformat(day), datetime.time(hour))
+
+
+def test_append_and_read_round_trip(history_dir):
+    assert history.append_snapshot("lof", snapshot([2.7, 0.9, -1.9]), ts("2026-10-15")) == 3
+    assert history.append_snapshot("lof", pd.DataFrame(), ts("2026-10-15")) == 0
+
+    hist = history.read_history("lof")
+    assert list(hist.columns) == ["symbol", "timestamp", "price", "iopv", "source", "premium_rate", "volume", "date"]
+    assert hist["symbol"].tolist() == ["160216", "161226", "501018"]   # 行组内按代码排序
+    assert (hist["date"] == "2026-10-15").all()
+    assert (hist["timestamp"] == pd.Timestamp("2026-10-15 10:00")).all()
+    assert hist.set_index("symbol").loc["161226", "premium_rate"] == pytest.approx(2.7)
+
+
+def test_read_filters_by_date_and_symbol(history_dir):
+    for day, premium in [("2026-10-13", 1.0), ("2026-10-14", 2.0), ("2026-10-15", 3.0)]:
+        history.append_snapshot("lof", snapshot([premium] * 3), ts(day))
+
+    hist = history.read_history("lof", symbols=["161226", 501018], start="2026-10-14", end="2026-10-14",
+                                columns=["date", "symbol", "premium_rate"])
+    assert list(hist.columns) == ["date", "symbol", "premium_rate"]
+    assert sorted(hist["symbol"]) == ["161226", "501018"]
+    assert (hist["premium_rate"] == 2.0).all()
+    assert history.read_history("lof", symbols=[]).empty
+
+
+def test_date_filter_skips_other_partitions(history_dir):
+    history.append_snapshot("lof", snapshot([1.0, 1.0, 1.0]), ts("2026-10-15"))
+    # 范围外的分区即使文件损坏也不会被打开
+    bad = history_dir / "lof" / "date=2026-01-05"
+    bad.mkdir(parents=True)
+    (bad / "part-000000000000.parquet").write_bytes(b"not a parquet file")
+    assert len(history.read_history("lof", start="2026-10-01")) == 3
+
+
+def test_compact_merges_small_files(history_dir):
+    for hour in (10, 11, 14):
+        history.append_snapshot("lof", snapshot([hour / 10] * 3), ts("2026-10-14", hour))
+    history.append_snapshot("lof", snapshot([9.9] * 3), ts("2026-10-15"))
+    before = history.read_history("lof")
+
+    assert history.compact("lof", before="2026-10-15") == 1
+    assert sorted(os.listdir(history_dir / "lof" / "date=2026-10-14")) == ["daily.parquet"]
+    assert len(os.listdir(history_dir / "lof" / "date=2026-10-15")) == 1   # 当天还在写入，不压缩
+
+    after = history.read_history("lof")
+    key = ["date", "symbol", "timestamp"]
+    pd.testing.assert_frame_equal(after.sort_values(key).reset_index(drop=True),
+                                  before.sort_values(key).reset_index(drop=True))
+
+    # 再追加并压缩：并入已有的 daily.parquet
+    history.append_snapshot("lof", snapshot([1.5] * 3), ts("2026-10-14", 15))
+    assert history.compact("lof", before="2026-10-15") == 1
+    assert len(history.read_history("lof", start="2026-10-14", end="2026-10-14")) == 12
+    assert history.compact("lof", before="2026-10-15") == 0
+
+
+def test_volume_int_float_mix_across_partitions(history_dir):
+    # 旧版本直接写入的文件：volume 为 int64、source 为字典编码
+    legacy = snapshot([1.0, 1.0, 1.0]).drop(columns="name").astype({"source": "category"})
+    legacy.insert(1, "timestamp", pd.Timestamp("2026-10-13 10:00"))
+    part = history_dir / "lof" / "date=2026-10-13"
+    part.mkdir(parents=True)
+    pq.write_table(pa.Table.from_pandas(legacy, preserve_index=False), str(part / "part-100000000000.parquet"))
+    assert pa.types.is_integer(pq.read_schema(str(part / "part-100000000000.parquet")).field("volume").type)
+
+    history.append_snapshot("lof", snapshot([2.0] * 3, volume=(1.5e6, 2.5e6, np.nan)), ts("2026-10-14"))
+    history.append_snapshot("lof", snapshot([3.0] * 3), ts("2026-10-14", 11))
+
+    hist = history.read_history("lof", symbols=["160216"])
+    assert hist["volume"].dtype == np.float64
+    assert sorted(hist["volume"].dropna()) == [3e6, 3e6]
+    assert hist["volume"].isna().sum() == 1
+
+    assert history.compact("lof", before="2026-10-15") == 2
+    hist = history.read_history("lof")
+    assert len(hist) == 9
+    assert hist.groupby("date")["volume"].sum().to_dict() == {
+        "2026-10-13": 6e6, "2026-10-14": 1.5e6 + 2.5e6 + 6e6}
+
+
+def test_cb_dataset_round_trip(history_dir):
+    cb = pd.DataFrame({"symbol": ["113050", "127001"], "price": [118.5, 101.2], "premium_rate": [20.1, 35.0],
+                       "double_low": [138.6, 136.2], "volume": [5e7, 1e7]})
+    history.append_snapshot("cb", cb, ts("2026-10-15"))
+    hist = history.read_history("cb", symbols=["127001"])
+    assert hist[["symbol", "double_low"]].values.tolist() == [["127001", 136.2]]
+
+
+def test_premium_percentile(history_dir):
+    today = datetime.date.today()
+    # 161226 有 25 天历史 (溢价 1..25)，501018 只有 5 天，样本不足
+    for i in range(25):
+        day = (today - datetime.timedelta(days=30 - i)).isoformat()
+        premium = [i + 1.0, 1.0, np.nan] if i < 5 else [i + 1.0]
+        frame = snapshot(premium + [0.0] * (3 - len(premium)))
+        history.append_snapshot("lof", frame if i < 5 else frame.iloc[:1], ts(day))
+    # 一年以前的历史不计入
+    history.append_snapshot("lof", snapshot([100.0, 100.0, 100.0]), ts((today - datetime.timedelta(days=400)).isoformat()))
+
+    current = pd.DataFrame({"symbol": ["161226", "501018", "164906"], "premium_rate": [20.0, 5.0, 3.0]},
+                           index=["a", "b", "c"])
+    pctl = history.premium_percentile(current)
+    assert list(pctl.index) == ["a", "b", "c"]
+    assert pctl["a"] == pytest.approx(80.0)
+    assert np.isnan(pctl["b"]) and np.isnan(pctl["c"])
+    assert history.premium_percentile(current.iloc[:0]).empty
@@ -0,0 +1,125 @@
+"""LOF 分类索引：按基金类型分类、类型缺失时按名称兜底、增量补充、类型未知的基金每天复查一次"""
+import datetime
+
+import pandas as pd
+import pytest
+
+from utils import data_fetcher
+from utils.lof_index import CATEGORY_COMMODITY, CATEGORY_LOCAL, CATEGORY_QDII, LofIndex, classify_funds
+
+DAY = datetime.date(2026, 10, 16)
+NEXT_DAY = datetime.date(2026, 10, 19)
+
+
+def series(mapping):
+    return pd.Series(mapping, dtype=object)
+
+
+@pytest.mark.parametrize("name, fund_type, category, lag", [
+    ("华宝油气LOF", "QDII-普通股票", CATEGORY_QDII, 2),
+    ("中概互联LOF", "指数型-海外股票", CATEGORY_QDII, 2),
+    ("国投白银LOF", "商品（不含QDII）", CATEGORY_COMMODITY, 1),
+    # 投资黄金的 QDII 按跨市场处理
+    ("诺安全球黄金", "QDII-商品", CATEGORY_QDII, 2),
+    ("兴全合润LOF", "混合型-偏股", CATEGORY_LOCAL, 1),
+    # 有基金类型时以类型为准，名称里的关键词不起作用
+    ("港股通红利LOF", "指数型-股票", CATEGORY_LOCAL, 1),
+    # 基金类型缺失：按名称兜底
+    ("纳指科技LOF", "", CATEGORY_QDII, 2),
+    ("嘉实黄金LOF", None, CATEGORY_COMMODITY, 1),
+    ("某某成长LOF", "", CATEGORY_LOCAL, 1),
+    (None, None, CATEGORY_LOCAL, 1),
+])
+def test_classify_by_fund_type_with_name_fallback(name, fund_type, category, lag):
+    result = classify_funds(series({"160000": name}), series({"160000": fund_type}))
+    assert result.loc["160000"].tolist() == [category, lag]
+
+
+def test_classify_keeps_index():
+    names = series({"161226": "国投白银LOF", "501018": "南方原油LOF"})
+    result = classify_funds(names, series({"501018": "QDII-商品", "161226": ""}).reindex(names.index))
+    assert result["category"].to_dict() == {"161226": CATEGORY_COMMODITY, "501018": CATEGORY_QDII}
+
+
+def test_index_persists_and_looks_up(tmp_path):
+    path = str(tmp_path / "index.json")
+    index = LofIndex(path)
+    index.update(series({"501018": "南方原油LOF", "161226": "国投白银LOF"}),
+                 series({"501018": "QDII-商品", "161226": "商品（不含QDII）"}), today=DAY)
+
+    table = LofIndex(path).lookup(["161226", "501018", "999999"])
+    assert table.loc["161226"].tolist() == [CATEGORY_COMMODITY, 1]
+    assert table.loc["501018"].tolist() == [CATEGORY_QDII, 2]
+    assert table.loc["999999"].isna().all()
+
+
+def test_missing_only_returns_new_codes():
+    index = LofIndex()
+    index.update(series({"501018": "南方原油LOF"}), series({"501018": "QDII-商品"}), today=DAY)
+    assert index.missing(["501018", "161226", "161226", "160216"], today=DAY) == ["161226", "160216"]
+    # 类型已知的基金之后不再查询
+    assert index.missing(["501018"], today=NEXT_DAY) == []
+
+
+def test_unknown_type_is_rechecked_once_a_day():
+    index = LofIndex()
+    index.update(series({"164906": "中概互联LOF"}), series({}), today=DAY)
+    assert index.lookup(["164906"]).loc["164906", "category"] == CATEGORY_QDII
+    assert index.missing(["164906"], today=DAY) == []
+    assert index.missing(["164906"], today=NEXT_DAY) == ["164906"]
+
+    # 次日查到基金类型后改正分类，之后不再复查
+    index.update(series({"164906": "中概互联LOF"}), series({"164906": "混合型-偏股"}), today=NEXT_DAY)
+    assert index.lookup(["164906"]).loc["164906", "category"] == CATEGORY_LOCAL
+    assert index.missing(["164906"], today=NEXT_DAY + datetime.timedelta(days=1)) == []
+
+
+@pytest.fixture
+def fund_types(monkeypatch):
+    """替换分类索引和基金类型表，记录基金类型表的请求次数"""
+    calls = []
+    table = {"501018": "QDII-商品", "161226": "商品（不含QDII）", "160216": "混合型-偏股"}
+
+    def fetch():
+        calls.append(1)
+        return pd.Series(table, name="fund_type")
+
+    monkeypatch.setattr(data_fetcher, "_lof_index", LofIndex())
+    monkeypatch.setattr(data_fetcher, "fetch_fund_types", fetch)
+    return calls, table
+
+
+def lof_frame(symbols):
+    names = {"501018": "南方原油LOF", "161226": "国投白银LOF", "160216": "国泰商品LOF", "164906": "中概互联LOF"}
+    return pd.DataFrame({"symbol": symbols, "name": [names[s] for s in symbols], "price": 1.0})
+
+
+def test_classify_lofs_refreshes_incrementally(fund_types):
+    calls, _ = fund_types
+    df = data_fetcher.classify_lofs(lof_frame(["501018", "161226"]))
+    assert df["category"].tolist() == [CATEGORY_QDII, CATEGORY_COMMODITY]
+    assert df["lag"].tolist() == [2, 1]
+    assert len(calls) == 1
+
+    # 没有新代码：不再请求基金类型表
+    data_fetcher.classify_lofs(lof_frame(["161226", "501018", "161226"]))
+    assert len(calls) == 1
+
+    # 出现新代码：只补充一次
+    df = data_fetcher.classify_lofs(lof_frame(["501018", "160216"]))
+    assert df["category"].tolist() == [CATEGORY_QDII, CATEGORY_LOCAL]
+    assert len(calls) == 2
+
+
+def test_classify_lofs_falls_back_to_names_when_fetch_fails(fund_types, monkeypatch):
+    def fail():
+        raise ConnectionError("fund_name_em 超时")
+
+    monkeypatch.setattr(data_fetcher, "fetch_fund_types", fail)
+    df = data_fetcher.classify_lofs(lof_frame(["164906", "161226"]))
+    assert df["category"].tolist() == [CATEGORY_QDII, CATEGORY_COMMODITY]
+
+
+def test_classify_lofs_empty_frame(fund_types):
+    df = data_fetcher.classify_lofs(lof_frame([]))
+    assert df.empty and {"category", "lag"} <= set(df.columns)
@@ -0,0 +1,20 @@
+"""推送分段：含标题前缀的每条消息都不超过企业微信的 2048 字节"""
+import pytest
+
+from utils.notifier import NOTIFY_MAX_BYTES, titled_chunks
+
+
+def _report(blocks, line_len):
+    return "\n\n".join("\n".join("溢" * line_len for _ in range(4)) for _ in range(blocks))
+
+
+@pytest.mark.parametrize("title", ["LOF 日报", "低佣账户 · 全市场 LOF 套利 / 可转债双低 / 逆回购 日报" * 3])
+def test_titled_chunks_fit_limit(title):
+    texts = titled_chunks(title, _report(400, 60))
+    assert len(texts) >= 100  # 三位数序号
+    assert all(len(t.encode("utf-8")) <= NOTIFY_MAX_BYTES for t in texts)
+    assert texts[-1].startswith(f"【{title}】({len(texts)}/{len(texts)})")
+
+
+def test_single_chunk_has_no_index():
+    assert titled_chunks("日报", "今日无机会") == ["【日报】\n\n今日无机会"]
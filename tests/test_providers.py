@@ -0,0 +1,82 @@
+"""多数据源对冲：用慢/失败的假数据源离线验证对冲、失败切换和结果校验"""
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+from utils.providers import ProviderError, ProviderStats, has_columns, hedged_fetch
+
+
+def frame(source):
+    return pd.DataFrame({"code": ["161226"], "price": [1.0], "source": [source]})
+
+
+def slow(source, seconds, release=None):
+    def fetch(**kwargs):
+        if release is not None:
+            release.wait(seconds)
+        else:
+            time.sleep(seconds)
+        return frame(source)
+    return fetch
+
+
+def failing(**kwargs):
+    raise ConnectionError("reset by peer")
+
+
+def test_slow_primary_is_hedged():
+    release = threading.Event()
+    stats = ProviderStats(None)
+    providers = [("primary", slow("primary", 5, release)), ("backup", slow("backup", 0))]
+    start = time.perf_counter()
+    name, df = hedged_fetch("lof", providers, hedge_after=0.05, stats=stats)
+    release.set()
+    assert name == "backup"
+    assert df["source"].iloc[0] == "backup"
+    assert time.perf_counter() - start < 2
+    assert stats.get("lof", "backup")["samples"] == 1
+
+
+def test_fast_primary_is_not_hedged():
+    calls = []
+
+    def backup(**kwargs):
+        calls.append(1)
+        return frame("backup")
+
+    name, _ = hedged_fetch("lof", [("primary", slow("primary", 0)), ("backup", backup)], hedge_after=1)
+    assert name == "primary"
+    assert calls == []
+
+
+def test_failing_provider_falls_through_without_waiting():
+    start = time.perf_counter()
+    name, _ = hedged_fetch("lof", [("primary", failing), ("backup", slow("backup", 0))], hedge_after=5)
+    assert name == "backup"
+    assert time.perf_counter() - start < 2
+
+
+def test_invalid_result_is_rejected():
+    empty = lambda **kwargs: pd.DataFrame()
+    name, _ = hedged_fetch("lof", [("empty", empty), ("backup", slow("backup", 0))],
+                           hedge_after=5, validate=has_columns("code", "price"))
+    assert name == "backup"
+
+
+def test_all_failing_raises_and_records_failures():
+    stats = ProviderStats(None)
+    with pytest.raises(ProviderError, match="全部数据源失败"):
+        hedged_fetch("lof", [("a", failing), ("b", failing)], hedge_after=5, stats=stats)
+    assert stats.get("lof", "a")["failure_rate"] == 1.0
+    assert stats.get("lof", "b")["failure_rate"] == 1.0
+
+
+def test_rank_prefers_faster_and_healthier_provider():
+    stats = ProviderStats(None)
+    stats.record("lof", "a", 2.0, True)
+    stats.record("lof", "b", 0.5, True)
+    stats.record("lof", "c", 0.1, False)
+    providers = [("a", None), ("b", None), ("c", None), ("d", None)]
+    assert [name for name, _ in stats.rank("lof", providers)] == ["b", "a", "c", "d"]
@@ -0,0 +1,94 @@
+"""新浪批量行情客户端：对本地 HTTP 替身离线验证解析、按 URL 长度拆批和空行情跳过"""
+from urllib.parse import unquote
+
+import pytest
+
+from utils.quotes import SinaQuoteClient, parse_sina_proxy, sina_symbol, split_batches
+
+# 名称,今开,昨收,最新,最高,最低,买一,卖一,成交量,成交额,... 第 30/31 个字段为日期/时间
+QUOTES = {
+    "sz161226": ["国投白银LOF", "1.500", "1.480", "1.520", "1.530", "1.490", "1.519", "1.520",
+                 "1200000", "1820000.000"] + ["0"] * 20 + ["2026-10-16", "15:00:00", "00"],
+    "sh204001": ["GC001", "1.800", "1.750", "1.905", "2.100", "1.500", "0", "0",
+                 "500", "9000000000"] + ["0"] * 20 + ["2026-10-16", "15:30:00", "00"],
+    "sh501018": ["南方原油LOF", "1.100", "1.090", "1.095", "1.110", "1.080", "0", "0",
+                 "300000", "328500"] + ["0"] * 20 + ["2026-10-16", "15:00:00", "00"],
+}
+PROXIES = {
+    "nf_AG0": ["白银连续"] + ["0"] * 7 + ["7650", "0", "7600"],
+    "gb_xop": ["SPDR油气开采ETF", "130.50", "1.2", "2026-10-16", "1.50"],
+}
+
+
+def serve_sina(server, quotes):
+    def respond(path):
+        symbols = unquote(path).partition("/list=")[2].split(",")
+        lines = [f'var hq_str_{s}="{",".join(quotes.get(s, []))}";' for s in symbols]
+        return 200, "\n".join(lines).encode("gbk")
+    server.respond = respond
+
+
+def test_sina_symbol_prefix():
+    assert [sina_symbol(c) for c in ["161226", "501018", "204001", "113050", "sz000001"]] == \
+        ["sz161226", "sh501018", "sh204001", "sh113050", "sz000001"]
+
+
+def test_split_batches_respects_url_length():
+    symbols = [f"sz16{i:04d}" for i in range(10)]
+    batches = split_batches(symbols, base_len=20, max_url_len=50)
+    assert [s for b in batches for s in b] == symbols
+    assert all(20 + len(",".join(b)) <= 50 for b in batches)
+    assert len(batches) == 4
+
+
+def test_fetch_parses_quotes_and_skips_empty(http_stub):
+    serve_sina(http_stub, QUOTES)
+    df = SinaQuoteClient(base_url=http_stub.url).fetch(["161226", "204001", "999999", "161226"])
+    assert list(df["code"]) == ["161226", "204001"]
+    row = df.set_index("code").loc["161226"]
+    assert row["name"] == "国投白银LOF"
+    assert row["price"] == pytest.approx(1.52)
+    assert row["prev_close"] == pytest.approx(1.48)
+    assert row["amount"] == pytest.approx(1820000)
+    assert (row["date"], row["time"]) == ("2026-10-16", "15:00:00")
+    assert len(http_stub.paths) == 1
+
+
+def test_fetch_splits_long_requests_into_batches(http_stub):
+    serve_sina(http_stub, QUOTES)
+    client = SinaQuoteClient(base_url=http_stub.url, max_url_len=len(http_stub.url) + 30)
+    df = client.fetch(["161226", "204001", "501018"])
+    assert sorted(df["code"]) == ["161226", "204001", "501018"]
+    assert len(http_stub.paths) > 1
+
+
+def test_fetch_goes_through_call_wrapper(http_stub):
+    serve_sina(http_stub, QUOTES)
+    calls = []
+
+    def call(func, *args):
+        calls.append(args[0])
+        return func(*args)
+
+    SinaQuoteClient(base_url=http_stub.url, call=call).fetch(["161226"])
+    assert calls == [["sz161226"]]
+
+
+def test_fetch_raises_on_http_error(http_stub):
+    http_stub.respond = lambda path: (503, b"")
+    with pytest.raises(Exception):
+        SinaQuoteClient(base_url=http_stub.url).fetch(["161226"])
+
+
+def test_fetch_proxies(http_stub):
+    serve_sina(http_stub, PROXIES)
+    df = SinaQuoteClient(base_url=http_stub.url).fetch_proxies(["nf_AG0", "gb_xop", "hf_XX"]).set_index("proxy")
+    assert list(df.index) == ["nf_AG0", "gb_xop"]
+    assert df.loc["nf_AG0", "price"] == 7650
+    assert df.loc["nf_AG0", "prev_close"] == 7600
+    # 美股没有昨收字段，用 最新价 - 涨跌额 推算
+    assert df.loc["gb_xop", "prev_close"] == pytest.approx(129.0)
+
+
+def test_parse_sina_proxy_skips_short_lines():
+    assert parse_sina_proxy('var hq_str_nf_AG0="白银连续,1,2";')["proxy"] == []
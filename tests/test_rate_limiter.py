@@ -0,0 +1,210 @@
+"""限流层：注入假时钟/假 sleep，离线验证令牌桶、退避、Retry-After 冷却和熔断"""
+import json
+import threading
+import time
+
+import pytest
+
+from utils.rate_limiter import CircuitBreaker, CircuitOpenError, RateLimiter, TokenBucket, backoff_delay
+
+
+class FakeClock:
+    """sleep 直接推进时钟，记录每次等待"""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(round(seconds, 6))
+        self.now += seconds
+
+
+class MaxJitter:
+    """抖动取上限，退避时间可预期"""
+
+    def uniform(self, a, b):
+        return b
+
+
+class Flaky:
+    """前 failures 次抛出 errors 中的异常，之后返回 "ok"；记录调用次数"""
+
+    def __init__(self, failures, error=None):
+        self.failures = failures
+        self.error = error or RuntimeError("boom")
+        self.calls = 0
+        self.__name__ = "flaky_api"
+
+    def __call__(self):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise self.error
+        return "ok"
+
+
+class RetryAfterError(Exception):
+    def __init__(self, seconds):
+        super().__init__(f"429, retry after {seconds}s")
+        self.retry_after = seconds
+
+
+HOSTS = {"default": {"rate": 1000, "burst": 100}, "slow": {"rate": 2, "burst": 2}}
+DEFAULT_POLICY = {"host": "default", "retry_times": 3, "base_delay": 1, "max_delay": 30,
+                  "failure_threshold": 10, "reset_timeout": 60, "cache": None}
+
+
+def make_limiter(clock, policies=None, state_file=None):
+    return RateLimiter(HOSTS, DEFAULT_POLICY, policies, state_file=state_file,
+                       clock=clock, sleep=clock.sleep, rng=MaxJitter())
+
+
+def test_token_bucket_burst_then_rate():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=2, capacity=2, clock=clock, sleep=clock.sleep)
+    waits = [bucket.acquire() for _ in range(4)]
+    assert waits == [0.0, 0.0, pytest.approx(0.5), pytest.approx(0.5)]
+    assert clock.now == pytest.approx(1001.0)
+
+
+def test_backoff_delay_bounds():
+    assert backoff_delay(1, 2, 30, MaxJitter()) == 2
+    assert backoff_delay(3, 2, 30, MaxJitter()) == 8
+    assert backoff_delay(10, 2, 30, MaxJitter()) == 30
+
+
+def test_retries_with_exponential_backoff():
+    clock = FakeClock()
+    limiter = make_limiter(clock)
+    func = Flaky(failures=2)
+    assert limiter.call(func) == "ok"
+    assert func.calls == 3
+    assert clock.sleeps == [1, 2]
+
+
+def test_gives_up_after_retry_times():
+    clock = FakeClock()
+    func = Flaky(failures=5)
+    with pytest.raises(RuntimeError):
+        make_limiter(clock).call(func)
+    assert func.calls == 3
+
+
+def test_retry_after_cools_down_host():
+    clock = FakeClock()
+    limiter = make_limiter(clock, {"flaky_api": {"max_delay": 10}})
+    func = Flaky(failures=1, error=RetryAfterError(5))
+    assert limiter.call(func) == "ok"
+    # 退避 1 秒后仍在 5 秒冷却期内，再等剩余的 4 秒
+    assert clock.sleeps == [1, 4]
+
+
+def test_retry_after_capped_by_max_delay():
+    clock = FakeClock()
+    limiter = make_limiter(clock, {"flaky_api": {"max_delay": 3}})
+    func = Flaky(failures=1, error=RetryAfterError(120))
+    assert limiter.call(func) == "ok"
+    assert clock.sleeps == [1, 2]
+
+
+def test_circuit_breaker_opens_and_half_opens(tmp_path):
+    clock = FakeClock()
+    state_file = str(tmp_path / "health.json")
+    limiter = make_limiter(clock, {"flaky_api": {"failure_threshold": 2, "retry_times": 5}}, state_file)
+    func = Flaky(failures=2)
+
+    with pytest.raises(RuntimeError):
+        limiter.call(func)
+    assert func.calls == 2
+    with pytest.raises(CircuitOpenError):
+        limiter.call(func)
+    assert func.calls == 2
+    assert json.load(open(state_file))["flaky_api"]["failures"] == 2
+
+    # 新进程读到熔断状态，同样直接跳过
+    with pytest.raises(CircuitOpenError):
+        make_limiter(clock, {"flaky_api": {"failure_threshold": 2}}, state_file).call(func)
+
+    # 冷却期过后半开，放行一次试探，成功即关闭
+    clock.now += 60
+    assert limiter.call(func) == "ok"
+    assert limiter.breaker("flaky_api").state == "closed"
+    assert json.load(open(state_file)) == {}
+
+
+def test_half_open_hands_out_a_single_probe():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60, clock=clock)
+    breaker.record_failure()
+    assert not breaker.allow()
+
+    clock.now += 60
+    assert breaker.allow()
+    # 试探结果出来之前，其他调用方都被拒绝
+    assert not breaker.allow()
+    assert not breaker.allow()
+
+    # 试探失败：重新打开，冷却期后再发放一个令牌
+    assert breaker.record_failure()
+    assert not breaker.allow()
+    clock.now += 60
+    assert breaker.allow()
+    assert not breaker.allow()
+
+    # 试探成功：关闭，所有调用方放行
+    breaker.record_success()
+    assert breaker.allow() and breaker.allow()
+
+
+def test_stuck_probe_is_reissued_after_reset_timeout():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60, clock=clock)
+    breaker.record_failure()
+    clock.now += 60
+    assert breaker.allow()
+    clock.now += 30
+    assert not breaker.allow()
+    clock.now += 30
+    assert breaker.allow()
+
+
+def test_concurrent_callers_send_one_probe():
+    clock = FakeClock()
+    limiter = make_limiter(clock, {"flaky_api": {"failure_threshold": 1, "retry_times": 1}})
+    breaker = limiter.breaker("flaky_api")
+    breaker.record_failure()
+    clock.now += 60
+
+    release = threading.Event()
+    calls = []
+
+    def flaky_api():
+        calls.append(1)
+        release.wait(5)
+        return "ok"
+
+    results = []
+
+    def worker():
+        try:
+            results.append(limiter.call(flaky_api))
+        except CircuitOpenError:
+            results.append("rejected")
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for _ in range(100):
+        if calls:
+            break
+        time.sleep(0.01)
+    time.sleep(0.05)
+    release.set()
+    for t in threads:
+        t.join()
+    assert len(calls) == 1
+    assert sorted(results) == ["ok"] + ["rejected"] * 7
+    assert breaker.state == "closed"
@@ -0,0 +1,184 @@
+"""声明式规则编译器：各运算符、组合子、具名条件复用、$参数替换、首条命中优先，以及 LOF_RULES 与旧版逐行判断等价"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from config import COST_RATE
+from utils import rules
+from utils.rules import RuleError, compile_condition, compile_strategy
+from utils.strategy import LOF_RULES, analyze_lof_frame
+
+
+@pytest.fixture
+def df():
+    return pd.DataFrame({
+        "symbol": ["161226", "501018", "160216", "164906"],
+        "name": ["国投白银LOF", "南方原油LOF", None, "中概互联LOF"],
+        "price": [1.2, 0.9, 1.0, np.nan],
+    })
+
+
+def mask(spec, df, named=None, **params):
+    return compile_condition(spec, named)(df, params).tolist()
+
+
+@pytest.mark.parametrize("op, value, expected", [
+    ("gt", 1.0, [True, False, False, False]),
+    ("ge", 1.0, [True, False, True, False]),
+    ("lt", 1.0, [False, True, False, False]),
+    ("le", 1.0, [False, True, True, False]),
+    ("eq", 1.0, [False, False, True, False]),
+    ("ne", 1.0, [True, True, False, True]),
+])
+def test_compare_operators_treat_nan_as_false_except_ne(df, op, value, expected):
+    assert mask({"col": "price", op: value}, df) == expected
+
+
+def test_in_contains_matches(df):
+    assert mask({"col": "symbol", "in": ["501018", "164906"]}, df) == [False, True, False, True]
+    # contains 按字面匹配，| 不是正则
+    assert mask({"col": "name", "contains": "LOF"}, df) == [True, True, False, True]
+    assert mask({"col": "name", "contains": "白银|原油"}, df) == [False, False, False, False]
+    assert mask({"col": "name", "matches": "白银|原油"}, df) == [True, True, False, False]
+
+
+def test_isna_notna(df):
+    assert mask({"col": "price", "isna": True}, df) == [False, False, False, True]
+    assert mask({"col": "price", "notna": True}, df) == [True, True, True, False]
+    assert mask({"col": "price", "isna": False}, df) == [True, True, True, False]
+
+
+def test_all_any_not(df):
+    cheap = {"col": "price", "lt": 1.1}
+    lof = {"col": "name", "contains": "LOF"}
+    assert mask({"all": [cheap, lof]}, df) == [False, True, False, False]
+    assert mask({"any": [cheap, lof]}, df) == [True, True, True, True]
+    assert mask({"not": cheap}, df) == [True, False, False, True]
+    # 空组合：all 全真，any 全假
+    assert mask({"all": []}, df) == [True] * 4
+    assert mask({"any": []}, df) == [False] * 4
+
+
+def test_param_substitution_and_scalar_column(df):
+    assert mask({"col": "price", "gt": "$floor"}, df, floor=0.95) == [True, False, True, False]
+    # col 不是表中的列时取同名参数，广播到整列
+    assert mask({"col": "cost_rate", "lt": 1}, df, cost_rate=0.5) == [True] * 4
+    with pytest.raises(RuleError, match="缺少规则参数"):
+        mask({"col": "price", "gt": "$floor"}, df)
+    with pytest.raises(RuleError, match="不存在的列/参数"):
+        mask({"col": "volume", "gt": 0}, df)
+
+
+def test_compile_errors():
+    with pytest.raises(RuleError, match="一个运算符"):
+        compile_condition({"col": "price", "gt": 1, "lt": 2})
+    with pytest.raises(RuleError, match="未知运算符"):
+        compile_condition({"col": "price", "between": [1, 2]})
+    with pytest.raises(RuleError, match="未定义的具名条件"):
+        compile_condition("is_cheap")
+    with pytest.raises(RuleError, match="无法识别"):
+        compile_condition({"foo": 1})
+
+
+def test_named_conditions_are_reused(df):
+    strategy = compile_strategy({
+        "conditions": {
+            "cheap": {"col": "price", "lt": "$limit"},
+            # 后定义的条件引用前面的
+            "cheap_lof": {"all": ["cheap", {"col": "name", "contains": "LOF"}]},
+        },
+        "filter": "cheap_lof",
+        "outputs": {
+            "tag": {"rules": [{"when": "cheap_lof", "value": "A"}, {"when": "cheap", "value": "B"}],
+                    "default": "-"},
+            "note": {"rules": [{"when": "cheap", "value": "$note"}]},
+        },
+    })
+    assert strategy.mask(df, limit=1.1).tolist() == [False, True, False, False]
+    labels = strategy.label(df, limit=1.1, note="便宜")
+    assert labels["tag"].tolist() == ["-", "A", "B", "-"]
+    assert labels["note"].tolist() == ["", "便宜", "便宜", ""]
+
+
+
+def test_named_condition_is_evaluated_once_per_call(df, monkeypatch):
+    calls = []
+
+    def lt(a, b):
+        calls.append(1)
+        return a < b
+
+    # 比较运算在编译时绑定，先替换再编译
+    monkeypatch.setitem(rules._COMPARE, "lt", lt)
+    strategy = compile_strategy({
+        "conditions": {"cheap": {"col": "price", "lt": 1.1}},
+        "outputs": {"a": {"rules": [{"when": "cheap", "value": "x"}]},
+                    "b": {"rules": [{"when": {"not": "cheap"}, "value": "y"}]}},
+    })
+    labels = strategy.label(df)
+    assert labels["a"].tolist() == ["", "x", "x", ""]
+    assert labels["b"].tolist() == ["y", "", "", "y"]
+    assert len(calls) == 1
+    # 下一次调用重新计算，不串用上一次的结果
+    strategy.label(df.assign(price=[0.5, 0.5, 0.5, 0.5]))
+    assert len(calls) == 2
+
+
+def test_first_matching_rule_wins(df):
+    strategy = compile_strategy({"outputs": {"tag": {"rules": [
+        {"when": {"col": "price", "gt": 0.5}, "value": "first"},
+        {"when": {"col": "price", "gt": 1.0}, "value": "second"},
+    ], "default": "none"}}})
+    assert strategy.label(df)["tag"].tolist() == ["first", "first", "first", "none"]
+
+
+def test_no_filter_keeps_everything(df):
+    assert compile_strategy({}).mask(df).tolist() == [True] * 4
+    assert list(compile_strategy({}).label(df).columns) == []
+
+
+def legacy_analyze_single_lof(row):
+    """规则化之前的逐行判断 (原 analyze_single_lof)，作为等价性基准"""
+    code, name, premium = str(row['symbol']), row['name'], row['premium_rate']
+    net_premium = premium - COST_RATE
+    if '161226' in code or '白银' in name or '黄金' in name:
+        risk_tag = "[商品基]"
+        if premium > 10:
+            advice = "⚠️ 必限购(约100元)！务必先试单。溢价极高，适合小资金/拖拉机账户参与。"
+        else:
+            advice = "⚠️ 数据基于昨晚净值。请人工扣除今日[商品期货]涨跌幅。"
+    elif 'QDII' in name or '标普' in name or '纳指' in name or '恒生' in name or '教育' in name:
+        risk_tag = "[QDII]"
+        if net_premium > 2.5:
+            advice = "🔥 重点关注！收盘前务必确认[美股期货]未大跌。T+2风险较高。"
+        elif net_premium > 1.0:
+            advice = "😐 鸡肋。扣费后肉少，除非赌今晚美股大涨，否则不建议操作。"
+        else:
+            advice = "❌ 没肉。扣费+T+2风险后期望值为负。"
+    else:
+        risk_tag = "[普通]"
+        advice = "关注流动性，警惕成交额过低卖不出去。"
+    return {"net_premium": round(net_premium, 2), "risk_tag": risk_tag, "advice": advice}
+
+
+def test_lof_rules_match_legacy_row_logic():
+    frame = pd.DataFrame({
+        "symbol": ["161226", "161226", "160719", "161128", "161130", "513050", "164906", "160216", "161116"],
+        "name": ["国投白银LOF", "国投白银LOF", "嘉实黄金LOF", "标普信息科技LOF", "纳指100LOF",
+                 "恒生互联LOF", "中概互联LOF", "国泰商品LOF", "易方达黄金主题LOF"],
+        "premium_rate": [12.0, 3.0, 10.0, 5.0, 2.5, 1.2, 4.0, -2.0, 10.5],
+    })
+    result = analyze_lof_frame(frame)
+    expected = pd.DataFrame([legacy_analyze_single_lof(row) for _, row in frame.iterrows()], index=frame.index)
+    pd.testing.assert_frame_equal(result, expected, check_dtype=False)
+
+
+def test_lof_rules_spec_is_plain_data():
+    # 规则只含字典/列表/标量，可以原样写进 YAML 覆盖
+    def walk(node):
+        if isinstance(node, dict):
+            return all(isinstance(k, str) and walk(v) for k, v in node.items())
+        if isinstance(node, list):
+            return all(walk(v) for v in node)
+        return isinstance(node, (str, int, float, bool))
+    assert walk(LOF_RULES)
@@ -0,0 +1,28 @@
+"""JSON 状态文件：读写往返、缺失/损坏文件回退默认值、写入不留临时文件"""
+import os
+
+from utils.state import load_json, save_json_atomic
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / "state.json")
+    assert save_json_atomic(path, {"501018": {"name": "南方原油LOF", "lag": 2}})
+    assert load_json(path) == {"501018": {"name": "南方原油LOF", "lag": 2}}
+    assert os.listdir(tmp_path) == ["state.json"]
+
+
+def test_missing_or_corrupt_file_returns_default(tmp_path):
+    path = tmp_path / "state.json"
+    assert load_json(str(path), {}) == {}
+    assert load_json(None, []) == []
+    path.write_text("{\"half\": ", encoding="utf-8")
+    assert load_json(str(path), {}) == {}
+
+
+def test_empty_path_is_memory_only():
+    assert save_json_atomic(None, {"a": 1}) is False
+
+
+def test_write_failure_only_warns(tmp_path, capsys):
+    assert save_json_atomic(str(tmp_path / "missing" / "state.json"), {}, "测试状态") is False
+    assert "测试状态保存失败" in capsys.readouterr().out
@@ -0,0 +1,32 @@
+"""交易日历：入口不加载 numpy，标准库回退与数组日历结果一致"""
+import datetime
+import os
+import subprocess
+import sys
+
+from utils.exchange_holidays import last_session
+from utils.trade_calendar import get_calendar
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_import_main_does_not_load_numpy():
+    code = "import sys, main; print('numpy' in sys.modules)"
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert out.stdout.strip().splitlines()[-1] == "False"
+
+
+def test_last_session_matches_array_calendar():
+    calendar = get_calendar()
+    day = datetime.date(2024, 1, 1)
+    while day <= datetime.date(2026, 12, 31):
+        assert last_session(day) == calendar.session(day)
+        day += datetime.timedelta(days=1)
+
+
+def test_holiday_shifts():
+    calendar = get_calendar()
+    assert calendar.session("2026-10-04") == datetime.date(2026, 9, 30)
+    assert calendar.ceil("2026-10-04") == datetime.date(2026, 10, 8)
+    assert calendar.shift("2026-09-30", 1) == datetime.date(2026, 10, 8)
+    assert calendar.shift("2026-10-08", -1) == datetime.date(2026, 9, 30)
@@ -0,0 +1,84 @@
+"""代理估值：净值 x 标的涨跌 x 汇率变动 的手算对照、锚点缺失时退回昨收、锚点积累与落盘"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.valuation import AnchorStore, estimate_iopv, previous_session, proxy_symbols, proxy_table
+
+PROXIES = {
+    "501018": {"proxy": "hf_CL", "weight": 0.95, "fx": "fx_susdcny"},   # 南方原油：WTI 原油 + 美元汇率
+    "161226": {"proxy": "nf_AG0"},                                      # 国投白银：沪银主力，人民币资产
+    "164701": {"proxy": "hf_GC", "fx": "fx_susdcny"},                   # 没有行情的标的
+}
+QUOTES = pd.DataFrame({
+    "proxy": ["hf_CL", "nf_AG0", "fx_susdcny"],
+    "name": ["纽约原油", "白银连续", "美元人民币"],
+    "price": [72.30, 7650.0, 7.12],
+    "prev_close": [70.00, 7600.0, 7.10],
+})
+REF = pd.DataFrame({
+    "nav_official": [1.0912, 0.9850, 1.2000, np.nan],
+    "nav_date": ["2026-10-15", "2026-10-15 00:00:00", "2026-10-15", "2026-10-15"],
+}, index=pd.Index(["501018", "161226", "164701", "160216"], name="symbol"))
+
+
+def test_proxy_table_and_symbols():
+    table = proxy_table(PROXIES)
+    assert table.loc["161226"].tolist() == ["nf_AG0", 1.0, ""]
+    assert proxy_symbols(table) == ["hf_CL", "nf_AG0", "hf_GC", "fx_susdcny"]
+
+
+def test_estimate_against_stored_anchor():
+    anchors = AnchorStore()
+    anchors.record(pd.DataFrame({"proxy": ["hf_CL", "fx_susdcny", "nf_AG0"], "prev_close": [71.00, 7.08, 7500.0]}),
+                   "2026-10-15")
+    estimate = estimate_iopv(REF, proxy_table(PROXIES), QUOTES, anchors)
+
+    # 净值 x (1 + 仓位 x (标的现价/净值日收盘 x 汇率现价/净值日汇率 - 1))
+    oil = 1.0912 * (1 + 0.95 * ((72.30 / 71.00) * (7.12 / 7.08) - 1))
+    silver = 0.9850 * (7650.0 / 7500.0)
+    assert estimate["501018"] == pytest.approx(round(oil, 4))
+    assert estimate["161226"] == pytest.approx(round(silver, 4))
+    # 没有标的行情 / 没有净值的基金不出现
+    assert sorted(estimate.index) == ["161226", "501018"]
+
+
+def test_estimate_falls_back_to_prev_close_without_anchor():
+    anchors = AnchorStore()
+    # 只有别的日期的锚点：净值日查不到，退回昨收
+    anchors.record(pd.DataFrame({"proxy": ["hf_CL"], "prev_close": [50.0]}), "2026-10-09")
+    estimate = estimate_iopv(REF, proxy_table(PROXIES), QUOTES, anchors)
+    assert estimate["501018"] == pytest.approx(round(1.0912 * (1 + 0.95 * ((72.30 / 70.00) * (7.12 / 7.10) - 1)), 4))
+    assert estimate["161226"] == pytest.approx(round(0.9850 * 7650.0 / 7600.0, 4))
+    pd.testing.assert_series_equal(estimate, estimate_iopv(REF, proxy_table(PROXIES), QUOTES))
+
+
+def test_estimate_empty_inputs():
+    table = proxy_table(PROXIES)
+    assert estimate_iopv(REF, table, QUOTES.iloc[:0]).empty
+    assert estimate_iopv(REF.iloc[:0], table, QUOTES).empty
+    # 行情异常 (价格为 0) 的估值被丢弃
+    bad = QUOTES.assign(price=[0.0, 7650.0, 7.12])
+    assert list(estimate_iopv(REF, table, bad).index) == ["161226"]
+
+
+def test_anchor_store_keeps_recent_days_and_persists(tmp_path):
+    path = str(tmp_path / "anchors.json")
+    store = AnchorStore(path, keep_days=2)
+    for day, close in [("2026-10-13", 70.0), ("2026-10-14", 71.0), ("2026-10-15", 72.0)]:
+        store.record(pd.DataFrame({"proxy": ["hf_CL", "nf_AG0"], "prev_close": [close, 0.0]}), day)
+
+    reloaded = AnchorStore(path, keep_days=2)
+    found = reloaded.lookup(["hf_CL", "hf_CL", "hf_CL", "nf_AG0"], ["2026-10-13", "2026-10-14", "2026-10-15", "2026-10-15"])
+    assert np.isnan(found[0]) and found[1:3].tolist() == [71.0, 72.0]
+    # 昨收无效 (<= 0) 不记录
+    assert np.isnan(found[3])
+
+
+@pytest.mark.parametrize("today, expected", [
+    ("2026-10-19", "2026-10-16"),   # 周一 -> 上周五
+    ("2026-10-16", "2026-10-15"),
+    ("2026-10-08", "2026-09-30"),   # 国庆假期后
+])
+def test_previous_session(today, expected):
+    assert previous_session(pd.Timestamp(today).date()) == expected
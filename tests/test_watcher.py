@@ -0,0 +1,73 @@
+"""盘中盯盘：只重算、重新筛选价格变动的基金，合并后的机会集与整表筛选一致"""
+import pandas as pd
+import pytest
+
+from main import filter_opportunities
+from utils import watcher
+from utils.watcher import LofWatcher
+
+SYMBOLS = ["160216", "161226", "161725", "501018"]
+
+
+@pytest.fixture(autouse=True)
+def _offline(monkeypatch):
+    # 分类/费率只在本地补列，不查索引、不发请求
+    monkeypatch.setattr(watcher, "classify_lofs", lambda df: df.assign(category="LOCAL", lag=1.0))
+    monkeypatch.setattr(watcher, "attach_lof_fees",
+                        lambda df, refresh=True: df.assign(subscribe_fee=float("nan"), redeem_fee=float("nan")))
+
+
+def _prices(price, volume=1e6):
+    return pd.DataFrame({"symbol": SYMBOLS, "name": ["基金A", "基金B", "基金C", "基金D"],
+                         "price": price, "volume": volume})
+
+
+def _watcher(scored):
+    def filter_func(df):
+        scored.append(sorted(df['symbol']))
+        return filter_opportunities(df, whitelist=dict.fromkeys(SYMBOLS, "LOCAL"))
+
+    w = LofWatcher(filter_func, lambda alerts: None)
+    w.ref = pd.DataFrame({"iopv": 1.0, "source": "估值"}, index=pd.Index(SYMBOLS, name="symbol"))
+    return w
+
+
+def _step(w, prices):
+    w.apply_prices(prices)
+    return w.rescore()
+
+
+def test_rescore_only_filters_moved_symbols():
+    scored = []
+    w = _watcher(scored)
+    opps = _step(w, _prices([1.05, 1.00, 0.97, 1.01]))
+    assert [o['code'] for o in opps] == ["160216", "161725"]
+    assert scored == [sorted(SYMBOLS)]
+
+    # 只有 161226 涨到溢价 3%：只重新筛选这一只，其余机会沿用
+    opps = _step(w, _prices([1.05, 1.03, 0.97, 1.01]))
+    assert scored[-1] == ["161226"]
+    assert [o['code'] for o in opps] == ["160216", "161226", "161725"]
+
+    # 160216 回落到门槛以下：从机会集中移除
+    opps = _step(w, _prices([1.01, 1.03, 0.97, 1.01]))
+    assert scored[-1] == ["160216"]
+    assert [o['code'] for o in opps] == ["161226", "161725"]
+
+
+def test_incremental_opportunities_match_full_rescan():
+    w = _watcher([])
+    ticks = [[1.05, 1.00, 0.97, 1.01], [1.05, 1.04, 0.97, 1.01], [1.02, 1.04, 0.99, 1.025], [1.02, 1.04, 0.96, 1.03]]
+    for price in ticks:
+        opps = _step(w, _prices(price))
+        full = filter_opportunities(w.snapshot(), whitelist=dict.fromkeys(SYMBOLS, "LOCAL"))
+        assert opps == full
+
+
+def test_symbol_set_change_rescans_everything():
+    scored = []
+    w = _watcher(scored)
+    _step(w, _prices([1.05, 1.00, 0.97, 1.01]))
+    _step(w, _prices([1.05, 1.00, 0.97, 1.01]).iloc[:3])
+    assert scored[-1] == sorted(SYMBOLS[:3])
+    assert set(w.opps) == {"160216", "161725"}
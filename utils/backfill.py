@@ -0,0 +1,203 @@
+"""
+历史回填：批量补抓 LOF 历史日线收盘价和官方净值，算出每日溢价率写入历史库 (lof_daily 数据集)
+用法：
+  python -m utils.backfill --start 2021-01-01                       # 全部 LOF，截至昨天
+  python -m utils.backfill --start 2021-01-01 --end 2024-12-31 --symbols 161128,161130 --workers 8
+  python -m utils.backfill --start 2021-01-01 --restart              # 忽略进度，整段重抓
+  1. 每只基金 2 次请求 (日线行情 + 净值走势)，有界线程池并发，速率仍受 _call_api 的主机令牌桶约束
+  2. 每只基金写完后在 SQLite 进度表登记已覆盖的日期区间；重跑时只抓还没覆盖的部分，
+     中断后换一天续跑 (--end 默认值变了) 也只补尾巴，已覆盖整个区间的基金直接跳过
+  3. 每只基金一个 parquet 文件，按日期合并写入，列与 fetch_lof_data 的输出一致
+     (symbol / price / iopv / premium_rate / volume)，backtest / premium_percentile 读取历史时自动用日线补上没有盘中快照的日子
+"""
+import argparse
+import contextlib
+import datetime
+import os
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from config import TARGET_LOFS
+from utils import profiler
+from utils.data_fetcher import fetch_lof_nav_history, fetch_lof_price, fetch_lof_price_history
+from utils.history import write_daily
+
+# --- 回填配置 ---
+BACKFILL_STATE_DB = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".backfill_state.db")
+BACKFILL_WORKERS = 4         # 并发线程数 (两类请求分属两个主机，各自限速)
+BACKFILL_SOURCE = "历史净值"   # 回填数据的 IOPV 来源标记
+PROGRESS_EVERY = 20          # 每完成多少只打印一次进度
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS backfill_ranges (
+    symbol TEXT NOT NULL, start TEXT NOT NULL, end TEXT NOT NULL, status TEXT NOT NULL,
+    rows INTEGER, seconds REAL, error TEXT, finished_at REAL NOT NULL,
+    PRIMARY KEY (symbol, start, end)
+);
+"""
+
+
+def _day(text):
+    return datetime.date.fromisoformat(text)
+
+
+def missing_range(covered, start, end):
+    """
+    covered: 已完成的 [(开始, 结束)] 区间；返回 [start, end] 中还没覆盖部分的 (首个缺口开始, 最后缺口结束)
+    多个缺口合并成一次请求 (接口按区间一次返回)，全部覆盖时返回 None
+    """
+    gaps = []
+    cursor = _day(start)
+    for lo, hi in sorted((_day(a), _day(b)) for a, b in covered):
+        if lo > cursor:
+            gaps.append((cursor, min(lo - datetime.timedelta(days=1), _day(end))))
+        cursor = max(cursor, hi + datetime.timedelta(days=1))
+        if cursor > _day(end):
+            break
+    if cursor <= _day(end):
+        gaps.append((cursor, _day(end)))
+    gaps = [(lo, hi) for lo, hi in gaps if lo <= hi]
+    if not gaps:
+        return None
+    return gaps[0][0].isoformat(), gaps[-1][1].isoformat()
+
+
+class BackfillProgress:
+    """回填进度表：每只基金已完成的日期区间，线程安全"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    @contextlib.contextmanager
+    def _connect(self):
+        with self._lock:
+            conn = sqlite3.connect(self.path, timeout=30)
+            try:
+                with conn:
+                    yield conn
+            finally:
+                conn.close()
+
+    def covered(self):
+        """{代码: [(开始, 结束)]} 已完成的区间"""
+        result = {}
+        with self._connect() as conn:
+            for symbol, start, end in conn.execute(
+                    "SELECT symbol, start, end FROM backfill_ranges WHERE status = 'done'"):
+                result.setdefault(symbol, []).append((start, end))
+        return result
+
+    def record(self, symbol, start, end, status, rows=None, seconds=None, error=None):
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO backfill_ranges "
+                         "(symbol, start, end, status, rows, seconds, error, finished_at) "
+                         "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                         (symbol, start, end, status, rows, seconds, error, time.time()))
+
+    def reset(self, symbols):
+        with self._connect() as conn:
+            conn.executemany("DELETE FROM backfill_ranges WHERE symbol = ?", [(s,) for s in symbols])
+
+
+def build_daily(price, nav):
+    """
+    日线收盘价 + 当日官方净值 -> 每日溢价率 (与盘中快照同口径：(价格 - 净值) / 净值)
+    只保留两边都有的交易日
+    """
+    df = price.merge(nav, on='date', how='inner')
+    df = df[df['price'].notna() & (df['iopv'] > 0.001)]
+    return df.assign(source=BACKFILL_SOURCE, premium_rate=(df['price'] - df['iopv']) / df['iopv'] * 100)
+
+
+def backfill_symbol(symbol, start, end):
+    """回填一只基金，返回写入的行数"""
+    with profiler.span("backfill_symbol") as sp:
+        daily = build_daily(fetch_lof_price_history(symbol, start, end), fetch_lof_nav_history(symbol, start, end))
+        rows = write_daily("lof", symbol, daily) if not daily.empty else 0
+        sp.set("rows", rows)
+    return rows
+
+
+def run_backfill(symbols, start, end, workers=BACKFILL_WORKERS, state_db=BACKFILL_STATE_DB, restart=False):
+    """
+    回填一组基金，每只只抓 [start, end] 中还没覆盖的部分；单只失败只记录，不影响其他基金
+    返回：(完成数, 失败数, 跳过数)
+    """
+    symbols = list(dict.fromkeys(str(s) for s in symbols))
+    progress = BackfillProgress(state_db)
+    if restart:
+        progress.reset(symbols)
+    covered = progress.covered()
+    pending = {}
+    for symbol in symbols:
+        gap = missing_range(covered.get(symbol, []), start, end)
+        if gap:
+            pending[symbol] = gap
+    skipped = len(symbols) - len(pending)
+    print(f"📦 回填 {start} ~ {end}: 共 {len(symbols)} 只，已覆盖 {skipped} 只，待回填 {len(pending)} 只")
+
+    def task(symbol, gap_start, gap_end):
+        t0 = time.perf_counter()
+        try:
+            rows = backfill_symbol(symbol, gap_start, gap_end)
+        except Exception as e:
+            progress.record(symbol, gap_start, gap_end, "failed", seconds=time.perf_counter() - t0, error=repr(e))
+            raise
+        progress.record(symbol, gap_start, gap_end, "done", rows, time.perf_counter() - t0)
+        return rows
+
+    ok = failed = 0
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="backfill") as pool:
+        futures = {pool.submit(task, symbol, *gap): symbol for symbol, gap in pending.items()}
+        for i, future in enumerate(as_completed(futures), 1):
+            try:
+                future.result()
+                ok += 1
+            except Exception as e:
+                failed += 1
+                print(f"   ⚠️ [{futures[future]}] 回填失败: {e}")
+            if i % PROGRESS_EVERY == 0 or i == len(pending):
+                print(f"   ⏳ {i}/{len(pending)} (失败 {failed})")
+    return ok, failed, skipped
+
+
+def _symbols(args):
+    if args.symbols:
+        return [s.strip() for s in args.symbols.split(",") if s.strip()]
+    if args.whitelist:
+        return list(TARGET_LOFS)
+    return fetch_lof_price()['symbol'].astype(str).tolist()
+
+
+def main(argv=None):
+    yesterday = (datetime.date.today() - datetime.timedelta(days=1)).strftime("%Y-%m-%d")
+    parser = argparse.ArgumentParser(description="LOF 历史日线/净值回填")
+    parser.add_argument("--start", required=True, help="开始日期 YYYY-MM-DD")
+    parser.add_argument("--end", default=yesterday, help="结束日期 YYYY-MM-DD，默认昨天")
+    parser.add_argument("--symbols", help="逗号分隔的基金代码，默认全部 LOF")
+    parser.add_argument("--whitelist", action="store_true", help="只回填 config.TARGET_LOFS")
+    parser.add_argument("--workers", type=int, default=BACKFILL_WORKERS, help="并发线程数")
+    parser.add_argument("--restart", action="store_true", help="忽略这些基金的已有进度，整段重新回填")
+    args = parser.parse_args(argv)
+
+    symbols = _symbols(args)
+    if not symbols:
+        print("❌ 没有需要回填的基金代码。")
+        return 1
+    start = time.perf_counter()
+    ok, failed, skipped = run_backfill(symbols, args.start, args.end, args.workers, restart=args.restart)
+    print(f"✅ 回填结束：成功 {ok} 只，失败 {failed} 只，跳过 {skipped} 只，耗时 {time.perf_counter() - start:.0f}s")
+    if failed:
+        print("   重新执行同一命令即可只补失败/未覆盖的部分。")
+    profiler.write_run_profile()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,292 @@
+"""
+策略回测：用历史快照重放 LOF 溢价套利 和 可转债双低 两套规则
+用法：
+  python -m utils.backtest lof --start 2024-01-01 --end 2024-12-31 --workers 4
+  python -m utils.backtest cb --start 2024-01-01
+"""
+import argparse
+import itertools
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from config import (TARGET_LOFS, CAPITAL_COST_RATE, COMMISSION_RATE, COST_RATE, DISCOUNT_COMMODITY, DISCOUNT_LOCAL,
+                    DISCOUNT_QDII, LOF_UNIVERSE_SCAN, MIN_VOLUME, THRESHOLD_COMMODITY, THRESHOLD_QDII, THRESHOLD_LOCAL)
+from utils.fees import FEE_FILE, REDEEM_HOLD_DAYS, FeeStore, net_arbitrage
+from utils.history import read_history
+from utils.lof_index import CATEGORY_COMMODITY, CATEGORY_QDII, LOF_INDEX_FILE, SETTLEMENT_LAG, LofIndex
+
+# --- 回测配置 ---
+# LOF 两条路径的时间线与 utils/fees.net_arbitrage 一致，到账周期 lag 取自 LOF 分类索引 (utils/lof_index.py)：
+#   溢价：T 日按净值申购，T+lag 确认，T+lag+1 收盘卖出
+#   折价：T 日收盘买入，T+1 按当日净值赎回
+CB_FEE_RATE = 0.01             # 可转债单边佣金 (%)
+GRID_CHUNK_SIZE = 64           # 每个进程任务包含的参数组合数
+
+
+def _grid_values(candidates, current):
+    """候选门槛 + config 中正在使用的门槛；current 为 None (不看这一侧) 时也作为一个候选"""
+    values = sorted(set(candidates) | ({current} - {None}))
+    return values if current is not None else [None, *values]
+
+
+# 默认参数网格 (总是包含 config 中正在使用的门槛；成本参数与实盘相同，不参与寻优)
+LOF_GRID = {
+    "threshold_qdii": _grid_values([2.0, 2.5, 3.0, 3.5, 4.0, 5.0], THRESHOLD_QDII),
+    "threshold_local": _grid_values([1.0, 1.5, 2.0, 2.5, 3.0], THRESHOLD_LOCAL),
+    "threshold_commodity": _grid_values([1.5, 2.0, 3.0], THRESHOLD_COMMODITY),
+    "discount_qdii": _grid_values([2.0, 3.0, 4.0], DISCOUNT_QDII),
+    "discount_local": _grid_values([1.5, 2.0, 3.0], DISCOUNT_LOCAL),
+    "discount_commodity": _grid_values([2.0], DISCOUNT_COMMODITY),
+    "cost_rate": [COST_RATE],
+    "commission": [COMMISSION_RATE],
+    "capital_rate": [CAPITAL_COST_RATE],
+    "min_volume": [MIN_VOLUME],
+}
+CB_GRID = {
+    "price_low": [90],
+    "price_high": [120, 125, 130],
+    "min_volume": [10000000],
+    "top_n": [5, 10, 20],
+    "hold_days": [1, 5, 10, 20],
+}
+
+
+def load_panel(dataset, start=None, end=None, symbols=None, fields=None):
+    """
+    把历史快照整理成 日期 x 代码 的二维数组面板 (每天取最后一次快照，没有快照的日子用回填的日线)
+    返回：{"dates": [...], "symbols": [...], 字段名: ndarray(T, S)}
+    """
+    hist = read_history(dataset, symbols=symbols, start=start, end=end, backfill=True)
+    if hist.empty:
+        return None
+
+    hist = hist.sort_values('timestamp').drop_duplicates(['date', 'symbol'], keep='last')
+    fields = fields or [c for c in hist.columns if c not in ('date', 'symbol', 'timestamp', 'source')]
+    panel = {}
+    for field in fields:
+        wide = hist.pivot(index='date', columns='symbol', values=field).sort_index()
+        panel[field] = wide.to_numpy(dtype=float)
+    panel["dates"] = list(wide.index)
+    panel["symbols"] = list(wide.columns)
+    return panel
+
+
+def param_grid(grid):
+    """{参数: 候选值列表} -> 参数组合列表"""
+    keys = list(grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*(grid[k] for k in keys))]
+
+
+def _shift_up(arr, n):
+    """arr[t] <- arr[t+n]，越界部分填 NaN"""
+    out = np.full_like(arr, np.nan)
+    if n < len(arr):
+        out[:len(arr) - n] = arr[n:]
+    return out
+
+
+def lof_categories(symbols, whitelist=None, index=None):
+    """
+    各代码的类别 / 到账周期：优先查 LOF 分类索引，索引里没有的用白名单里的类型
+    返回：(类别数组, 到账周期数组)，两处都查不到的为 None / NaN
+    """
+    whitelist = TARGET_LOFS if whitelist is None else whitelist
+    found = (index or LofIndex(LOF_INDEX_FILE)).lookup(list(symbols))
+    category = found['category'].where(found['category'].notna(), found.index.map(whitelist.get))
+    lag = found['lag'].where(found['lag'].notna(), category.map(SETTLEMENT_LAG))
+    return category.to_numpy(dtype=object), lag.to_numpy(dtype=float)
+
+
+def prepare_lof_panel(panel, whitelist=None, index=None, fees=None):
+    """
+    预计算 LOF 回测用的数组：类别掩码、到账周期、两条路径的实际毛收益、各基金费率
+      premium_gross(%) = (T+lag+1 收盘价 - T 日净值) / T 日净值 * 100
+      discount_gross(%) = (T+1 日净值 - T 日收盘价) / T 日收盘价 * 100
+    whitelist 为空且 config.LOF_UNIVERSE_SCAN 时全部代码参与 (与实盘全市场扫描一致)
+    查不到类别/到账周期的代码无法计算收益，打印排除的数量
+    fees: 费率表 (FeeStore)，默认读取实盘落盘的费率表，没有费率的基金按综合成本扣费 (与实盘相同)
+    """
+    symbols = panel["symbols"]
+    category, lag = lof_categories(symbols, whitelist, index)
+    unknown = np.isnan(lag)
+    if unknown.any():
+        print(f"   ⚠️ {int(unknown.sum())}/{len(symbols)} 个代码不在 LOF 分类索引/白名单中，已排除 "
+              f"(先运行一次主流程或 fetch_lof_data 建立索引)")
+    nav = panel.get("nav", panel["iopv"])
+    price = panel["price"]
+
+    sell = np.full_like(price, np.nan)
+    for n in np.unique(lag[~unknown]).astype(int):
+        cols = lag == n
+        sell[:, cols] = _shift_up(price[:, cols], n + 1)
+    fee_table = (fees or FeeStore(FEE_FILE)).table(list(symbols), REDEEM_HOLD_DAYS)
+
+    prepared = dict(panel)
+    prepared["is_qdii"] = category == CATEGORY_QDII
+    prepared["is_commodity"] = category == CATEGORY_COMMODITY
+    if whitelist is None and LOF_UNIVERSE_SCAN:
+        prepared["in_whitelist"] = ~unknown
+    else:
+        members = TARGET_LOFS if whitelist is None else whitelist
+        prepared["in_whitelist"] = np.array([s in members for s in symbols]) & ~unknown
+    prepared["lag"] = lag
+    prepared["premium_gross"] = (sell - nav) / nav * 100
+    prepared["discount_gross"] = (_shift_up(nav, 1) - price) / price * 100
+    prepared["subscribe_fee"] = fee_table["subscribe_fee"].to_numpy(dtype=float)
+    prepared["redeem_fee"] = fee_table["redeem_fee"].to_numpy(dtype=float)
+    return prepared
+
+
+def _by_category(p, qdii, commodity, local):
+    """按类别取门槛 (每列一个值)；None 表示不看这一侧，转成 NaN 后比较结果恒为 False"""
+    qdii, commodity, local = (np.nan if v is None else v for v in (qdii, commodity, local))
+    return np.select([p["is_qdii"], p["is_commodity"]], [qdii, commodity], local)
+
+
+def backtest_lof(p, params):
+    """
+    单组参数的 LOF 套利回测 (整块数组运算)
+    与 profiles.evaluate_lof_profiles 同规则：白名单/全市场 + 成交额门槛 + 按类别区分的溢价门槛 / 折价门槛，
+    溢价走 申购 -> 卖出，折价走 买入 -> 赎回
+    每次信号视为等额做一笔，净收益用 fees.net_arbitrage 扣除 申购费/赎回费、佣金、资金占用成本，
+    与实盘排序用的 net_premium 同一口径，只是把信号日的溢价换成实际成交的价差
+    """
+    premium = p["premium_rate"]
+    hot = premium > _by_category(p, params["threshold_qdii"], params["threshold_commodity"],
+                                 params["threshold_local"])
+    cold = premium < -_by_category(p, params["discount_qdii"], params["discount_commodity"],
+                                   params["discount_local"])
+    discount = premium < 0
+
+    costs = (p["subscribe_fee"], p["redeem_fee"], p["lag"], params["commission"], params["capital_rate"],
+             params["cost_rate"])
+    net_subscribe, _ = net_arbitrage(p["premium_gross"], *costs)
+    _, net_redeem = net_arbitrage(-p["discount_gross"], *costs)
+    net = np.where(discount, net_redeem, net_subscribe)
+
+    signal = p["in_whitelist"] & (p["volume"] >= params["min_volume"]) & (hot | cold) & ~np.isnan(net)
+    trades = net[signal]
+    count = int(trades.size)
+    return {
+        **params,
+        "trades": count,
+        "discount_trades": int((signal & discount).sum()),
+        "win_rate": float((trades > 0).mean() * 100) if count else np.nan,
+        "avg_return": float(trades.mean()) if count else np.nan,
+        "total_return": float(trades.sum()),
+    }
+
+
+def prepare_cb_panel(panel):
+    """可转债 T+0，直接使用原始面板"""
+    return panel
+
+
+def backtest_cb(p, params):
+    """
+    单组参数的可转债双低轮动回测
+    与 filter_double_low_cb 同规则：价格区间 + 成交额门槛 + 双低值最小的前 N 名
+    每 hold_days 个交易日等权调仓一次，买卖各扣一次 CB_FEE_RATE
+    """
+    price = p["price"]
+    hold = params["hold_days"]
+    eligible = (
+        (price > params["price_low"])
+        & (price < params["price_high"])
+        & (p["volume"] > params["min_volume"])
+        & ~np.isnan(p["double_low"])
+    )
+
+    # 每天按双低值排名，不合格的排到最后
+    score = np.where(eligible, p["double_low"], np.inf)
+    rank = np.argsort(np.argsort(score, axis=1, kind="stable"), axis=1)
+    selected = eligible & (rank < params["top_n"])
+
+    # 持有期收益，只在调仓日统计
+    forward = (_shift_up(price, hold) / price - 1) * 100
+    rebalance = np.arange(len(price)) % hold == 0
+    held = selected & rebalance[:, None] & ~np.isnan(forward)
+    counts = held.sum(axis=1)
+    period_ret = np.where(counts > 0, np.where(held, forward, 0).sum(axis=1) / np.maximum(counts, 1), np.nan)
+    period_ret = period_ret[~np.isnan(period_ret)] - 2 * CB_FEE_RATE
+
+    periods = int(period_ret.size)
+    total = float((np.prod(1 + period_ret / 100) - 1) * 100) if periods else np.nan
+    return {
+        **params,
+        "periods": periods,
+        "win_rate": float((period_ret > 0).mean() * 100) if periods else np.nan,
+        "avg_return": float(period_ret.mean()) if periods else np.nan,
+        "total_return": total,
+    }
+
+
+# --- 进程池 ---
+_STRATEGIES = {
+    "lof": (prepare_lof_panel, backtest_lof),
+    "cb": (prepare_cb_panel, backtest_cb),
+}
+_worker_panel = None
+_worker_func = None
+
+
+def _init_worker(kind, panel):
+    global _worker_panel, _worker_func
+    _worker_panel = panel
+    _worker_func = _STRATEGIES[kind][1]
+
+
+def _run_chunk(chunk):
+    return [_worker_func(_worker_panel, params) for params in chunk]
+
+
+def run_grid(kind, panel, grid, workers=None):
+    """
+    在进程池中并行评估参数网格，面板数组只在每个进程初始化时传一次
+    返回：按 total_return 从高到低排序的结果表
+    """
+    prepare, func = _STRATEGIES[kind]
+    prepared = prepare(panel)
+    combos = param_grid(grid)
+    chunks = [combos[i:i + GRID_CHUNK_SIZE] for i in range(0, len(combos), GRID_CHUNK_SIZE)]
+
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1 or len(chunks) <= 1:
+        rows = [func(prepared, params) for params in combos]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(kind, prepared)) as pool:
+            rows = [row for chunk_rows in pool.map(_run_chunk, chunks) for row in chunk_rows]
+
+    return pd.DataFrame(rows).sort_values('total_return', ascending=False, ignore_index=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="LOF 溢价 / 可转债双低 策略回测")
+    parser.add_argument("kind", choices=sorted(_STRATEGIES))
+    parser.add_argument("--start", help="开始日期 YYYY-MM-DD")
+    parser.add_argument("--end", help="结束日期 YYYY-MM-DD")
+    parser.add_argument("--workers", type=int, default=None, help="进程数，默认 CPU 核数")
+    parser.add_argument("--top", type=int, default=20, help="打印前 N 组参数")
+    args = parser.parse_args(argv)
+
+    symbols = list(TARGET_LOFS) if args.kind == "lof" and not LOF_UNIVERSE_SCAN else None
+    panel = load_panel(args.kind, args.start, args.end, symbols=symbols)
+    if panel is None:
+        print("❌ 历史库中没有可用数据，请先积累快照或回填历史。")
+        return 1
+
+    grid = LOF_GRID if args.kind == "lof" else CB_GRID
+    print(f"📈 回测 {args.kind}: {len(panel['dates'])} 个交易日 x {len(panel['symbols'])} 个代码，"
+          f"{len(param_grid(grid))} 组参数")
+    result = run_grid(args.kind, panel, grid, args.workers)
+    print(result.head(args.top).to_string(index=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,154 @@
+import datetime
+import glob
+import hashlib
+import os
+import pickle
+import threading
+
+import pandas as pd
+
+from utils.trade_calendar import get_calendar
+
+# --- 本地快照缓存配置 ---
+# 缓存目录，默认放在项目根目录的 .cache/akshare 下
+CACHE_DIR = os.environ.get(
+    "LOF_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "akshare"),
+)
+CACHE_MAX_BYTES = 512 * 1024 * 1024   # 缓存目录容量上限，超出按最久未写入淘汰
+# 设置环境变量 LOF_CACHE_BYPASS=1 可跳过读缓存 (仍会写入最新结果)
+CACHE_BYPASS = os.environ.get("LOF_CACHE_BYPASS", "") not in ("", "0")
+
+# TTL 取值：整数表示有效秒数 (盘中行情)；TTL_TRADING_DAY 表示当前交易日内有效 (净值/打新日历)
+TTL_TRADING_DAY = "trading_day"
+
+_write_lock = threading.Lock()
+
+
+def trading_date(now=None):
+    """
+    当前所属交易日 (YYYY-MM-DD)
+    周末和节假日归属到节前最后一个交易日 (见 utils/trade_calendar.py)
+    """
+    day = (now or datetime.datetime.now()).date()
+    return get_calendar().session(day).strftime("%Y-%m-%d")
+
+
+def _entry_prefix(name, params):
+    digest = hashlib.md5(repr(params).encode("utf-8")).hexdigest()[:12]
+    return os.path.join(CACHE_DIR, f"{name}-{digest}-")
+
+
+def _entry_tag(ttl):
+    return trading_date() if ttl == TTL_TRADING_DAY else "live"
+
+
+def _find_entry(prefix, tag):
+    for ext in (".feather", ".pkl"):
+        path = f"{prefix}{tag}{ext}"
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def _feather_columns(path, columns):
+    """columns 为函数时按文件中的列名挑选 (只读文件头，不加载数据)"""
+    if not callable(columns):
+        return columns
+    import pyarrow.ipc
+    with pyarrow.ipc.open_file(path) as reader:
+        return columns(reader.schema.names)
+
+
+def cache_get(name, params, ttl, columns=None):
+    """
+    读取缓存，未命中/已过期/损坏时返回 None
+    name: 数据源名 (通常是 akshare 函数名)；params: 调用参数，用于区分不同请求
+    columns: 只读这些列 (列名列表，或输入全部列名、返回要读的列的函数)；Feather 快照只加载选中的列
+    """
+    if CACHE_BYPASS or ttl is None:
+        return None
+
+    path = _find_entry(_entry_prefix(name, params), _entry_tag(ttl))
+    if path is None:
+        return None
+
+    try:
+        if ttl != TTL_TRADING_DAY:
+            age = datetime.datetime.now().timestamp() - os.path.getmtime(path)
+            if age > ttl:
+                return None
+        if path.endswith(".feather"):
+            return pd.read_feather(path, columns=_feather_columns(path, columns))
+        with open(path, "rb") as f:
+            value = pickle.load(f)
+        if columns is not None and isinstance(value, pd.DataFrame):
+            value = value[columns(value.columns) if callable(columns) else columns]
+        return value
+    except Exception as e:
+        print(f"   ⚠️ 缓存读取失败({os.path.basename(path)}): {e}")
+        return None
+
+
+def cache_put(name, params, ttl, value):
+    """
+    写入缓存：DataFrame 优先存为 Feather 列式文件，无法存储时退回 pickle
+    先写临时文件再原子替换，中途崩溃不会留下半截文件
+    """
+    if ttl is None or value is None:
+        return
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    prefix = _entry_prefix(name, params)
+    tag = _entry_tag(ttl)
+    tmp_path = f"{prefix}{tag}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+    try:
+        ext = ".pkl"
+        if isinstance(value, pd.DataFrame):
+            try:
+                value.reset_index(drop=True).to_feather(tmp_path)
+                ext = ".feather"
+            except Exception:
+                pass
+        if ext == ".pkl":
+            with open(tmp_path, "wb") as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+        with _write_lock:
+            # 同一请求的旧快照 (其他交易日/其他格式) 一并清掉
+            for old in glob.glob(f"{glob.escape(prefix)}*"):
+                if not old.endswith(".tmp"):
+                    os.remove(old)
+            os.replace(tmp_path, f"{prefix}{tag}{ext}")
+    except Exception as e:
+        print(f"   ⚠️ 缓存写入失败({name}): {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return
+
+    evict(CACHE_MAX_BYTES)
+
+
+def evict(max_bytes=CACHE_MAX_BYTES):
+    """按写入时间从旧到新删除缓存文件，直到目录总大小不超过 max_bytes"""
+    with _write_lock:
+        entries = []
+        for path in glob.glob(os.path.join(CACHE_DIR, "*")):
+            if path.endswith(".tmp"):
+                continue
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
@@ -0,0 +1,164 @@
+"""
+可转债理论价值：全市场转债一次性向量化定价 (CRR 二叉树，所有转债同时倒推)
+每只转债按 正股价 / 转股价 / 剩余期限 / 票息 / 到期赎回价 / 回售和强赎条款 / 正股波动率 建树：
+  1. 到期：max(到期赎回价, 转股价值)
+  2. 逐步倒推：风险中性期望贴现 + 当期票息
+  3. 正股 >= 强赎触发价：发行人赎回，持有人只能拿 max(转股价值, 赎回价)
+  4. 最后两年正股 <= 回售触发价：持有人可按回售价卖回
+  5. 进入转股期后随时可转股：不低于转股价值
+比价表没有到期日和票息明细，按 A 股转债惯例近似：期限 6 年、从申购日起算，票息按 CB_COUPONS 逐年递增
+(数据里带 maturity / stock_vol 列时优先使用)。下修条款不建模，理论价值偏保守
+"""
+import datetime
+
+import numpy as np
+import pandas as pd
+
+from utils import profiler
+
+# --- 定价参数 ---
+CB_TREE_STEPS = 120           # 二叉树步数，全市场 550 只约 0.1 秒
+CB_TERM_YEARS = 6             # 转债期限 (年)
+CB_COUPONS = [0.3, 0.5, 1.0, 1.5, 1.8]   # 第 1~5 年票息(元/百元面值)，第 6 年含在到期赎回价里
+CB_DISCOUNT_RATE = 0.03       # 贴现率 (无风险利率 + 信用利差)
+CB_DEFAULT_VOL = 0.35         # 正股年化波动率 (数据没有 stock_vol 列时使用)
+CB_PUT_YEARS = 2              # 最后几年可以回售
+CB_PUT_PRICE = 100.0          # 回售价 (面值，忽略应计利息)
+CB_CALL_PRICE = 100.0         # 强赎价 (面值，忽略应计利息)
+CB_DEFAULT_REDEMPTION = 110.0  # 缺少到期赎回价时的默认值
+CB_PUT_TRIGGER = 0.7          # 缺少回售触发价时按转股价的比例
+CB_CALL_TRIGGER = 1.3         # 缺少强赎触发价时按转股价的比例
+
+
+def _column(df, name, default=np.nan):
+    if name in df.columns:
+        return pd.to_numeric(df[name], errors='coerce').to_numpy(dtype=float)
+    return np.full(len(df), default, dtype=float)
+
+
+def _years_between(start, end):
+    return (end - start).dt.days.to_numpy(dtype=float) / 365.0
+
+
+def remaining_years(df, today=None):
+    """
+    剩余期限(年)：有 maturity 列按到期日算，否则按 申购日期 + CB_TERM_YEARS 推算
+    返回 (剩余期限, 距离开始转股的年数) 两个数组
+    """
+    today = pd.Timestamp(today or datetime.date.today())
+    if 'maturity' in df.columns:
+        term = _years_between(pd.Series(today, index=df.index), pd.to_datetime(df['maturity'], errors='coerce'))
+    else:
+        issue = pd.to_datetime(df.get('申购日期', pd.Series(pd.NaT, index=df.index)), errors='coerce')
+        term = CB_TERM_YEARS - _years_between(issue, pd.Series(today, index=df.index))
+
+    conv_start = np.zeros(len(df))
+    if '开始转股日' in df.columns:
+        start = pd.to_datetime(df['开始转股日'].astype(str), errors='coerce')
+        conv_start = np.nan_to_num(_years_between(pd.Series(today, index=df.index), start), nan=0.0)
+    return term, np.maximum(conv_start, 0.0)
+
+
+def _coupon_matrix(term, steps):
+    """
+    票息矩阵 (转债 x 步)：第 j 步结束时 (t = (j+1) * dt) 之前最近一次付息落在该步
+    付息日距今 = 剩余期限 - (CB_TERM_YEARS - 第 k 年)
+    """
+    dt = term / steps
+    coupons = np.zeros((len(term), steps))
+    for year, coupon in enumerate(CB_COUPONS, 1):
+        when = term - (CB_TERM_YEARS - year)
+        valid = (when > 0) & (when <= term)
+        step = np.clip(np.ceil(when / np.where(dt > 0, dt, 1)).astype(int) - 1, 0, steps - 1)
+        rows = np.flatnonzero(valid)
+        coupons[rows, step[rows]] += coupon
+    return coupons
+
+
+def binomial_value(stock, conv_price, term, redemption, put_trigger, call_trigger, vol,
+                   conv_start=None, rate=CB_DISCOUNT_RATE, steps=CB_TREE_STEPS):
+    """
+    向量化 CRR 二叉树：所有输入为等长数组，返回每只转债的理论价值 (元/百元面值)
+    输入不完整或剩余期限 <= 0 的转债返回 NaN
+    """
+    n = len(stock)
+    conv_start = np.zeros(n) if conv_start is None else conv_start
+    valid = (stock > 0) & (conv_price > 0) & (term > 0) & (vol > 0) & np.isfinite(redemption)
+    value = np.full(n, np.nan)
+    if not valid.any():
+        return value
+
+    idx = np.flatnonzero(valid)
+    s0, k, t, sigma = stock[idx], conv_price[idx], term[idx], vol[idx]
+    red, put, call, start = redemption[idx], put_trigger[idx], call_trigger[idx], conv_start[idx]
+    ratio = 100.0 / k                         # 每百元面值可转股数
+    dt = t / steps
+    u = np.exp(sigma * np.sqrt(dt))
+    disc = np.exp(-rate * dt)
+    p = np.clip((np.exp(rate * dt) - 1 / u) / (u - 1 / u), 0.0, 1.0)
+    coupons = _coupon_matrix(t, steps)
+
+    nodes = np.arange(steps + 1)
+    log_u = np.log(u)[:, None]
+    # 到期：赎回价与转股价值取高
+    s = s0[:, None] * np.exp(log_u * (2 * nodes - steps))
+    v = np.maximum(red[:, None], s * ratio[:, None])
+
+    for j in range(steps - 1, -1, -1):
+        cols = nodes[:j + 1]
+        s = s0[:, None] * np.exp(log_u * (2 * cols - j))
+        cv = s * ratio[:, None]
+        v = disc[:, None] * (p[:, None] * v[:, 1:j + 2] + (1 - p[:, None]) * v[:, :j + 1]) + coupons[:, j:j + 1]
+
+        now = (j * dt)[:, None]
+        remaining = t[:, None] - now
+        # 强赎：正股达到触发价，发行人按面值赎回，持有人选择转股或被赎回
+        called = s >= call[:, None]
+        v = np.where(called, np.maximum(cv, CB_CALL_PRICE), v)
+        # 回售：最后两年正股跌破触发价，按面值卖回
+        putable = (remaining <= CB_PUT_YEARS) & (s <= put[:, None])
+        v = np.where(putable, np.maximum(v, CB_PUT_PRICE), v)
+        # 转股期内随时可转股
+        v = np.where(now >= start[:, None], np.maximum(v, cv), v)
+
+    value[idx] = v[:, 0]
+    return value
+
+
+@profiler.timed()
+def price_convertibles(df, today=None, rate=CB_DISCOUNT_RATE, steps=CB_TREE_STEPS):
+    """
+    为整张转债表计算理论价值和定价偏离
+    需要列：price / 正股最新价 / 转股价；可选：到期赎回价 / 回售触发价 / 强赎触发价 / 申购日期 / 开始转股日 /
+           maturity (到期日) / stock_vol (正股年化波动率)
+    返回：与 df 同索引的 DataFrame，列为 theo_value (元) / mispricing (%，正数表示比理论价值贵)
+    """
+    if df.empty or '转股价' not in df.columns or '正股最新价' not in df.columns:
+        return pd.DataFrame({"theo_value": np.nan, "mispricing": np.nan}, index=df.index)
+
+    conv_price = _column(df, '转股价')
+    term, conv_start = remaining_years(df, today)
+    redemption = np.nan_to_num(_column(df, '到期赎回价'), nan=CB_DEFAULT_REDEMPTION)
+    put_trigger = _column(df, '回售触发价')
+    put_trigger = np.where(np.isnan(put_trigger), conv_price * CB_PUT_TRIGGER, put_trigger)
+    call_trigger = _column(df, '强赎触发价')
+    call_trigger = np.where(np.isnan(call_trigger), conv_price * CB_CALL_TRIGGER, call_trigger)
+    vol = np.nan_to_num(_column(df, 'stock_vol'), nan=CB_DEFAULT_VOL)
+
+    theo = binomial_value(_column(df, '正股最新价'), conv_price, term, redemption, put_trigger, call_trigger,
+                          vol, conv_start=conv_start, rate=rate, steps=steps)
+    price = _column(df, 'price')
+    return pd.DataFrame({
+        "theo_value": np.round(theo, 2),
+        "mispricing": np.round((price - theo) / theo * 100, 2),
+    }, index=df.index)
+
+
+def attach_theoretical_values(df, today=None):
+    """
+    行情表加上 theo_value / mispricing 两列
+    定价是独立阶段：fetch_cb_data 只负责抓取和清洗，筛选前再整表定价一次
+    """
+    if df is None or df.empty:
+        return df
+    return df.join(price_convertibles(df, today))
@@ -0,0 +1,214 @@
+"""
+运行检查点 (SQLite)：按交易日记录每个阶段的结果和状态，代替只记"已完成"的 .today_done
+  1. 阶段成功后把结果 (pickle) 存入 stages 表；同一交易日重跑时，仍在有效期内的结果直接复用
+  2. 中途崩溃/重试耗尽后重跑，从第一个没完成的阶段继续，不再重复慢速、限流的接口
+  3. runs / ledger 两张表记录每次运行和各阶段的耗时、状态 (运行台账)
+只依赖标准库，入口处判断"今日是否已完成"时不需要加载 numpy/pandas
+"""
+import contextlib
+import datetime
+import pickle
+import sqlite3
+import threading
+import time
+
+from utils import profiler
+from utils.exchange_holidays import last_session
+
+# --- 检查点配置 ---
+STATE_KEEP_DAYS = 14         # 只保留最近多少天的检查点和台账
+DAY_DONE_STAGE = "done"      # 整个流程跑完后写入的标记阶段
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS stages (
+    day TEXT NOT NULL, stage TEXT NOT NULL, status TEXT NOT NULL,
+    finished_at REAL, seconds REAL, payload BLOB, error TEXT,
+    PRIMARY KEY (day, stage)
+);
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, day TEXT NOT NULL,
+    started_at REAL NOT NULL, finished_at REAL, status TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS ledger (
+    run_id INTEGER NOT NULL, stage TEXT NOT NULL, status TEXT NOT NULL,
+    seconds REAL, rows INTEGER, error TEXT, at REAL NOT NULL
+);
+"""
+
+
+def run_day(now=None):
+    """检查点归属的交易日 (YYYY-MM-DD)，周末和节假日归属到节前最后一个交易日"""
+    return last_session((now or datetime.datetime.now()).date()).strftime("%Y-%m-%d")
+
+
+def completed(result):
+    """阶段结果是否算完成：抓取函数出错时返回空表/None，不能当作检查点复用"""
+    if result is None:
+        return False
+    empty = getattr(result, "empty", None)
+    return not empty if isinstance(empty, bool) else True
+
+
+def _rows(result):
+    try:
+        return len(result)
+    except TypeError:
+        return None
+
+
+class CheckpointStore:
+    """
+    检查点库，线程安全 (各阶段在线程池中并发完成，每次操作单独连接)
+    day: 交易日，默认今天
+    """
+
+    def __init__(self, path, day=None):
+        self.path = path
+        self.day = day or run_day()
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    @contextlib.contextmanager
+    def _connect(self):
+        with self._lock:
+            conn = sqlite3.connect(self.path, timeout=30)
+            try:
+                with conn:
+                    yield conn
+            finally:
+                conn.close()
+
+    # --- 运行台账 ---
+    def start_run(self):
+        """登记一次新运行，清理过期数据；上次没正常结束的运行标记为 aborted。返回 run_id"""
+        cutoff = (datetime.datetime.strptime(self.day, "%Y-%m-%d")
+                  - datetime.timedelta(days=STATE_KEEP_DAYS)).strftime("%Y-%m-%d")
+        with self._connect() as conn:
+            conn.execute("UPDATE runs SET status = 'aborted' WHERE status = 'running'")
+            conn.execute("DELETE FROM stages WHERE day < ?", (cutoff,))
+            conn.execute("DELETE FROM ledger WHERE run_id IN (SELECT id FROM runs WHERE day < ?)", (cutoff,))
+            conn.execute("DELETE FROM runs WHERE day < ?", (cutoff,))
+            cur = conn.execute("INSERT INTO runs (day, started_at, status) VALUES (?, ?, 'running')",
+                               (self.day, time.time()))
+            return cur.lastrowid
+
+    def finish_run(self, run_id, status="done"):
+        with self._connect() as conn:
+            conn.execute("UPDATE runs SET finished_at = ?, status = ? WHERE id = ?", (time.time(), status, run_id))
+
+    def _log(self, run_id, stage, status, seconds=None, rows=None, error=None):
+        with self._connect() as conn:
+            conn.execute("INSERT INTO ledger (run_id, stage, status, seconds, rows, error, at) "
+                         "VALUES (?, ?, ?, ?, ?, ?, ?)", (run_id, stage, status, seconds, rows, error, time.time()))
+
+    def ledger(self, day=None):
+        """某个交易日的全部运行及各阶段记录：[(run_id, 运行状态, 阶段, 阶段状态, 耗时, 行数, 错误, 时间)]"""
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT r.id, r.status, l.stage, l.status, l.seconds, l.rows, l.error, l.at "
+                "FROM runs r LEFT JOIN ledger l ON l.run_id = r.id WHERE r.day = ? ORDER BY r.id, l.at",
+                (day or self.day,),
+            ).fetchall()
+
+    # --- 阶段检查点 ---
+    def load(self, stage, max_age=None):
+        """
+        读取本交易日已完成阶段的结果，max_age (秒) 为有效期，None 表示当日一直有效
+        没有/失败/过期/损坏时返回 None
+        """
+        with self._connect() as conn:
+            row = conn.execute("SELECT finished_at, payload FROM stages WHERE day = ? AND stage = ? "
+                               "AND status = 'done'", (self.day, stage)).fetchone()
+        if row is None:
+            return None
+        finished_at, payload = row
+        if max_age is not None and time.time() - finished_at > max_age:
+            return None
+        try:
+            return pickle.loads(payload) if payload is not None else True
+        except Exception as e:
+            print(f"   ⚠️ 检查点 [{stage}] 读取失败: {e}")
+            return None
+
+    def save(self, stage, result=None, seconds=None, keep_result=True):
+        """记录阶段完成；keep_result=False 时只记状态 (如推送、入历史库这类有副作用的阶段)"""
+        payload = pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL) if keep_result else None
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO stages (day, stage, status, finished_at, seconds, payload, error) "
+                         "VALUES (?, ?, 'done', ?, ?, ?, NULL)", (self.day, stage, time.time(), seconds, payload))
+
+    def fail(self, stage, error, seconds=None):
+        """记录阶段失败 (不覆盖之前已完成的结果)"""
+        with self._connect() as conn:
+            conn.execute("INSERT OR IGNORE INTO stages (day, stage, status, finished_at, seconds, error) "
+                         "VALUES (?, ?, 'failed', ?, ?, ?)", (self.day, stage, time.time(), seconds, error))
+            conn.execute("UPDATE stages SET finished_at = ?, seconds = ?, error = ? "
+                         "WHERE day = ? AND stage = ? AND status = 'failed'",
+                         (time.time(), seconds, error, self.day, stage))
+
+    def is_done(self, stage):
+        return self.load(stage) is not None
+
+    def day_done(self):
+        """本交易日的流程是否已整体完成 (代替 .today_done)"""
+        return self.is_done(DAY_DONE_STAGE)
+
+    def mark_day_done(self):
+        self.save(DAY_DONE_STAGE, keep_result=False)
+
+    def wrap(self, run_id, stage, func):
+        """
+        包装一个阶段函数：结果完整时写检查点，出错或结果为空时记失败，并都记入台账
+        异常原样抛出，由调用方 (run_stages) 使用兜底结果
+        """
+        def runner():
+            start = time.perf_counter()
+            try:
+                result = func()
+            except Exception as e:
+                seconds = time.perf_counter() - start
+                self.fail(stage, repr(e), seconds)
+                self._log(run_id, stage, "failed", seconds, error=repr(e))
+                raise
+            seconds = time.perf_counter() - start
+            if completed(result):
+                self.save(stage, result, seconds)
+                self._log(run_id, stage, "done", seconds, _rows(result))
+            else:
+                self.fail(stage, "空结果", seconds)
+                self._log(run_id, stage, "failed", seconds, 0, "空结果")
+            return result
+        return runner
+
+    @profiler.timed()
+    def resume(self, run_id, stages, freshness=None):
+        """
+        把阶段分成 (可复用的结果, 需要重跑的阶段)
+        stages: {阶段名: 无参可调用对象}；freshness: {阶段名: 有效期秒数}，缺省为当日有效
+        需要重跑的阶段已用 wrap 包装
+        """
+        freshness = freshness or {}
+        reused, pending = {}, {}
+        for name, func in stages.items():
+            result = self.load(name, freshness.get(name))
+            if result is not None:
+                reused[name] = result
+                self._log(run_id, name, "reused", 0.0, _rows(result))
+            else:
+                pending[name] = self.wrap(run_id, name, func)
+        return reused, pending
+
+    def step(self, run_id, stage, func):
+        """
+        有副作用、只该执行一次的步骤 (入历史库/推送)：本交易日已完成则跳过，返回是否执行了
+        """
+        if self.is_done(stage):
+            self._log(run_id, stage, "skipped", 0.0)
+            return False
+        start = time.perf_counter()
+        func()
+        seconds = time.perf_counter() - start
+        self.save(stage, seconds=seconds, keep_result=False)
+        self._log(run_id, stage, "done", seconds)
+        return True
@@ -1,135 +1,725 @@
 import datetime
-import time
+import json
+import os
 import requests
+from concurrent.futures import ThreadPoolExecutor
 
 import akshare as ak
+import numpy as np
 import pandas as pd
 
+from config import FEE_REFRESH_MAX, IOPV_PROXIES, IOPV_PROXY_OVERRIDE, MIN_VOLUME, SUBSCRIBE_FEE_DISCOUNT
+from utils import profiler
+from utils.cache import TTL_TRADING_DAY, cache_get, cache_put
+from utils.fees import FEE_FILE, FeeStore, parse_redeem_schedule, parse_subscribe_fee
+from utils.frames import isin_keys, select_columns, to_category, to_float32, to_float64
+from utils.lof_index import LOF_INDEX_FILE, LofIndex
+from utils.providers import ProviderStats, has_columns, hedged_fetch
+from utils.quotes import SinaQuoteClient
+from utils.rate_limiter import RateLimiter
+from utils.trade_calendar import get_calendar, update_calendar
+from utils.valuation import ANCHOR_FILE, AnchorStore, estimate_iopv, previous_session, proxy_symbols, proxy_table
+
 # --- 限流重试配置 ---
 API_RETRY_TIMES = 3       # 单个接口最大重试次数
-API_RETRY_INTERVAL = 30   # 重试间隔(秒)，防止触发外部接口限流
-API_CALL_INTERVAL = 10     # 连续调用不同接口之间的最小间隔(秒)
+API_RETRY_INTERVAL = 30   # 重试退避的最长等待(秒)，防止触发外部接口限流
+API_RETRY_BASE_DELAY = 2  # 首次重试的基础等待(秒)，之后指数翻倍并加随机抖动
+API_CALL_INTERVAL = 10     # 未配置主机的默认调用间隔(秒)
+
+# --- 主机级限速 (令牌桶) ---
+# 同一主机共享一个令牌桶，不同主机之间互不等待，可以并行抓取
+API_HOST_LIMITS = {
+    "eastmoney": {"rate": 1 / 3, "burst": 2},   # 平均 3 秒一次，允许连续 2 次
+    "cninfo": {"rate": 1 / 5, "burst": 1},
+    "eastmoney_search": {"rate": 3, "burst": 4},  # 个股资讯搜索，与行情接口不同域名
+    "sina": {"rate": 2, "burst": 5},
+    "fundgz": {"rate": 10, "burst": 8},         # 单只基金估值脚本，体量很小
+    "eastmoney_dc": {"rate": 1, "burst": 2},     # 东财数据中心 (备用数据源)，与行情接口不同域名
+    "eastmoney_f10": {"rate": 4, "burst": 8},    # 天天基金基金档案 (费率表)，静态页面，单只基金一页
+    "eastmoney_his": {"rate": 2, "burst": 4},    # 历史K线 (回填用)
+    "eastmoney_fund": {"rate": 2, "burst": 4},   # 单只基金净值走势 (回填用)
+    "default": {"rate": 1 / API_CALL_INTERVAL, "burst": 1},
+}
+
+# --- 接口级重试/熔断/缓存策略 ---
+# 未列出的字段沿用 API_DEFAULT_POLICY，可按 akshare 函数名单独调整
+# cache: 本地快照有效期，秒数 (盘中行情) 或 TTL_TRADING_DAY (当日有效)，None 表示不缓存
+API_DEFAULT_POLICY = {
+    "host": "default",
+    "retry_times": API_RETRY_TIMES,
+    "base_delay": API_RETRY_BASE_DELAY,
+    "max_delay": API_RETRY_INTERVAL,
+    "failure_threshold": 3,     # 连续失败多少次触发熔断
+    "reset_timeout": 1800,      # 熔断后多少秒内直接跳过 (半小时)
+    "cache": None,
+}
+API_POLICIES = {
+    "fund_lof_spot_em": {"host": "eastmoney", "cache": 60},
+    "fund_value_estimation_em": {"host": "eastmoney", "cache": 300},
+    # 全市场大表 (约2万行)，净值每个交易日只更新一次，慢一点重试
+    "fund_open_fund_rank_em": {"host": "eastmoney", "base_delay": 5, "cache": TTL_TRADING_DAY},
+    "bond_cov_comparison": {"host": "eastmoney", "cache": 60},
+    # 个股资讯按交易日缓存，同一正股当天只查一次
+    "stock_news_em": {"host": "eastmoney_search", "retry_times": 2, "cache": TTL_TRADING_DAY},
+    "bond_cov_issue_cninfo": {"host": "cninfo", "cache": TTL_TRADING_DAY},
+    "stock_new_ipo_cninfo": {"host": "cninfo", "cache": TTL_TRADING_DAY},
+    # 全市场基金名称/类型 (约2万行)，只在 LOF 分类索引出现新代码时请求
+    "fund_name_em": {"host": "eastmoney", "cache": TTL_TRADING_DAY},
+    # 单只基金费率表，每个交易日最多刷新一次
+    "fund_fee_em": {"host": "eastmoney_f10", "retry_times": 2, "base_delay": 1, "cache": TTL_TRADING_DAY},
+    # 历史回填：单只基金整段历史，结果直接写入历史库，不进快照缓存
+    "fund_lof_hist_em": {"host": "eastmoney_his"},
+    "fund_open_fund_info_em": {"host": "eastmoney_fund"},
+    # 窄抓取：逐只请求，失败就整体退回全表，不必多次重试
+    "fund_gz_estimate": {"host": "fundgz", "retry_times": 2, "base_delay": 1},
+    # 新浪批量行情，每批一次请求
+    "sina_hq": {"host": "sina", "retry_times": 2, "base_delay": 1},
+    # --- 备用数据源 (主数据源超时/失败时对冲请求) ---
+    # 交易所交易日表，只在当年休市安排缺失时请求，拿不到就沿用内置休市表
+    "tool_trade_date_hist_sina": {"host": "sina", "retry_times": 1, "cache": TTL_TRADING_DAY},
+    "fund_etf_category_sina": {"host": "sina", "cache": 60},
+    "fund_open_fund_daily_em": {"host": "eastmoney", "base_delay": 5, "cache": TTL_TRADING_DAY},
+    "bond_zh_cov": {"host": "eastmoney_dc", "cache": 60},
+    "stock_xgsglb_em": {"host": "eastmoney_dc", "cache": TTL_TRADING_DAY},
+    "bond_sh_buy_back_em": {"host": "eastmoney", "retry_times": 2},
+    "bond_sz_buy_back_em": {"host": "eastmoney", "retry_times": 2},
+}
+API_STATE_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".api_health.json")
+
+_limiter = RateLimiter(API_HOST_LIMITS, API_DEFAULT_POLICY, API_POLICIES, state_file=API_STATE_FILE)
+
+# --- 窄抓取配置 (只抓白名单基金的估值/净值) ---
+# 天天基金单只基金估值脚本，同时带有最新官方净值；可用环境变量指向本地替身服务做离线测试
+FUNDGZ_BASE_URL = os.environ.get("LOF_FUNDGZ_URL", "http://fundgz.1234567.com.cn/js")
+FUNDGZ_TIMEOUT = 5          # 单次请求超时(秒)
+NARROW_FETCH_MAX = 80       # 关注的基金超过这个数量时，逐只请求不如直接下载全表
+NARROW_MAX_WORKERS = 8      # 逐只请求的并发线程数 (实际速率仍受 fundgz 令牌桶控制)
+
+_fundgz_session = requests.Session()
+
+# --- 多数据源对冲配置 ---
+# 排名第一的数据源超过预算(秒)仍未返回，就并行请求下一个，先拿到有效结果的胜出
+HEDGE_BUDGETS = {
+    "lof_spot": 8,
+    "lof_nav": 20,       # 全市场净值大表，本身就慢
+    "cb_quotes": 8,
+    "ipo_bond": 15,
+    "ipo_stock": 15,
+    "repo": 3,
+}
+# 各数据集规整后的必需列，缺列或空表视为该数据源失败
+DATASET_SCHEMAS = {
+    "lof_spot": ["symbol", "name", "price", "volume"],
+    "lof_nav": ["symbol", "nav_official", "nav_date"],
+    "cb_quotes": ["symbol", "name", "price", "premium_rate"],
+    "ipo_bond": ["code", "name", "apply_date", "price"],
+    "ipo_stock": ["code", "name", "apply_date", "price"],
+    "repo": ["code", "name", "rate", "change_percent"],
+}
+# 各数据源的延迟/失败率统计，跨运行保留，用于决定谁先请求
+PROVIDER_STATS_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                   ".provider_stats.json")
+
+_provider_stats = ProviderStats(PROVIDER_STATS_FILE)
+
+
+def _call_api(func, *args, retry_times=None, retry_interval=None, use_cache=True, columns=None, **kwargs):
+    """
+    通用限流重试包装：调用 akshare 接口，失败时自动重试
+    成功一次即返回数据，达到最大重试次数或接口已熔断则抛出异常
+    线程安全：同一主机的调用共享令牌桶，不同主机可并行
+    配置了 cache 的接口先查本地快照，命中则不走网络；use_cache=False 强制刷新
+    columns: 只要宽表中的部分列时传入 (列名列表或 frames.select_columns 生成的函数)，
+             命中缓存时只加载这些列；网络结果整表写缓存后再裁剪，宽表不会流出本函数
+    """
+    name = getattr(func, "__name__", repr(func))
+    ttl = _limiter.policy(name)["cache"]
+    params = (args, sorted(kwargs.items()))
+
+    if use_cache:
+        cached = cache_get(name, params, ttl, columns=columns)
+        if cached is not None:
+            print(f"   💾 [{name}] 命中本地缓存")
+            profiler.add("cache_hits", 1)
+            return cached
+
+    result = _limiter.call(func, *args, retry_times=retry_times, base_delay=retry_interval, **kwargs)
+    cache_put(name, params, ttl, result)
+    if columns is not None and isinstance(result, pd.DataFrame):
+        result = result[columns(result.columns) if callable(columns) else columns]
+    return result
+
 
+# 新浪批量行情客户端，每个批次都经过 _call_api 限流/重试
+_quote_client = SinaQuoteClient(call=_call_api)
 
-def _call_api(func, *args, retry_times=API_RETRY_TIMES, retry_interval=API_RETRY_INTERVAL, **kwargs):
+# 代理估值：基金 -> 跟踪标的映射 (config.IOPV_PROXIES)，锚点跨运行积累
+_proxy_table = proxy_table(IOPV_PROXIES)
+_anchors = AnchorStore(ANCHOR_FILE)
+
+# LOF 分类索引 (类别 + 到账周期)，跨运行保留，新代码出现时增量补充
+_lof_index = LofIndex(LOF_INDEX_FILE)
+
+# LOF 费率表 (申购费 + 赎回费分档)，跨运行保留，每个交易日刷新一次
+_fee_store = FeeStore(FEE_FILE)
+
+# 国债逆回购全部期限：代码 -> 期限 (天)；上海 GC 系列 10 万起，深圳 R- 系列 1000 元起
+REPO_TENORS = {
+    '204001': 1, '204002': 2, '204003': 3, '204004': 4, '204007': 7,
+    '204014': 14, '204028': 28, '204091': 91, '204182': 182,
+    '131810': 1, '131811': 2, '131800': 3, '131809': 4, '131801': 7,
+    '131802': 14, '131803': 28, '131805': 91, '131806': 182,
+}
+REPO_CODES = list(REPO_TENORS)
+
+
+@profiler.timed()
+def fetch_quotes(codes):
     """
-    通用限流重试包装：调用 akshare 接口，失败时自动重试
-    成功一次即返回数据，达到最大重试次数则抛出异常
+    批量获取任意代码的新浪实时行情 (LOF/可转债/逆回购...)，自动拆批并发请求
+    返回列：code / name / open / prev_close / price / high / low / volume / amount / date / time
     """
-    for attempt in range(1, retry_times + 1):
+    return _quote_client.fetch(codes)
+
+
+# ==========================================
+# 各数据源规整函数：不同接口的结果统一成 DATASET_SCHEMAS 中的列
+# ==========================================
+def _lof_spot_em(use_cache=True):
+    """LOF 行情 - 东方财富"""
+    df = _call_api(ak.fund_lof_spot_em, use_cache=use_cache, columns=["代码", "名称", "最新价", "成交额"])
+    return pd.DataFrame({
+        'symbol': df['代码'].astype(str),
+        'name': df['名称'],
+        'price': df['最新价'],
+        'volume': df['成交额'],
+    })
+
+
+def _lof_spot_sina(use_cache=True):
+    """LOF 行情 - 新浪 (代码带 sh/sz 前缀)"""
+    df = _call_api(ak.fund_etf_category_sina, symbol="LOF基金", use_cache=use_cache,
+                   columns=["代码", "名称", "最新价", "成交额"])
+    return pd.DataFrame({
+        'symbol': df['代码'].astype(str).str[-6:],
+        'name': df['名称'],
+        'price': df['最新价'],
+        'volume': df['成交额'],
+    })
+
+
+def _lof_nav_rank_em(use_cache=True):
+    """官方净值 - 东方财富开放式基金排行 (全部)"""
+    # 通常列名：['基金代码', '基金简称', ..., '单位净值', ...]，只取代码/净值/日期三列
+    df = _call_api(ak.fund_open_fund_rank_em, symbol="全部", use_cache=use_cache,
+                   columns=select_columns(["代码", "单位净值", "日期"]))
+    # 同样动态找一下
+    code_col = next((c for c in df.columns if "代码" in c), None)
+    nav_col = next((c for c in df.columns if "单位净值" in c), None)
+    date_col = next((c for c in df.columns if "日期" in c), None)
+    if not (code_col and nav_col):
+        raise ValueError(f"净值列缺失，当前列名: {df.columns.tolist()}")
+
+    return pd.DataFrame({
+        'symbol': df[code_col].astype(str),
+        'nav_official': to_float32(df[nav_col]),
+        'nav_date': to_category(df[date_col] if date_col else pd.Series("", index=df.index)),
+    })
+
+
+def _lof_nav_daily_em(use_cache=True):
+    """
+    官方净值 - 东方财富开放式基金每日净值
+    列名带日期 (如 2024-01-02-单位净值)，最近一天没有净值的基金取前一天
+    """
+    df = _call_api(ak.fund_open_fund_daily_em, use_cache=use_cache,
+                   columns=lambda names: [c for c in names if c == "基金代码" or c.endswith("-单位净值")])
+    nav_cols = [c for c in df.columns if c.endswith("-单位净值")][:2]
+    if not nav_cols:
+        raise ValueError(f"净值列缺失，当前列名: {df.columns.tolist()}")
+
+    latest = pd.to_numeric(df[nav_cols[0]], errors='coerce')
+    nav, nav_date = latest, pd.Series(nav_cols[0][:-len("-单位净值")], index=df.index)
+    if len(nav_cols) > 1:
+        nav = latest.fillna(pd.to_numeric(df[nav_cols[1]], errors='coerce'))
+        nav_date = nav_date.where(latest.notna(), nav_cols[1][:-len("-单位净值")])
+    return pd.DataFrame({'symbol': df['基金代码'].astype(str), 'nav_official': to_float32(nav),
+                         'nav_date': to_category(nav_date)})
+
+
+def _cb_comparison_em(use_cache=True):
+    """
+    可转债行情 - 东方财富可转债比价表 (含价格+溢价率)
+    动态模糊匹配列名，防止 API 字段变动
+    """
+    df = _call_api(ak.bond_cov_comparison, use_cache=use_cache)
+
+    col_map = {}
+    for col in df.columns:
+        # 排除包含 "正股" 的列名混淆，除非是我们明确需要的 "正股代码"
+
+        # 找转债代码
+        if "代码" in col and "正股" not in col:
+            col_map["symbol"] = col
+        # 找转债名称
+        elif "名称" in col and "正股" not in col:
+            col_map["name"] = col
+        # 找转债最新价
+        elif "最新价" in col and "正股" not in col:
+            col_map["price"] = col
+        # 找转股溢价率 (表里还有 纯债溢价率，取第一个匹配的 转股溢价率)
+        elif "溢价率" in col and "premium_rate" not in col_map and "纯债" not in col:
+            col_map["premium_rate"] = col
+        # 找成交额 (可能叫 成交额 或 成交金额)
+        elif "成交" in col or "金额" in col:
+            col_map["volume"] = col
+        # 找正股代码 (用于后续查公告)
+        elif "正股代码" in col:
+            col_map["stock_code"] = col
+
+    if "price" not in col_map or "premium_rate" not in col_map:
+        raise ValueError(f"关键列(最新价/溢价率)丢失！当前所有列名: {df.columns.tolist()}")
+
+    # 将找到的列名 (Value) 映射为标准名 (Key)
+    return df.rename(columns={v: k for k, v in col_map.items()})
+
+
+def _cb_zh_cov_em(use_cache=True):
+    """可转债行情 - 东方财富数据中心可转债一览 (无成交额)，只保留已上市的"""
+    df = _call_api(ak.bond_zh_cov, use_cache=use_cache)
+    listed = pd.to_datetime(df['上市时间'], errors='coerce') <= pd.Timestamp.now()
+    df = df[listed]
+    return pd.DataFrame({
+        'symbol': df['债券代码'].astype(str),
+        'name': df['债券简称'],
+        'price': df['债现价'],
+        'premium_rate': df['转股溢价率'],
+        'stock_code': df['正股代码'].astype(str),
+        '转股价': df['转股价'],
+        '正股最新价': df['正股价'],
+        '申购日期': df['申购日期'],
+    })
+
+
+def _apply_date(series):
+    """申购日期统一成 YYYY-MM-DD 字符串"""
+    return pd.to_datetime(series, errors='coerce').dt.strftime('%Y-%m-%d')
+
+
+def _ipo_bond_cninfo(use_cache=True):
+    """新债日历 - 巨潮资讯可转债发行"""
+    df = _call_api(ak.bond_cov_issue_cninfo, use_cache=use_cache)
+    # 巨潮返回的是 网上申购日期，老版本叫 申购日期
+    date_col = next((c for c in ['网上申购日期', '申购日期'] if c in df.columns), None)
+    if date_col is None:
+        raise ValueError(f"申购日期列缺失，当前列名: {df.columns.tolist()}")
+    return pd.DataFrame({
+        'code': df['债券代码'].astype(str),
+        'name': df['债券简称'],
+        'apply_date': _apply_date(df[date_col]),
+        'price': "100.00",
+    })
+
+
+def _ipo_bond_em(use_cache=True):
+    """新债日历 - 东方财富可转债一览"""
+    df = _call_api(ak.bond_zh_cov, use_cache=use_cache)
+    return pd.DataFrame({
+        'code': df['债券代码'].astype(str),
+        'name': df['债券简称'],
+        'apply_date': _apply_date(df['申购日期']),
+        'price': "100.00",
+    })
+
+
+def _ipo_stock_cninfo(use_cache=True):
+    """新股日历 - 巨潮资讯新股发行 (代码列在 akshare 里写作 证劵代码)"""
+    df = _call_api(ak.stock_new_ipo_cninfo, use_cache=use_cache)
+    code_col = next((c for c in ['证劵代码', '证券代码'] if c in df.columns), None)
+    if code_col is None:
+        raise ValueError(f"证券代码列缺失，当前列名: {df.columns.tolist()}")
+    return pd.DataFrame({
+        'code': df[code_col].astype(str),
+        'name': df['证券简称'],
+        'apply_date': _apply_date(df['申购日期']),
+        'price': df['发行价'].astype(str),
+    })
+
+
+def _ipo_stock_em(use_cache=True):
+    """新股日历 - 东方财富新股申购一览"""
+    df = _call_api(ak.stock_xgsglb_em, symbol="全部股票", use_cache=use_cache)
+    return pd.DataFrame({
+        'code': df['股票代码'].astype(str),
+        'name': df['股票简称'],
+        'apply_date': _apply_date(df['申购日期']),
+        'price': df['发行价格'].astype(str),
+    })
+
+
+def _repo_sina(use_cache=True):
+    """逆回购利率 - 新浪批量行情 (最新价即年化利率，未成交时为 0)"""
+    quotes = fetch_quotes(REPO_CODES)
+    quotes = quotes[quotes['price'].notna()]
+    rate = quotes['price'].fillna(0.0)
+    prev_close = quotes['prev_close'].fillna(0.0)
+    # 计算涨跌幅 (仅在有成交时计算)
+    traded = (prev_close > 0) & (rate > 0)
+    change_percent = ((rate - prev_close) / prev_close.where(traded) * 100).where(traded, 0.0)
+    return pd.DataFrame({'code': quotes['code'], 'name': quotes['name'], 'rate': rate,
+                         'change_percent': change_percent})
+
+
+def _repo_em(use_cache=True):
+    """逆回购利率 - 东方财富沪深回购行情"""
+    df = pd.concat([_call_api(ak.bond_sh_buy_back_em, use_cache=use_cache),
+                    _call_api(ak.bond_sz_buy_back_em, use_cache=use_cache)], ignore_index=True)
+    df['代码'] = df['代码'].astype(str)
+    df = df[df['代码'].isin(REPO_CODES)]
+    return pd.DataFrame({'code': df['代码'], 'name': df['名称'], 'rate': df['最新价'].fillna(0.0),
+                         'change_percent': df['涨跌幅'].fillna(0.0)})
+
+
+# 各数据集的候选数据源，顺序即没有统计数据时的默认优先级
+DATA_PROVIDERS = {
+    "lof_spot": [("eastmoney", _lof_spot_em), ("sina", _lof_spot_sina)],
+    "lof_nav": [("eastmoney_rank", _lof_nav_rank_em), ("eastmoney_daily", _lof_nav_daily_em)],
+    "cb_quotes": [("eastmoney_comparison", _cb_comparison_em), ("eastmoney_datacenter", _cb_zh_cov_em)],
+    "ipo_bond": [("cninfo", _ipo_bond_cninfo), ("eastmoney", _ipo_bond_em)],
+    "ipo_stock": [("cninfo", _ipo_stock_cninfo), ("eastmoney", _ipo_stock_em)],
+    "repo": [("sina", _repo_sina), ("eastmoney", _repo_em)],
+}
+
+
+def fetch_dataset(dataset, use_cache=True):
+    """
+    按 DATA_PROVIDERS 对冲请求一份逻辑数据，返回规整后的 DataFrame
+    全部数据源失败时抛出 ProviderError
+    """
+    _, result = hedged_fetch(dataset, DATA_PROVIDERS[dataset], HEDGE_BUDGETS[dataset],
+                             validate=has_columns(*DATASET_SCHEMAS[dataset]), stats=_provider_stats,
+                             use_cache=use_cache)
+    return result
+
+
+@profiler.timed()
+def fetch_lof_price(use_cache=True, symbols=None):
+    """
+    获取 LOF 行情价格表 (东方财富 fund_lof_spot_em，新浪 LOF 列表作备用)
+    symbols: 只要这些基金时传入，改用新浪批量行情一两次请求拿到，失败再退回全表
+    返回列：symbol / name / price / volume ... (已过滤无价格的)
+    """
+    if symbols is not None:
         try:
-            result = func(*args, **kwargs)
-            # 调用成功后等待一小段时间，避免连续请求触发限流
-            time.sleep(API_CALL_INTERVAL)
-            return result
+            quotes = fetch_quotes(symbols)
+            df_price = pd.DataFrame({'symbol': quotes['code'], 'name': quotes['name'],
+                                     'price': quotes['price'], 'volume': quotes['amount']})
+            return df_price[df_price['price'] > 0]
         except Exception as e:
-            print(f"   ⚠️ [{func.__name__}] 第{attempt}/{retry_times}次调用失败: {e}")
-            if attempt < retry_times:
-                print(f"   ⏳ {retry_interval}秒后重试...")
-                time.sleep(retry_interval)
-            else:
-                print(f"   ❌ [{func.__name__}] 已达最大重试次数，放弃此接口")
-                raise
+            print(f"   ⚠️ 新浪批量行情失败，改用全表: {e}")
+            df_price = fetch_lof_price(use_cache)
+            return df_price[df_price['symbol'].isin([str(s) for s in symbols])]
+
+    df_price = fetch_dataset("lof_spot", use_cache=use_cache)
+    for c in ['price', 'volume']:
+        df_price[c] = pd.to_numeric(df_price[c], errors='coerce')
+    # 过滤成交额太小的，但先保留白银LOF
+    return df_price[df_price['price'] > 0]
 
 
-def fetch_lof_data():
+@profiler.timed()
+def fetch_lof_iopv(use_cache=True):
     """
-    获取 LOF 实时数据（终极全覆盖版）
-    逻辑：现价 + (优先用实时估值 else 用官方净值)
+    获取实时估值表 (IOPV - 针对QDII/股票基)
+    返回列：symbol / iopv_realtime (已转数字，无损时为 float32)，接口异常时返回空表
     """
     try:
-        # ==========================================
-        # 1. 获取行情价格 (Price)
-        # ==========================================
-        print("1. [正在获取] 行情价格 (fund_lof_spot_em)...")
-        df_price = _call_api(ak.fund_lof_spot_em)
-        df_price.rename(columns={"代码": "symbol", "名称": "name", "最新价": "price", "成交额": "volume"}, inplace=True)
-        df_price['symbol'] = df_price['symbol'].astype(str)
-        # 过滤成交额太小的，但先保留白银LOF
-        df_price = df_price[df_price['price'] > 0]
+        df_iopv = _call_api(ak.fund_value_estimation_em, use_cache=use_cache,
+                            columns=select_columns(["代码", "估算值", "实时估值"]))
+        # 动态找列名
+        code_col_iopv = next((c for c in df_iopv.columns if "代码" in c), None)
+        val_col_iopv = next((c for c in df_iopv.columns if "估算值" in c or "实时估值" in c), None)
+
+        if code_col_iopv and val_col_iopv:
+            return pd.DataFrame({
+                'symbol': df_iopv[code_col_iopv].astype(str),
+                'iopv_realtime': to_float32(df_iopv[val_col_iopv]),
+            })
+    except:
+        print("   (实时估值接口获取失败或超时，将只使用官方净值)")
+    return pd.DataFrame(columns=['symbol', 'iopv_realtime'])
+
+
+@profiler.timed()
+def fetch_lof_nav(use_cache=True):
+    """
+    获取官方净值表 (NAV - 针对白银/商品基)
+    这个接口包含全市场所有基金的最新单位净值
+    返回列：symbol / nav_official / nav_date，接口异常时返回空表
+    """
+    try:
+        return fetch_dataset("lof_nav", use_cache=use_cache)
+    except Exception:
+        print("   (官方净值接口异常)")
+    return pd.DataFrame(columns=['symbol', 'nav_official', 'nav_date'])
 
-        # ==========================================
-        # 2. 获取实时估值 (IOPV - 针对QDII/股票基)
-        # ==========================================
-        print("2. [正在获取] 实时估值 (fund_value_estimation_em)...")
+
+def fund_gz_estimate(symbol):
+    """
+    单只基金的盘中估值 + 最新官方净值 (fundgz 接口，返回 jsonpgz({...}); 形式的脚本)
+    没有收录的基金返回 None (不算失败，不会触发熔断)
+    """
+    res = _fundgz_session.get(f"{FUNDGZ_BASE_URL}/{symbol}.js", timeout=FUNDGZ_TIMEOUT,
+                              headers={'Referer': 'http://fund.eastmoney.com/'})
+    if res.status_code == 404:
+        return None
+    res.raise_for_status()
+    body = res.text
+    payload = body[body.find("(") + 1:body.rfind(")")].strip()
+    if not payload:
+        return None
+    return json.loads(payload)
+
+
+@profiler.timed()
+def fetch_lof_reference_narrow(symbols):
+    """
+    窄抓取：只为指定基金逐只请求估值/净值，代替两张全市场大表
+    返回 (df_iopv, df_nav)，列与 fetch_lof_iopv / fetch_lof_nav 一致
+    任意一只请求失败 (网络异常/熔断) 返回 None，由调用方退回全表抓取
+    fundgz 未收录的基金从官方净值全表中补齐 (该表按交易日缓存)
+    """
+    symbols = sorted({str(s) for s in symbols})
+    with ThreadPoolExecutor(max_workers=NARROW_MAX_WORKERS, thread_name_prefix="fundgz") as pool:
+        futures = {s: pool.submit(_call_api, fund_gz_estimate, s) for s in symbols}
+
+    items = []
+    for symbol, future in futures.items():
         try:
-            df_iopv = _call_api(ak.fund_value_estimation_em)
-            # 动态找列名
-            code_col_iopv = next((c for c in df_iopv.columns if "代码" in c), None)
-            val_col_iopv = next((c for c in df_iopv.columns if "估算值" in c or "实时估值" in c), None)
-
-            if code_col_iopv and val_col_iopv:
-                df_iopv = df_iopv[[code_col_iopv, val_col_iopv]]
-                df_iopv.columns = ['symbol', 'iopv_realtime']  # 重命名
-                df_iopv['symbol'] = df_iopv['symbol'].astype(str)
-            else:
-                df_iopv = pd.DataFrame(columns=['symbol', 'iopv_realtime'])
-        except:
-            print("   (实时估值接口获取失败或超时，将只使用官方净值)")
-            df_iopv = pd.DataFrame(columns=['symbol', 'iopv_realtime'])
+            item = future.result()
+        except Exception as e:
+            print(f"   ⚠️ 窄抓取 [{symbol}] 失败，改用全表: {e}")
+            return None
+        if item:
+            items.append(item)
+
+    found = pd.DataFrame(items, columns=['fundcode', 'gsz', 'dwjz', 'jzrq'])
+    found['fundcode'] = found['fundcode'].astype(str)
+    # 窄表只有几十行，直接用 float64
+    df_iopv = pd.DataFrame({'symbol': found['fundcode'],
+                            'iopv_realtime': pd.to_numeric(found['gsz'], errors='coerce')})
+    df_nav = pd.DataFrame({'symbol': found['fundcode'],
+                           'nav_official': pd.to_numeric(found['dwjz'], errors='coerce'),
+                           'nav_date': found['jzrq']})
+
+    missing = sorted(set(symbols) - set(found['fundcode']))
+    if missing:
+        print(f"   (估值接口未收录 {len(missing)} 只，从官方净值表补齐: {', '.join(missing[:5])}...)")
+        full_nav = fetch_lof_nav()
+        fill = full_nav[full_nav['symbol'].isin(missing)]
+        # 全表的净值列可能是 float32，先还原再拼接，避免 float32 直接升 float64 带出尾差
+        fill = fill.assign(nav_official=to_float64(fill['nav_official']), nav_date=fill['nav_date'].astype(str))
+        df_nav = pd.concat([df_nav, fill], ignore_index=True)
+
+    return df_iopv, df_nav
+
+
+def build_lof_reference(df_iopv, df_nav, symbols=None):
+    """
+    把估值表和净值表合成按 symbol 索引的参考净值表 (IOPV 选取策略)
+    逻辑：
+    1. 如果有实时估值 (iopv_realtime)，就用实时的。
+    2. 如果没有实时估值 (比如白银161226)，就用官方净值 (nav_official)。
+    symbols: 只需要这些基金时传入 (如行情表里的 LOF)，两张全市场表先按代码裁剪再连接
+    返回列：iopv_realtime / nav_official / nav_date / iopv / source
+    """
+    if symbols is not None:
+        df_iopv = df_iopv[isin_keys(df_iopv['symbol'], symbols)]
+        df_nav = df_nav[isin_keys(df_nav['symbol'], symbols)]
+    ref = df_iopv.drop_duplicates('symbol').set_index('symbol').join(
+        df_nav.drop_duplicates('symbol').set_index('symbol'), how='outer'
+    )
+    for c in ['iopv_realtime', 'nav_official']:
+        # 入库时降成 float32 的列先还原，溢价率按 float64 计算
+        ref[c] = to_float64(pd.to_numeric(ref[c], errors='coerce'))
+
+    # 核心填充逻辑：创建一个最终的 'iopv' 列
+    # 优先使用 iopv_realtime，如果为空(NaN)，则填充 nav_official
+    ref['iopv'] = ref['iopv_realtime'].fillna(ref['nav_official'])
+
+    # 标记数据来源 (可选，方便调试)
+    ref['source'] = np.select(
+        [ref['iopv_realtime'].notna(), ref['nav_official'].notna()],
+        ['实时估值', '官方净值'],
+        default='无数据'
+    )
+    return ref
+
+
+@profiler.timed()
+def fetch_proxy_iopv(ref):
+    """
+    为配置了代理标的的基金计算实时估值 (utils/valuation.py)，所有标的和汇率一次批量请求新浪行情
+    ref: build_lof_reference 的输出
+    返回：按 symbol 索引的估值 Series；没有映射基金或行情失败时返回空 Series
+    """
+    table = _proxy_table[isin_keys(_proxy_table.index, ref.index)]
+    if table.empty:
+        return pd.Series(dtype=float, name='iopv_proxy')
+    try:
+        quotes = _quote_client.fetch_proxies(proxy_symbols(table))
+    except Exception as e:
+        print(f"   ⚠️ 代理标的行情获取失败，沿用官方净值: {e}")
+        return pd.Series(dtype=float, name='iopv_proxy')
 
-        # ==========================================
-        # 3. 获取官方净值 (NAV - 针对白银/商品基)
-        # ==========================================
-        print("3. [正在获取] 官方净值 (fund_open_fund_rank_em)...")
-        # 这个接口包含全市场所有基金的最新单位净值
+    _anchors.record(quotes, previous_session())
+    return estimate_iopv(ref, table, quotes, _anchors)
+
+
+def apply_proxy_iopv(ref, proxy_iopv, override=IOPV_PROXY_OVERRIDE):
+    """
+    把代理估值并入参考净值表：没有实时估值的映射基金改用代理估值 (override=True 时映射基金全部改用)
+    返回新表 (新增 iopv_proxy 列，source 标记为 代理估值)，原表不变
+    """
+    if proxy_iopv.empty:
+        return ref
+    estimate = proxy_iopv.reindex(ref.index)
+    use = estimate.notna()
+    if not override:
+        use &= ref['iopv_realtime'].isna()
+    return ref.assign(iopv_proxy=estimate, iopv=ref['iopv'].mask(use, estimate),
+                      source=ref['source'].mask(use, '代理估值'))
+
+
+@profiler.timed()
+def merge_lof_tables(df_price, ref):
+    """
+    以 Price 表为主，按 symbol 索引左连接参考净值表，清洗后计算溢价率
+    """
+    df_final = df_price.join(ref, on='symbol')
+
+    # 清洗数据 (一次布尔索引，不产生中间副本；iopv 为空时比较结果为 False)
+    df_final = df_final[df_final['price'].notna() & (df_final['iopv'] > 0.001)]
+
+    # 计算溢价率
+    df_final['premium_rate'] = (df_final['price'] - df_final['iopv']) / df_final['iopv'] * 100
+    return df_final
+
+
+def fetch_fund_types():
+    """全市场基金类型：按基金代码索引的 基金类型 Series"""
+    df = _call_api(ak.fund_name_em, columns=['基金代码', '基金类型'])
+    return pd.Series(df['基金类型'].to_numpy(), index=df['基金代码'].astype(str), name='fund_type')
+
+
+@profiler.timed()
+def classify_lofs(df):
+    """
+    给 LOF 大表补上 category (QDII / COMMODITY / LOCAL) 和 lag (到账周期，交易日) 两列
+    分类来自持久化索引，只有出现新代码时才请求一次基金类型表；请求失败时按名称分类，次日再查
+    """
+    if df.empty:
+        return df.assign(category=pd.Series(dtype=object), lag=pd.Series(dtype=float))
+    names = df.drop_duplicates('symbol').set_index('symbol')['name']
+    missing = _lof_index.missing(names.index)
+    if missing:
+        print(f"   🗂️ LOF 分类索引补充 {len(missing)} 只基金...")
+        try:
+            fund_types = fetch_fund_types()
+        except Exception as e:
+            print(f"   ⚠️ 基金类型获取失败，暂按名称分类: {e}")
+            fund_types = pd.Series(dtype=object)
+        fund_types = fund_types[~fund_types.index.duplicated()]
+        _lof_index.update(names.loc[missing], fund_types)
+
+    classes = _lof_index.lookup(df['symbol'].tolist())
+    return df.assign(category=classes['category'].to_numpy(), lag=classes['lag'].to_numpy())
+
+
+def fetch_fund_fees(symbol):
+    """单只基金的 (申购费%, 赎回费分档)，某张表取不到时对应项为 None"""
+    schedule = []
+    for indicator, parse in [("申购费率（前端）", lambda t: parse_subscribe_fee(t, SUBSCRIBE_FEE_DISCOUNT)),
+                             ("赎回费率", parse_redeem_schedule)]:
         try:
-            df_nav = _call_api(ak.fund_open_fund_rank_em, symbol="全部")
-            # 通常列名：['基金代码', '基金简称', ..., '单位净值', ...]
-            # 同样动态找一下
-            code_col_nav = next((c for c in df_nav.columns if "代码" in c), None)
-            nav_col_nav = next((c for c in df_nav.columns if "单位净值" in c), None)
-            date_col_nav = next((c for c in df_nav.columns if "日期" in c), None)
-
-            if code_col_nav and nav_col_nav:
-                df_nav = df_nav[[code_col_nav, nav_col_nav, date_col_nav]]
-                df_nav.columns = ['symbol', 'nav_official', 'nav_date']
-                df_nav['symbol'] = df_nav['symbol'].astype(str)
-            else:
-                df_nav = pd.DataFrame(columns=['symbol', 'nav_official'])
-        except:
-            print("   (官方净值接口异常)")
-            df_nav = pd.DataFrame(columns=['symbol', 'nav_official'])
+            schedule.append(parse(_call_api(ak.fund_fee_em, symbol=symbol, indicator=indicator)))
+        except Exception as e:
+            print(f"   ⚠️ [{symbol}] {indicator}获取失败: {e}")
+            schedule.append(None)
+    return tuple(schedule)
+
 
+@profiler.timed()
+def attach_lof_fees(df, refresh=True, max_refresh=FEE_REFRESH_MAX):
+    """
+    给 LOF 大表补上 subscribe_fee (申购费%) / redeem_fee (次日赎回的赎回费%) 两列
+    refresh=True 时先刷新今天还没更新过的费率表：只刷新成交额达标、溢价/折价幅度最大的前 max_refresh 只
+    盘中盯盘只查本地费率表 (refresh=False)，不发请求
+    """
+    if df.empty:
+        return df.assign(subscribe_fee=pd.Series(dtype=float), redeem_fee=pd.Series(dtype=float))
+    if refresh and max_refresh:
+        liquid = df[df['volume'] >= MIN_VOLUME]
+        ranked = liquid['symbol'].iloc[np.argsort(-liquid['premium_rate'].abs().to_numpy(), kind='stable')]
+        # 先取幅度最大的前 max_refresh 只再看是否过期：同一天内重复调用不会一路往下补刷排名靠后的基金
+        targets = _fee_store.stale(ranked.iloc[:max_refresh])
+        if targets:
+            print(f"   🧾 刷新 {len(targets)} 只基金的费率表...")
+            with ThreadPoolExecutor(max_workers=NARROW_MAX_WORKERS, thread_name_prefix="fundfee") as pool:
+                _fee_store.update(dict(zip(targets, pool.map(fetch_fund_fees, targets))))
+
+    fees = _fee_store.table(df['symbol'].tolist())
+    return df.assign(subscribe_fee=fees['subscribe_fee'].to_numpy(), redeem_fee=fees['redeem_fee'].to_numpy())
+
+
+@profiler.timed()
+def fetch_lof_data(symbols=None):
+    """
+    获取 LOF 实时数据（终极全覆盖版）
+    逻辑：现价 + (优先用实时估值 else 用代理估值 else 用官方净值)
+    symbols: 只关心的基金代码 (如白名单)；数量不超过 NARROW_FETCH_MAX 时走窄抓取，
+             只请求这些基金的估值/净值，返回的大表也只包含这些基金
+    """
+    try:
         # ==========================================
-        # 4. 数据合并 (三表合一)
+        # 1. 获取行情价格 (Price)
         # ==========================================
-        print("4. [正在计算] 数据合并与溢价计算...")
+        narrow = symbols is not None and len(symbols) <= NARROW_FETCH_MAX
+        if narrow:
+            print(f"1. [正在获取] {len(symbols)} 只基金的行情价格 (新浪批量行情)...")
+            df_price = fetch_lof_price(symbols=symbols)
+        else:
+            print("1. [正在获取] 行情价格 (fund_lof_spot_em)...")
+            df_price = fetch_lof_price()
+
+        reference = None
+        if narrow:
+            print(f"2~3. [正在获取] {len(symbols)} 只基金的估值/净值 (窄抓取 fundgz)...")
+            reference = fetch_lof_reference_narrow(symbols)
 
-        # 以 Price 表为主，左连接 IOPV 和 NAV
-        df_final = pd.merge(df_price, df_iopv, on='symbol', how='left')
-        df_final = pd.merge(df_final, df_nav, on='symbol', how='left')
+        if reference is not None:
+            df_iopv, df_nav = reference
+        else:
+            # ==========================================
+            # 2. 获取实时估值 (IOPV - 针对QDII/股票基)
+            # ==========================================
+            print("2. [正在获取] 实时估值 (fund_value_estimation_em)...")
+            df_iopv = fetch_lof_iopv()
+
+            # ==========================================
+            # 3. 获取官方净值 (NAV - 针对白银/商品基)
+            # ==========================================
+            print("3. [正在获取] 官方净值 (fund_open_fund_rank_em)...")
+            df_nav = fetch_lof_nav()
 
         # ==========================================
-        # 5. 核心逻辑：IOPV 选取策略
+        # 4. 数据合并 (三表合一) 与溢价计算
         # ==========================================
-        # 逻辑：
-        # 1. 如果有实时估值 (iopv_realtime)，就用实时的。
-        # 2. 如果没有实时估值 (比如白银161226)，就用官方净值 (nav_official)。
-
-        # 先转数字
-        cols = ['price', 'iopv_realtime', 'nav_official', 'volume']
-        for c in cols:
-            if c in df_final.columns:
-                df_final[c] = pd.to_numeric(df_final[c], errors='coerce')
-
-        # 核心填充逻辑：创建一个最终的 'iopv' 列
-        # 优先使用 iopv_realtime，如果为空(NaN)，则填充 nav_official
-        df_final['iopv'] = df_final['iopv_realtime'].fillna(df_final['nav_official'])
-
-        # 标记数据来源 (可选，方便调试)
-        df_final['source'] = df_final.apply(
-            lambda x: '实时估值' if pd.notnull(x['iopv_realtime']) else (
-                '官方净值' if pd.notnull(x['nav_official']) else '无数据'),
-            axis=1
-        )
-
-        # 清洗数据
-        df_final.dropna(subset=['price', 'iopv'], inplace=True)
-        df_final = df_final[df_final['iopv'] > 0.001]
-
-        # 计算溢价率
-        df_final['premium_rate'] = (df_final['price'] - df_final['iopv']) / df_final['iopv'] * 100
+        print("4. [正在计算] 数据合并与溢价计算...")
+        ref = build_lof_reference(df_iopv, df_nav, symbols=df_price['symbol'])
+        # 没有实时估值的商品/QDII 基金，用跟踪标的实时涨跌折算估值 (config.IOPV_PROXIES)
+        ref = apply_proxy_iopv(ref, fetch_proxy_iopv(ref))
+        df_final = attach_lof_fees(classify_lofs(merge_lof_tables(df_price, ref)))
 
         # --- 特别调试：打印白银LOF的情况 ---
         silver_check = df_final[df_final['symbol'] == '161226']
@@ -148,54 +738,51 @@ def fetch_lof_data():
         return pd.DataFrame()
 
 
+def fetch_lof_price_history(symbol, start, end):
+    """
+    单只 LOF 的历史日线 (不复权)，start/end 为 'YYYY-MM-DD'
+    返回列：date / price (收盘价) / volume (成交额)
+    """
+    df = _call_api(ak.fund_lof_hist_em, symbol=symbol, period="daily",
+                   start_date=start.replace("-", ""), end_date=end.replace("-", ""), adjust="")
+    if df.empty:
+        return pd.DataFrame(columns=['date', 'price', 'volume'])
+    return pd.DataFrame({
+        'date': pd.to_datetime(df['日期']).dt.strftime('%Y-%m-%d'),
+        'price': pd.to_numeric(df['收盘'], errors='coerce'),
+        'volume': pd.to_numeric(df['成交额'], errors='coerce'),
+    })
+
+
+def fetch_lof_nav_history(symbol, start, end):
+    """
+    单只基金的历史单位净值 (接口一次返回成立以来全部，按区间裁剪)
+    返回列：date / iopv (当日官方净值)
+    """
+    df = _call_api(ak.fund_open_fund_info_em, symbol=symbol, indicator="单位净值走势")
+    if df.empty:
+        return pd.DataFrame(columns=['date', 'iopv'])
+    nav = pd.DataFrame({
+        'date': pd.to_datetime(df['净值日期']).dt.strftime('%Y-%m-%d'),
+        'iopv': pd.to_numeric(df['单位净值'], errors='coerce'),
+    })
+    return nav[(nav['date'] >= start) & (nav['date'] <= end)]
+
+
+@profiler.timed()
 def fetch_cb_data():
     """
     获取可转债实时数据 (终极适配版)
     核心逻辑：
-    1. 使用 bond_cov_comparison 接口 (含价格+溢价率)。
+    1. 使用 bond_cov_comparison 接口 (含价格+溢价率)，超时/失败时对冲到数据中心可转债一览。
     2. 动态模糊匹配列名，防止 API 字段变动。
     3. 获取[正股代码]以便后续查询下修公告。
-    4. 自动计算双低值。
+    4. 自动计算双低值 (二叉树理论价值见 cb_pricing.attach_theoretical_values，在筛选前单独计算)。
     """
     try:
         print("📥 [正在获取] 可转债实时行情 (bond_cov_comparison)...")
-        # 接口：东方财富-可转债比价表
-        df = _call_api(ak.bond_cov_comparison)
-
-        # --- 1. 动态寻找关键列名 ---
-        col_map = {}
-
-        for col in df.columns:
-            # 排除包含 "正股" 的列名混淆，除非是我们明确需要的 "正股代码"
-
-            # 找转债代码
-            if "代码" in col and "正股" not in col:
-                col_map["symbol"] = col
-            # 找转债名称
-            elif "名称" in col and "正股" not in col:
-                col_map["name"] = col
-            # 找转债最新价
-            elif "最新价" in col and "正股" not in col:
-                col_map["price"] = col
-            # 找转股溢价率
-            elif "溢价率" in col:
-                col_map["premium_rate"] = col
-            # 找成交额 (可能叫 成交额 或 成交金额)
-            elif "成交" in col or "金额" in col:
-                col_map["volume"] = col
-            # 找正股代码 (用于后续查公告)
-            elif "正股代码" in col:
-                col_map["stock_code"] = col
-
-        # --- 2. 检查核心数据是否找到 ---
-        if "price" not in col_map or "premium_rate" not in col_map:
-            print(f"❌ 关键列(最新价/溢价率)丢失！当前所有列名: {df.columns.tolist()}")
-            return pd.DataFrame()
-
-        # --- 3. 重命名 ---
-        # 将找到的列名 (Value) 映射为标准名 (Key)
-        rename_dict = {v: k for k, v in col_map.items()}
-        df.rename(columns=rename_dict, inplace=True)
+        # --- 1~3. 对冲请求比价表/数据中心一览，列名已规整为 symbol/name/price/premium_rate... ---
+        df = fetch_dataset("cb_quotes")
 
         # --- 4. 数据清洗与兜底 ---
 
@@ -214,11 +801,10 @@ def fetch_cb_data():
             if col in df.columns:
                 df[col] = pd.to_numeric(df[col], errors='coerce')
 
-        # 过滤无效数据
+        # 过滤无效数据 (合成一个条件，只筛一次)
         # 1. 价格和溢价率不能为空
-        df.dropna(subset=['price', 'premium_rate'], inplace=True)
-        # 2. 价格必须大于0 (过滤停牌或未上市)
-        df = df[df['price'] > 0]
+        # 2. 价格必须大于0 (过滤停牌或未上市)，价格为空时比较结果为 False
+        df = df[(df['price'] > 0) & df['premium_rate'].notna()]
 
         # --- 5. 计算双低 (Double Low) ---
         # 双低 = 价格 + 溢价率
@@ -234,9 +820,10 @@ def fetch_cb_data():
         return pd.DataFrame()
 
 
+@profiler.timed()
 def fetch_today_ipo():
     """
-    获取今日可申购的新股和新债 (适配 Akshare 1.18.9 巨潮资讯接口)
+    获取今日可申购的新股和新债 (适配 Akshare 1.18.9 巨潮资讯接口，东方财富作备用数据源)
     """
     today_date = datetime.datetime.now().strftime('%Y-%m-%d')
     # 调试用：你可以把日期改成一个已知有申购的日子来测试，例如 '2023-12-26'
@@ -250,52 +837,23 @@ def fetch_today_ipo():
     print(f"📅 正在检查今日 ({today_date}) 的申购机会...")
 
     # ==============================
-    # 1. 获取新债 (CNINFO 巨潮资讯)
+    # 1. 获取新债 (CNINFO 巨潮资讯，东方财富可转债一览作备用)
     # ==============================
     try:
-        # 接口: 巨潮资讯-数据中心-专题统计-债券报表-债券发行-可转债发行
-        # 对应你的版本 __init__.py 中存在的 bond_cov_issue_cninfo
-        df_bond = _call_api(ak.bond_cov_issue_cninfo)
-
-        # 巨潮接口通常返回列：['债券代码', '债券简称', '申购日期', '申购代码', ...]
-        if not df_bond.empty:
-            # 统一日期格式
-            date_col = '申购日期'
-            if date_col in df_bond.columns:
-                df_bond[date_col] = df_bond[date_col].astype(str)
-                # 筛选今天
-                today_bonds = df_bond[df_bond[date_col] == today_date]
-
-                for _, row in today_bonds.iterrows():
-                    ipo_data['bonds'].append({
-                        "code": row.get('债券代码', 'N/A'),
-                        "name": row.get('债券简称', 'N/A'),
-                        "price": "100.00"
-                    })
+        # 规整后的列：code / name / apply_date (YYYY-MM-DD) / price
+        df_bond = fetch_dataset("ipo_bond")
+        today_bonds = df_bond[df_bond['apply_date'] == today_date]
+        ipo_data['bonds'] = today_bonds[['code', 'name', 'price']].to_dict('records')
     except Exception as e:
         print(f"⚠️ 新债接口报错: {e}")
 
     # ==============================
-    # 2. 获取新股 (CNINFO 巨潮资讯)
+    # 2. 获取新股 (CNINFO 巨潮资讯，东方财富新股申购一览作备用)
     # ==============================
     try:
-        # 接口: 巨潮资讯-数据中心-新股数据-新股发行
-        # 对应你的版本 __init__.py 中存在的 stock_new_ipo_cninfo
-        df_stock = _call_api(ak.stock_new_ipo_cninfo)
-
-        # 巨潮接口通常返回列：['证券代码', '证券简称', '申购日期', '发行价', ...]
-        if not df_stock.empty:
-            date_col = '申购日期'
-            if date_col in df_stock.columns:
-                df_stock[date_col] = df_stock[date_col].astype(str)
-                today_stocks = df_stock[df_stock[date_col] == today_date]
-
-                for _, row in today_stocks.iterrows():
-                    ipo_data['stocks'].append({
-                        "code": row.get('证券代码', 'N/A'),
-                        "name": row.get('证券简称', 'N/A'),
-                        "price": str(row.get('发行价', '0'))
-                    })
+        df_stock = fetch_dataset("ipo_stock")
+        today_stocks = df_stock[df_stock['apply_date'] == today_date]
+        ipo_data['stocks'] = today_stocks[['code', 'name', 'price']].to_dict('records')
     except Exception as e:
         print(f"⚠️ 新股接口报错: {e}")
 
@@ -360,72 +918,37 @@ def fetch_today_ipo():
 #         return pd.DataFrame()
 
 
-def fetch_repo_data():
+def refresh_trade_calendar():
     """
-    获取国债逆回购实时数据 (GC001 和 R-001)
-    稳定版：使用新浪原生接口，完全兼容原返回结构
+    当年的休市安排不在交易日历里时 (跨年后内置表过期)，拉取交易所交易日表更新
+    每个交易日最多请求一次，失败只打印警告，日历退回只排除周末
     """
+    if datetime.date.today().year in get_calendar().years:
+        return
     try:
-        print("💰 [正在获取] 国债逆回购实时利率 (Sina API)...")
+        df = _call_api(ak.tool_trade_date_hist_sina)
+        added = update_calendar(df['trade_date'].tolist())
+        if added:
+            print(f"   📅 交易日历已更新: {', '.join(map(str, added))}")
+    except Exception as e:
+        print(f"   ⚠️ 交易日历更新失败，按周末规则推算: {e}")
 
-        # 1. 请求数据
-        # sh204001: GC001, sz131810: R-001
-        url = "http://hq.sinajs.cn/list=sh204001,sz131810"
-        headers = {'Referer': 'http://finance.sina.com.cn/'}
 
-        try:
-            res = requests.get(url, headers=headers, timeout=5)
-            res.encoding = 'gbk'
-        except Exception as e:
-            print(f"   ⚠️ 网络请求失败: {e}")
-            return pd.DataFrame()
-
-        data_list = []
-
-        # 2. 解析文本
-        for line in res.text.strip().split('\n'):
-            if '="' not in line:
-                continue
-
-            prefix, content = line.split('="')
-            # 提取代码 (从 hq_str_sh204001 中提取 204001)
-            code = prefix.split('_')[-1][2:]
-            fields = content.strip('";').split(',')
-
-            # 字段校验：新浪正常返回有 30 多个字段，fields[3] 是最新价
-            if len(fields) > 3 and fields[0] != "":
-                try:
-                    name = fields[0]
-                    prev_close = float(fields[2]) if fields[2] else 0.0
-                    rate = float(fields[3]) if fields[3] else 0.0
-
-                    # 计算涨跌幅 (计算逻辑增强：仅在有成交时计算)
-                    change_percent = 0.0
-                    if prev_close > 0 and rate > 0:
-                        change_percent = (rate - prev_close) / prev_close * 100
-
-                    data_list.append({
-                        'code': code,
-                        'name': name,
-                        'rate': rate,
-                        'change_percent': change_percent
-                    })
-                except (ValueError, IndexError):
-                    continue
-
-        # 3. 构建 DataFrame
-        if not data_list:
-            return pd.DataFrame()
-
-        df = pd.DataFrame(data_list)
-
-        # 4. 类型转换 (确保与原接口完全一致)
-        df['rate'] = pd.to_numeric(df['rate'], errors='coerce')
-        df['change_percent'] = pd.to_numeric(df['change_percent'], errors='coerce')
+@profiler.timed()
+def fetch_repo_data():
+    """
+    获取国债逆回购全部期限 (沪深各 1~182 天) 的实时利率，一次批量行情请求
+    新浪批量行情为主、东方财富回购行情为备用
+    返回列：code / name / rate / change_percent / tenor (期限天数)
+    """
+    try:
+        print("💰 [正在获取] 国债逆回购全期限实时利率 (Sina API)...")
+        refresh_trade_calendar()
+        df = fetch_dataset("repo", use_cache=False)
         # 强制 code 为字符串，防止被识别为数字导致 001 变成 1
         df['code'] = df['code'].astype(str)
-
-        return df
+        df['tenor'] = df['code'].map(REPO_TENORS)
+        return df[df['tenor'].notna()].astype({'tenor': int}).reset_index(drop=True)
 
     except Exception as e:
         print(f"❌ 国债逆回购获取失败: {e}")
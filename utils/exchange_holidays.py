@@ -0,0 +1,39 @@
+"""
+交易所休市表 (只依赖标准库)：内置近几年公布的休市安排 + 从交易所交易日表落盘的 JSON
+入口处判断"今天归属哪个交易日"时用这里的逐日回退，不加载 numpy；
+需要批量查询时用 utils/trade_calendar.py 展开的数组日历 (两者用同一份休市表)
+"""
+import datetime
+import functools
+import os
+
+from utils.state import load_json
+
+# --- 休市表配置 ---
+CALENDAR_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".trade_calendar.json")
+
+# 交易所公布的休市安排中落在工作日的日期 (周末本来就休市，调休上班的周末也不开市)
+HOLIDAYS = {
+    2024: ["01-01", "02-09", "02-12", "02-13", "02-14", "02-15", "02-16", "04-04", "04-05",
+           "05-01", "05-02", "05-03", "06-10", "09-16", "09-17", "10-01", "10-02", "10-03", "10-04", "10-07"],
+    2025: ["01-01", "01-28", "01-29", "01-30", "01-31", "02-03", "02-04", "04-04", "05-01", "05-02", "05-05",
+           "06-02", "10-01", "10-02", "10-03", "10-06", "10-07", "10-08"],
+    2026: ["01-01", "01-02", "02-16", "02-17", "02-18", "02-19", "02-20", "02-23", "04-06", "05-01", "05-04",
+           "05-05", "06-19", "09-25", "10-01", "10-02", "10-05", "10-06", "10-07"],
+}
+
+
+@functools.lru_cache(maxsize=None)
+def load_holidays(state_file=CALENDAR_FILE):
+    """内置休市表 + 落盘的交易所休市表 (后者优先)，{年份: ['MM-DD', ...]}；结果按文件缓存"""
+    holidays = dict(HOLIDAYS)
+    holidays.update({int(year): days for year, days in load_json(state_file, {}).items()})
+    return holidays
+
+
+def last_session(day, state_file=CALENDAR_FILE):
+    """不晚于 day 的最后一个交易日 (date)，逐日回退跳过周末和休市日；没有休市数据的年份只跳过周末"""
+    holidays = load_holidays(state_file)
+    while day.weekday() >= 5 or day.strftime("%m-%d") in holidays.get(day.year, ()):
+        day -= datetime.timedelta(days=1)
+    return day
@@ -0,0 +1,148 @@
+"""
+LOF 费率表与净套利测算
+  1. 每只基金的申购费率、按持有天数分档的赎回费率来自天天基金基金档案 (ak.fund_fee_em)，
+     落盘为 JSON，每个交易日最多刷新一次；单次运行只刷新有机会的前 N 只，其余沿用上次的费率表
+  2. 两条套利路径一次算完全部基金 (整列运算)：
+       溢价：场外申购 -> 确认后场内卖出   净收益 = 溢价率 - 申购费 - 卖出佣金 - 资金占用成本
+       折价：场内买入 -> 次日场外赎回     净收益 = 折价幅度 - 买入佣金 - 赎回费 - 资金占用成本
+     资金占用按 到账周期 (分类索引的 lag) 折算成自然日，乘以年化资金成本 (逆回购利率)
+"""
+import datetime
+import os
+import re
+import threading
+
+import numpy as np
+import pandas as pd
+
+from utils.state import load_json, save_json_atomic
+
+# --- 费率与资金成本配置 ---
+FEE_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".fee_schedule.json")
+SHORT_REDEEM_FEE = 1.5       # 持有不满 7 天的惩罚性赎回费(%)，法规下限，费率表缺失时使用
+REDEEM_HOLD_DAYS = 1         # 折价套利：场内买入次日赎回，持有 1 天
+CALENDAR_PER_TRADING = 7 / 5  # 交易日折算自然日
+
+_PERCENT = re.compile(r"(\d+(?:\.\d+)?)\s*%")
+_PERIOD = re.compile(r"大于等于\s*(\d+(?:\.\d+)?)\s*(天|日|个月|月|年)")
+_UNIT_DAYS = {"天": 1, "日": 1, "个月": 30, "月": 30, "年": 365}
+
+
+def parse_percent(text):
+    """'1.50%' / '1.50%|0.15%' -> 第一个百分数 (1.5)，没有百分数 (如 '每笔1000元') 返回 None"""
+    match = _PERCENT.search(str(text))
+    return float(match.group(1)) if match else None
+
+
+def parse_period_days(text):
+    """赎回期限 '大于等于7天，小于30天' -> 起始天数 7；'小于7天' -> 0"""
+    match = _PERIOD.search(str(text))
+    if not match:
+        return 0
+    return int(float(match.group(1)) * _UNIT_DAYS[match.group(2)])
+
+
+def _rate_column(df):
+    for col in ["原费率", "赎回费率", "费率"]:
+        if col in df.columns:
+            return col
+    return df.columns[-1]
+
+
+def parse_subscribe_fee(df, discount=1.0):
+    """申购费率表 -> 最低金额档的原费率 x 折扣 (%)，解析不到返回 None"""
+    if df is None or df.empty:
+        return None
+    rates = [parse_percent(v) for v in df[_rate_column(df)]]
+    rates = [r for r in rates if r is not None]
+    return round(rates[0] * discount, 4) if rates else None
+
+
+def parse_redeem_schedule(df):
+    """赎回费率表 -> [(起始持有天数, 费率%)] 按天数升序，解析不到返回 None"""
+    if df is None or df.empty or "适用期限" not in df.columns:
+        return None
+    schedule = {}
+    for period, rate in zip(df["适用期限"], df[_rate_column(df)]):
+        rate = parse_percent(rate)
+        if rate is not None:
+            schedule[parse_period_days(period)] = rate
+    return sorted(schedule.items()) or None
+
+
+def redeem_fee(schedule, hold_days):
+    """按持有天数取赎回费率：起始天数不超过持有天数的最后一档"""
+    if not schedule:
+        return np.nan
+    fee = schedule[0][1]
+    for start, rate in schedule:
+        if start <= hold_days:
+            fee = rate
+    return fee
+
+
+class FeeStore:
+    """
+    持久化的费率表 {代码: {"subscribe": 申购费%, "redeem": [[起始天数, 费率%]], "updated": 日期}}
+    state_file 为空时只在内存中维护 (测试/基准用)
+    按持有天数算好的费率按代码缓存成表，批量查询整列 reindex，费率表更新后重算
+    """
+
+    def __init__(self, state_file=None):
+        self.state_file = state_file
+        self._fees = load_json(state_file, {})
+        self._tables = {}
+        self._lock = threading.Lock()
+
+    def stale(self, symbols, today=None):
+        """今天还没刷新过费率表的代码 (保持输入顺序)"""
+        today = (today or datetime.date.today()).strftime("%Y-%m-%d")
+        with self._lock:
+            return [s for s in dict.fromkeys(symbols) if self._fees.get(s, {}).get("updated") != today]
+
+    def update(self, schedules, today=None):
+        """schedules: {代码: (申购费, 赎回分档)}，解析失败的字段沿用旧值"""
+        if not schedules:
+            return
+        today = (today or datetime.date.today()).strftime("%Y-%m-%d")
+        with self._lock:
+            for symbol, (subscribe, redeem) in schedules.items():
+                old = self._fees.get(symbol, {})
+                self._fees[symbol] = {
+                    "subscribe": subscribe if subscribe is not None else old.get("subscribe"),
+                    "redeem": [list(item) for item in redeem] if redeem else old.get("redeem"),
+                    "updated": today,
+                }
+            self._tables.clear()
+            save_json_atomic(self.state_file, self._fees, "费率表")
+
+    def table(self, symbols, hold_days=REDEEM_HOLD_DAYS):
+        """按代码批量取 申购费 / 持有 hold_days 天的赎回费，没有费率表的为 NaN"""
+        with self._lock:
+            table = self._tables.get(hold_days)
+            if table is None:
+                rows = self._fees.values()
+                table = self._tables[hold_days] = pd.DataFrame({
+                    "subscribe_fee": [np.nan if r.get("subscribe") is None else r["subscribe"] for r in rows],
+                    "redeem_fee": [redeem_fee(r.get("redeem"), hold_days) for r in rows],
+                }, index=pd.Index(list(self._fees), dtype=str), dtype=float)
+        return table.reindex(pd.Index(symbols, dtype=str))
+
+
+
+def net_arbitrage(premium, subscribe_fee, redeem_fee, lag, commission, capital_rate, fallback_cost):
+    """
+    向量化净套利测算，所有输入为等长数组 (费率均为 %)
+    premium: 溢价率；lag: 到账周期 (交易日，缺失按 1)；capital_rate: 年化资金成本
+    fallback_cost: 没有申购费率时沿用的综合成本 (旧口径 COST_RATE)
+    返回：(溢价路径净收益, 折价路径净收益)，单位 %
+    """
+    lag = np.nan_to_num(np.asarray(lag, dtype=float), nan=1.0)
+    daily = np.asarray(capital_rate, dtype=float) / 365 * CALENDAR_PER_TRADING
+    # 溢价：T 日申购，T+lag 确认，次日卖出
+    subscribe_cost = np.where(np.isnan(subscribe_fee), fallback_cost, subscribe_fee + commission)
+    net_subscribe = premium - subscribe_cost - daily * (lag + 1)
+    # 折价：T 日买入，T+1 赎回，赎回款 T+1+lag 到账
+    redeem_cost = commission + np.nan_to_num(redeem_fee, nan=SHORT_REDEEM_FEE)
+    net_redeem = -premium - redeem_cost - daily * (lag + 2)
+    return net_subscribe, net_redeem
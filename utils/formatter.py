@@ -1,11 +1,28 @@
 import datetime
 
 from tabulate import tabulate
+from utils import profiler
 from utils.strategy import analyze_single_lof
 from config import COST_RATE
 
+REPO_SHOW_TOP = 4            # 逆回购只展示实际年化最高的几个期限
+LOF_SHOW_TOP = 20            # LOF 机会只展示净利最高的前几只 (全市场扫描时机会可能上百只)
 
-def format_text_report(lof_df, lof_opps, cb_opps=None, ipo_data=None, repo_list=None): # <--- 新增 repo_list
+
+def _settle_text(item):
+    """LOF 机会的申赎到账周期 (分类索引给出)，没有时不显示"""
+    return f" | 到账: {item['settle']}" if item.get('settle') else ""
+
+
+def _mispricing_text(value):
+    """定价偏离 (%) 显示文本，无法定价 (NaN/缺失) 时显示 -"""
+    if value is None or value != value:
+        return "-"
+    return f"{value:+.1f}%"
+
+
+@profiler.timed()
+def format_text_report(lof_df, lof_opps, cb_opps=None, ipo_data=None, repo_list=None, cost_rate=COST_RATE): # <--- 新增 repo_list
 
     """
     生成纯文本推送报告
@@ -54,18 +71,21 @@ def format_text_report(lof_df, lof_opps, cb_opps=None, ipo_data=None, repo_list=
     # 💰 第二部分：国债逆回购 (新增)
     # ==============================
     if repo_list:
-        # 只有当利率大于 2.0 或者 是周四的时候才显示，避免垃圾时间占版面
+        # 只有当利率大于 2.0 或者 有假期红利 (计息天数多于资金占用天数) 的时候才显示，避免垃圾时间占版面
         # 或者你可以选择永远显示
-        show_repo = any(item['rate'] > 2.0 for item in repo_list) or (datetime.datetime.now().weekday() == 3)
+        show_repo = any(item['rate'] > 2.0 or item['interest_days'] > item['tenor'] for item in repo_list)
 
         if show_repo:
             lines.append("💰 【闲钱理财 · 国债逆回购】")
             lines.append("💡 操作：选择【卖出】(借钱给别人)")
             lines.append("-" * 30)
 
-            for item in repo_list:
-                lines.append(f"👉 {item['name']} ({item['code']})")
+            # 已按实际年化从高到低排序，只展示前几个期限
+            for item in repo_list[:REPO_SHOW_TOP]:
+                lines.append(f"👉 {item['name']} ({item['code']}) {item['tenor']}天期")
                 lines.append(f"   年化利率: {item['rate']}% {item['tag']}")
+                lines.append(f"   计息 {item['interest_days']} 天 | 实际年化: {item['effective_rate']}% | "
+                             f"{item['usable']} 可用, {item['withdrawable']} 可取")
                 lines.append(f"   每10w收益: 约 {item['profit_txt']}")
                 lines.append(f"   📝 {item['advice']}")
                 lines.append("-" * 30)
@@ -75,18 +95,21 @@ def format_text_report(lof_df, lof_opps, cb_opps=None, ipo_data=None, repo_list=
     # ==============================
     if lof_opps:
         lines.append("🚀 【LOF 高价值套利机会】")
-        lines.append(f"💡 扣费标准: {COST_RATE}% | 务必试单限购")
+        lines.append(f"💡 净利按各基金申赎费率+佣金+资金成本测算 (无费率表扣 {cost_rate}%) | 务必试单限购")
         lines.append("-" * 30)
 
-        for item in lof_opps:
+        # 已按净利从高到低排序，只展示前几只
+        for item in lof_opps[:LOF_SHOW_TOP]:
             lines.append(f"👉 {item['name']} ({item['code']}) {item['tag']}")
-            lines.append(f"   现价: {item['price']} | 溢价率: {item['premium']}%")
+            lines.append(f"   现价: {item['price']} | 溢价率: {item['premium']}%{_settle_text(item)}")
             lines.append(f"   💰 净利(扣费): {item['net_prem']}%")
             lines.append(f"   📝 建议: {item['advice']}")
             lines.append("-" * 30)
+        if len(lof_opps) > LOF_SHOW_TOP:
+            lines.append(f"... 另有 {len(lof_opps) - LOF_SHOW_TOP} 只符合条件的基金未展示")
         lines.append("\n")
     else:
-        lines.append("😴 今日无符合策略的高溢价 LOF 机会。\n")
+        lines.append("😴 今日无符合策略的溢价/折价 LOF 机会。\n")
 
     # ==============================
     # 📊 第二部分：LOF 市场 Top 10
@@ -94,8 +117,8 @@ def format_text_report(lof_df, lof_opps, cb_opps=None, ipo_data=None, repo_list=
     lines.append("📊 【LOF 溢价率 Top 10】")
 
     if not lof_df.empty:
-        # 准备 Top 10 数据
-        top10 = lof_df.sort_values(by='premium_rate', ascending=False).head(10).copy()
+        # 准备 Top 10 数据 (只取前 10 行，不对全市场大表整体排序复制)
+        top10 = lof_df.nlargest(10, 'premium_rate')
 
         # 格式化数据以便展示
         table_data = []
@@ -137,13 +160,14 @@ def format_text_report(lof_df, lof_opps, cb_opps=None, ipo_data=None, repo_list=
                 item['name'],
                 f"{item['price']}",
                 f"{item['premium']:.2f}%",
-                f"{item['double_low']:.2f}"
+                f"{item['double_low']:.2f}",
+                _mispricing_text(item.get('mispricing')),
             ])
 
         # 生成转债表格
         cb_str = tabulate(
             cb_table_data,
-            headers=['名称', '价格', '溢价率', '双低值'],
+            headers=['名称', '价格', '溢价率', '双低值', '理论偏离'],
             tablefmt='simple',
             stralign='right'
         )
@@ -157,6 +181,7 @@ def format_text_report(lof_df, lof_opps, cb_opps=None, ipo_data=None, repo_list=
                     has_news = True
                 lines.append(f"• {item['name']}: {item['news']}")
         lines.append("\n📝 说明：双低值通常 <130 较安全，适合摊大饼持有。")
+        lines.append("📐 理论偏离 = (价格 - 二叉树理论价值) / 理论价值，负数表示比理论价值便宜。")
 
     # ==============================
     # ⚠️ 底部风险提示
@@ -165,4 +190,21 @@ def format_text_report(lof_df, lof_opps, cb_opps=None, ipo_data=None, repo_list=
     lines.append("1. QDII/商品LOF数据有滞后，操作前请参考期货走势。")
     lines.append("2. 转债请避免买入高价妖债，注意强赎风险。")
 
-    return "\n".join(lines)
\ No newline at end of file
+    return "\n".join(lines)
+
+def format_watch_alert(lof_opps):
+    """
+    生成盘中盯盘提醒 (只包含本轮新出现/继续走高的 LOF 机会)
+    """
+    lines = [f"⏰ {datetime.datetime.now().strftime('%H:%M:%S')} 盘中溢价提醒"]
+    lines.append(f"💡 净利按各基金申赎费率+佣金+资金成本测算 (无费率表扣 {COST_RATE}%) | 务必试单限购")
+    lines.append("-" * 30)
+
+    for item in lof_opps:
+        lines.append(f"👉 {item['name']} ({item['code']}) {item['tag']}")
+        lines.append(f"   现价: {item['price']} | 溢价率: {item['premium']}%{_settle_text(item)}")
+        lines.append(f"   💰 净利(扣费): {item['net_prem']}%")
+        lines.append(f"   📝 建议: {item['advice']}")
+        lines.append("-" * 30)
+
+    return "\n".join(lines)
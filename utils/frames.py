@@ -0,0 +1,74 @@
+"""
+精简 DataFrame 内存：全市场大表 (估值/净值，上万行) 入库时只留需要的列，数值列在无损时降为 float32，
+重复值多的文本列转 category；与小表连接前先按代码裁剪行，计算前再还原成 float64
+代码列不做转换：pandas 3 的默认字符串类型已经是 Arrow 存储，比 category 更适合做连接键
+"""
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+VALUE_DECIMALS = 4        # 净值/估值的小数位数，float32 往返后按该位数还原
+
+
+def select_columns(columns):
+    """
+    生成列选择函数 (传给 _call_api 的 columns 参数)：保留列名包含任一关键词的列
+    接口列名带日期等变化部分时用关键词匹配
+    """
+    def select(names):
+        return [c for c in names if any(key in c for key in columns)]
+    return select
+
+
+def to_float32(series, decimals=VALUE_DECIMALS):
+    """
+    转数字 (非数字变 NaN)，能无损往返时降为 float32
+    无损：float32 还原到 decimals 位小数后与原值完全一致 (原值超过该精度或数值太大时保留 float64)
+    """
+    values = pd.to_numeric(series, errors='coerce').astype('float64')
+    narrow = values.astype('float32')
+    if narrow.astype('float64').round(decimals).equals(values):
+        return narrow
+    return values
+
+
+def to_float64(series, decimals=VALUE_DECIMALS):
+    """参与计算前还原：float32 列按 decimals 位小数还原成原值，其他列原样返回"""
+    if series.dtype == np.float32:
+        return series.astype('float64').round(decimals)
+    return series
+
+
+def to_category(series):
+    """
+    重复值多的列 (日期/来源) 转 category，类别统一为字符串
+    先去重再转字符串：接口给的日期对象逐个 str() 很慢，上万行里其实只有几个不同的值
+    """
+    codes, uniques = pd.factorize(series, use_na_sentinel=False)
+    labels = pd.Index(uniques).astype(str)
+    return pd.Series(labels.take(codes), index=series.index, name=series.name).astype('category')
+
+
+def isin_keys(values, keys):
+    """
+    代码列的成员判断，返回布尔 ndarray (values 可以是 Series 或 Index)
+    pandas 3 的字符串列做 isin 时会把 keys 逐个转成 Arrow 标量，keys 是上千行的行情表代码时比查表本身慢得多；
+    这里两边整批转成 Arrow 数组交给 pyarrow 计算
+    """
+    keys = pd.Index(keys).astype(str)
+    return pc.is_in(pa.array(values.astype(str).array), value_set=pa.array(keys.array)).to_numpy(zero_copy_only=False)
+
+
+def records(df):
+    """
+    DataFrame -> 行字典列表，结果与 df.to_dict('records') 相同
+    to_dict 对 Arrow 字符串列逐个装箱，机会多时是筛选阶段的主要开销；这里按列整批转成 Python 对象再拼行
+    """
+    columns = list(df.columns)
+    return [dict(zip(columns, row)) for row in zip(*(df[c].tolist() for c in columns))]
+
+
+def frame_bytes(df):
+    """DataFrame 实际占用的内存 (含字符串内容)"""
+    return int(df.memory_usage(index=True, deep=True).sum())
@@ -0,0 +1,228 @@
+import datetime
+import glob
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+# --- 历史快照库配置 ---
+# 目录结构：{HISTORY_DIR}/{数据集}/date=YYYY-MM-DD/part-*.parquet (盘中小文件) 或 daily.parquet (压缩后)
+# 回填的日线数据集按代码一个文件：{HISTORY_DIR}/{日线数据集}/{代码}.parquet (见 utils/backfill.py)
+HISTORY_DIR = os.environ.get(
+    "LOF_HISTORY_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "history"),
+)
+ROW_GROUP_SIZE = 65536        # 每个行组的行数，行组内按 symbol 排序，便于按代码跳过整块数据
+HISTORY_MIN_SAMPLES = 20      # 计算分位数至少需要的历史样本数
+
+# 各数据集保存的列 (timestamp 由写入时补充)
+DATASET_COLUMNS = {
+    "lof": ["symbol", "price", "iopv", "source", "premium_rate", "volume"],
+    "cb": ["symbol", "price", "premium_rate", "double_low", "volume"],
+}
+# 各列的存储类型：写入时统一转换，读取/压缩时按同一 schema 扫描
+# 同一列在不同分区里不能一会儿 int64 一会儿 double (如 volume)、一会儿 dictionary 一会儿 string (如 source)
+COLUMN_TYPES = {
+    "date": pa.string(),
+    "symbol": pa.string(),
+    "timestamp": pa.timestamp("us"),
+    "price": pa.float64(),
+    "iopv": pa.float64(),
+    "source": pa.string(),
+    "premium_rate": pa.float64(),
+    "double_low": pa.float64(),
+    "volume": pa.float64(),
+}
+# 盘中快照数据集 -> 回填的日线数据集 (列相同，另有 date 列；每天一条，timestamp 为当日收盘)
+DAILY_DATASETS = {"lof": "lof_daily"}
+DAILY_CLOSE_TIME = "15:00"
+
+_PARTITIONING = ds.partitioning(pa.schema([("date", pa.string())]), flavor="hive")
+
+
+def _dataset_dir(dataset):
+    return os.path.join(HISTORY_DIR, dataset)
+
+
+def _schema(columns):
+    return pa.schema([(c, COLUMN_TYPES[c]) for c in columns])
+
+
+def _dataset_schema(dataset, daily=False):
+    """数据集扫描用的完整 schema：盘中快照的 date 来自分区目录，日线的 date 是文件里的列"""
+    columns = ["symbol", "timestamp", *[c for c in DATASET_COLUMNS[dataset] if c != "symbol"]]
+    return _schema(["date", *columns] if daily else [*columns, "date"])
+
+
+def _to_table(df):
+    """按 COLUMN_TYPES 转成 Arrow 表 (int 成交量转 double、category 转 string)"""
+    return pa.Table.from_pandas(df, schema=_schema(df.columns), preserve_index=False)
+
+
+def _write_parquet(table, path):
+    """先写临时文件再原子替换，避免读到半截文件 (以 . 开头的临时文件不会被数据集扫描到)"""
+    tmp_path = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.tmp")
+    pq.write_table(table, tmp_path, row_group_size=ROW_GROUP_SIZE, compression="zstd")
+    os.replace(tmp_path, path)
+
+
+def append_snapshot(dataset, df, ts=None):
+    """
+    追加一次快照到当日分区 (只追加，不改旧数据)
+    返回写入的行数
+    """
+    if df is None or df.empty:
+        return 0
+
+    ts = ts or datetime.datetime.now()
+    cols = [c for c in DATASET_COLUMNS[dataset] if c in df.columns]
+    snap = df[cols].copy()
+    snap['symbol'] = snap['symbol'].astype(str)
+    snap.insert(1, 'timestamp', pd.Timestamp(ts))
+    snap = snap.sort_values('symbol', kind='stable')
+
+    part_dir = os.path.join(_dataset_dir(dataset), f"date={ts.strftime('%Y-%m-%d')}")
+    os.makedirs(part_dir, exist_ok=True)
+    path = os.path.join(part_dir, f"part-{ts.strftime('%H%M%S%f')}.parquet")
+    _write_parquet(_to_table(snap), path)
+    return len(snap)
+
+
+def write_daily(dataset, symbol, df):
+    """
+    回填：把一只基金的一段日线按日期合并进它的文件 (同一天以新数据为准，其他日期保留)
+    不同区间分几次回填会逐步积累，同一区间重复回填结果不变
+    df 需含 date ('YYYY-MM-DD') 及 DATASET_COLUMNS 中的列；返回写入的行数
+    """
+    daily = DAILY_DATASETS[dataset]
+    cols = [c for c in DATASET_COLUMNS[dataset] if c in df.columns and c != 'symbol']
+    out = df[['date'] + cols].copy()
+    out.insert(1, 'symbol', str(symbol))
+    out.insert(2, 'timestamp', pd.to_datetime(out['date'] + " " + DAILY_CLOSE_TIME))
+
+    path = os.path.join(_dataset_dir(daily), f"{symbol}.parquet")
+    if os.path.exists(path):
+        old = ds.dataset(path, format="parquet", schema=_dataset_schema(dataset, daily=True)).to_table()
+        out = pd.concat([old.to_pandas(), out], ignore_index=True)
+        out = out.drop_duplicates(subset='date', keep='last')
+    out = out.sort_values('date', kind='stable')
+    os.makedirs(_dataset_dir(daily), exist_ok=True)
+    _write_parquet(_to_table(out), path)
+    return len(df)
+
+
+def _read_dataset(root, partitioning, schema, symbols=None, start=None, end=None, columns=None):
+    # 显式 schema：各文件按统一类型读取，旧文件里的 int 成交量等也能和新文件拼在一起
+    dataset_obj = ds.dataset(root, format="parquet", partitioning=partitioning, schema=schema)
+    expr = None
+    conditions = []
+    if start:
+        conditions.append(ds.field("date") >= start)
+    if end:
+        conditions.append(ds.field("date") <= end)
+    if symbols is not None:
+        conditions.append(ds.field("symbol").isin(pa.array([str(s) for s in symbols], type=pa.string())))
+    for cond in conditions:
+        expr = cond if expr is None else expr & cond
+
+    table = dataset_obj.to_table(columns=columns, filter=expr)
+    return table.to_pandas()
+
+
+def read_history(dataset, symbols=None, start=None, end=None, columns=None, backfill=False):
+    """
+    读取历史快照
+    start/end: 'YYYY-MM-DD' 闭区间，按分区目录裁剪，不相关的日期不会被打开
+    symbols: 只读这些代码，谓词下推到 parquet 行组统计信息
+    backfill: 同时读取回填的日线，盘中快照里没有的 (日期, 代码) 用日线补上
+    返回列：date / symbol / timestamp / ...
+    """
+    root = _dataset_dir(dataset)
+    live = pd.DataFrame()
+    if os.path.isdir(root):
+        live = _read_dataset(root, _PARTITIONING, _dataset_schema(dataset), symbols, start, end, columns)
+
+    daily_root = _dataset_dir(DAILY_DATASETS.get(dataset, ""))
+    if not backfill or dataset not in DAILY_DATASETS or not os.path.isdir(daily_root):
+        return live
+    daily = _read_dataset(daily_root, None, _dataset_schema(dataset, daily=True), symbols, start, end,
+                          None if columns is None else list(dict.fromkeys(['date', 'symbol', *columns])))
+    if daily.empty:
+        return live
+    if not live.empty and 'date' in live.columns:
+        seen = pd.MultiIndex.from_frame(live[['date', 'symbol']].astype(str))
+        daily = daily[~pd.MultiIndex.from_frame(daily[['date', 'symbol']].astype(str)).isin(seen)]
+    if columns is not None:
+        daily = daily[columns]
+    return pd.concat([live, daily], ignore_index=True)
+
+
+def compact(dataset, before=None):
+    """
+    把盘中的小文件合并成每日一个 daily.parquet (按 symbol、timestamp 排序)
+    before: 只压缩该日期之前的分区，默认今天之前 (今天可能还在写入)
+    返回压缩的分区数
+    """
+    before = before or datetime.date.today().strftime("%Y-%m-%d")
+    # 分区内的文件不含 date 列 (在目录名里)
+    schema = _schema([c for c in _dataset_schema(dataset).names if c != "date"])
+    compacted = 0
+    for part_dir in sorted(glob.glob(os.path.join(_dataset_dir(dataset), "date=*"))):
+        date = os.path.basename(part_dir).split("=", 1)[1]
+        parts = sorted(glob.glob(os.path.join(part_dir, "part-*.parquet")))
+        if date >= before or not parts:
+            continue
+
+        daily = os.path.join(part_dir, "daily.parquet")
+        files = parts + ([daily] if os.path.exists(daily) else [])
+        table = ds.dataset(files, format="parquet", schema=schema).to_table()
+        table = table.sort_by([("symbol", "ascending"), ("timestamp", "ascending")])
+        _write_parquet(table, daily)
+        for f in parts:
+            os.remove(f)
+        compacted += 1
+    return compacted
+
+
+def premium_percentile(df, lookback_days=365, column='premium_rate', dataset='lof'):
+    """
+    计算当前值在各自历史中的分位数 (0~100)
+    一次读取所有相关代码的历史，按代码分组向量化比较
+    历史样本不足 HISTORY_MIN_SAMPLES 的代码返回 NaN
+    返回：与 df 同索引的 Series
+    """
+    result = pd.Series(np.nan, index=df.index)
+    if df.empty:
+        return result
+
+    start = (datetime.date.today() - datetime.timedelta(days=lookback_days)).strftime("%Y-%m-%d")
+    hist = read_history(dataset, symbols=df['symbol'].unique(), start=start, columns=['date', 'symbol', column],
+                        backfill=True)
+    if hist.empty:
+        return result
+
+    current = df[['symbol', column]].drop_duplicates('symbol').set_index('symbol')[column]
+    hist['current'] = hist['symbol'].map(current)
+    hist['below'] = hist[column] <= hist['current']
+    stats = hist.groupby('symbol')['below'].agg(['mean', 'size'])
+    pctl = (stats['mean'] * 100).where(stats['size'] >= HISTORY_MIN_SAMPLES)
+    return df['symbol'].map(pctl).astype(float)
+
+
+def record_snapshots(frames, ts=None):
+    """
+    把本次运行的结果追加到历史库，并顺手压缩之前交易日的盘中小文件
+    frames: {数据集: DataFrame}，写入失败只打印警告，不影响主流程
+    """
+    ts = ts or datetime.datetime.now()
+    for dataset, df in frames.items():
+        try:
+            rows = append_snapshot(dataset, df, ts)
+            compact(dataset)
+            if rows:
+                print(f"🗄️ [{dataset}] 已保存 {rows} 条历史快照")
+        except Exception as e:
+            print(f"⚠️ [{dataset}] 历史快照保存失败: {e}")
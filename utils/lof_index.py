@@ -0,0 +1,103 @@
+"""
+LOF 分类索引：每只 LOF -> 类别 (QDII / 商品 / 国内) + 申赎到账周期 (T+1 / T+2)
+  1. 类别按天天基金的基金类型判断 (QDII-xxx / 指数型-海外股票 / 商品)，类型缺失时才退回按名称关键词猜
+  2. 索引落盘为 JSON，跨运行保留；行情表里出现新代码时才拉一次基金类型表增量补充
+  3. 基金类型表里查不到的基金先按名称分类，每天最多再查一次，查到后改正
+"""
+import datetime
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from utils.state import load_json, save_json_atomic
+
+# --- 分类索引配置 ---
+LOF_INDEX_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".lof_index.json")
+
+CATEGORY_QDII = "QDII"
+CATEGORY_COMMODITY = "COMMODITY"
+CATEGORY_LOCAL = "LOCAL"
+
+QDII_TYPE_PATTERN = '^QDII|海外'         # 基金类型：QDII-普通股票 / 指数型-海外股票 ... (注意 商品（不含QDII）)
+COMMODITY_TYPE_PATTERN = '商品'          # 基金类型：商品（不含QDII）
+# 基金类型缺失时按名称猜 (与 strategy.LOF_RULES 的关键词一致并略作扩充)
+QDII_NAME_PATTERN = 'QDII|标普|纳指|纳斯达克|恒生|港股|中概|美国|德国|日本|印度|越南|全球|海外'
+COMMODITY_NAME_PATTERN = '白银|黄金|豆粕|有色期货'
+
+# 申购确认/赎回到账周期 (交易日)：QDII 跨市场 T+2，其余 T+1
+SETTLEMENT_LAG = {CATEGORY_QDII: 2, CATEGORY_COMMODITY: 1, CATEGORY_LOCAL: 1}
+
+
+def classify_funds(names, fund_types):
+    """
+    向量化分类：names / fund_types 为等长 Series (基金类型缺失为空字符串)
+    投资商品的 QDII 基金 (如黄金 QDII) 归为 QDII，到账周期以跨市场为准
+    返回：同索引的 DataFrame，列为 category / lag
+    """
+    names = names.fillna("").astype(str)
+    fund_types = fund_types.fillna("").astype(str)
+    known = fund_types != ""
+    qdii = np.where(known, fund_types.str.contains(QDII_TYPE_PATTERN), names.str.contains(QDII_NAME_PATTERN))
+    commodity = np.where(known, fund_types.str.contains(COMMODITY_TYPE_PATTERN),
+                         names.str.contains(COMMODITY_NAME_PATTERN))
+    category = np.select([qdii, commodity], [CATEGORY_QDII, CATEGORY_COMMODITY], CATEGORY_LOCAL)
+    lag = pd.Series(category, index=names.index).map(SETTLEMENT_LAG)
+    return pd.DataFrame({"category": category, "lag": lag.to_numpy(dtype=int)}, index=names.index)
+
+
+class LofIndex:
+    """
+    持久化的分类索引 {代码: {"name", "fund_type", "category", "lag", "checked"}}
+    state_file 为空时只在内存中维护 (测试/基准用)
+    查询走按代码索引的表格视图 (整列 reindex)，全市场几千只基金每轮查表不再逐个查字典
+    """
+
+    def __init__(self, state_file=None):
+        self.state_file = state_file
+        self._entries = load_json(state_file, {})
+        self._frame = None
+        self._lock = threading.Lock()
+
+    def _table(self):
+        """索引的表格视图，索引更新后重建 (调用方持有锁)"""
+        if self._frame is None:
+            self._frame = pd.DataFrame.from_dict(self._entries, orient="index",
+                                                 columns=["fund_type", "category", "lag", "checked"])
+        return self._frame
+
+    def missing(self, symbols, today=None):
+        """需要 (重新) 查询基金类型的代码：索引里没有的，以及类型仍未知且今天还没查过的"""
+        today = (today or datetime.date.today()).strftime("%Y-%m-%d")
+        symbols = pd.Index(symbols, dtype=str).drop_duplicates()
+        with self._lock:
+            known = self._table().reindex(symbols)
+        unknown_type = known['fund_type'].fillna("") == ""
+        need = known['checked'].isna() | (unknown_type & (known['checked'] != today))
+        return symbols[need.to_numpy()].tolist()
+
+    def update(self, names, fund_types, today=None):
+        """
+        names: 按代码索引的基金名称 Series；fund_types: 按代码索引的基金类型 Series (查不到的为空)
+        分类后写入索引并落盘
+        """
+        if names.empty:
+            return
+        today = (today or datetime.date.today()).strftime("%Y-%m-%d")
+        fund_types = fund_types.reindex(names.index).fillna("")
+        classes = classify_funds(names, fund_types)
+        with self._lock:
+            for symbol, name, fund_type, category, lag in zip(
+                    names.index, names, fund_types, classes['category'], classes['lag']):
+                self._entries[str(symbol)] = {"name": str(name), "fund_type": str(fund_type),
+                                              "category": category, "lag": int(lag), "checked": today}
+            self._frame = None
+            save_json_atomic(self.state_file, self._entries, "LOF 分类索引")
+
+    def lookup(self, symbols):
+        """按代码批量查类别/到账周期，索引里没有的为 NaN"""
+        with self._lock:
+            found = self._table()[["category", "lag"]].reindex(pd.Index(symbols, dtype=str))
+        return found.astype({"lag": float})
+
@@ -1,41 +1,261 @@
-import json
+import os
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 import requests
+from requests.adapters import HTTPAdapter
 
+from utils import profiler
+from utils.rate_limiter import backoff_delay
+from utils.state import load_json, save_json_atomic
 
-def send_wecom_webhook(webhook_url, title, content):
+# --- 推送配置 ---
+NOTIFY_MAX_BYTES = 2048      # 单条消息上限 (企业微信文本消息 2048 字节，含分段标题)
+NOTIFY_TIMEOUT = 10          # 单次请求超时(秒)
+NOTIFY_RETRY_TIMES = 3       # 单条消息最多尝试次数
+NOTIFY_BASE_DELAY = 2        # 重试退避的基础等待(秒)
+NOTIFY_MAX_DELAY = 30        # 重试退避的最长等待(秒)，企业微信机器人限频 20 条/分钟
+NOTIFY_MAX_WORKERS = 4       # 同时推送的 Webhook 数
+
+# 发送失败的消息存入发件箱，下次运行时原样重发 (不用重新抓数/计算)
+OUTBOX_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".notify_outbox.json")
+OUTBOX_MAX_AGE = 2 * 86400   # 超过这个时间(秒)仍没发出去的消息直接丢弃，避免推送过期行情
+
+_session = requests.Session()
+_session.mount("https://", HTTPAdapter(pool_connections=NOTIFY_MAX_WORKERS, pool_maxsize=NOTIFY_MAX_WORKERS))
+_session.mount("http://", HTTPAdapter(pool_connections=NOTIFY_MAX_WORKERS, pool_maxsize=NOTIFY_MAX_WORKERS))
+_outbox_lock = threading.Lock()
+
+
+# ==========================================
+# 消息分段
+# ==========================================
+def _byte_len(text):
+    return len(text.encode('utf-8'))
+
+
+def _hard_split(text, max_bytes):
+    """单行超长时按字节硬切，不切断多字节字符"""
+    pieces, current = [], ""
+    for ch in text:
+        if current and _byte_len(current + ch) > max_bytes:
+            pieces.append(current)
+            current = ""
+        current += ch
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def split_message(content, max_bytes=NOTIFY_MAX_BYTES):
     """
-    发送企业微信 Webhook 通知 (纯文本模式)
-    兼容性最好，支持在个人微信中查看
+    按 UTF-8 字节数把报告切成多段，优先在板块边界 (空行) 处切，其次在行尾切
+    返回：分段列表，每段不超过 max_bytes 字节
     """
-    if not webhook_url:
-        print("❌ 未配置 Webhook URL，跳过发送")
-        return
+    # (与上一段的连接符, 文本)：板块之间空一行，板块内换行，硬切的片段直接相连
+    units = []
+    for block in re.split(r"\n\s*\n", content.strip()):
+        if _byte_len(block) <= max_bytes:
+            units.append(("\n\n", block))
+            continue
+        # 板块本身超长，拆成行；单行还超长再硬切
+        sep = "\n\n"
+        for line in block.split("\n"):
+            pieces = _hard_split(line, max_bytes) if _byte_len(line) > max_bytes else [line]
+            units.append((sep, pieces[0]))
+            units.extend(("", piece) for piece in pieces[1:])
+            sep = "\n"
+
+    chunks, current = [], ""
+    for sep, unit in units:
+        candidate = f"{current}{sep}{unit}" if current else unit
+        if current and _byte_len(candidate) > max_bytes:
+            chunks.append(current)
+            candidate = unit
+        current = candidate
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _title_prefix(title, index, total):
+    """分段标题：只有一段时不标序号"""
+    return f"【{title}】\n\n" if total == 1 else f"【{title}】({index}/{total})\n\n"
+
+
+def titled_chunks(title, content, max_bytes=NOTIFY_MAX_BYTES):
+    """
+    切段并加上标题前缀，每条 (前缀 + 正文) 都不超过 max_bytes 字节
+    正文预算按最长的前缀 (最大分段数) 扣除；扣完后段数变多、序号变长时按新段数重切
+    """
+    total = 1
+    while True:
+        budget = max_bytes - _byte_len(_title_prefix(title, total, total))
+        if budget <= 0:
+            raise ValueError(f"消息标题过长 ({_byte_len(title)} 字节)，放不下正文")
+        chunks = split_message(content, budget)
+        if len(chunks) <= total:
+            break
+        total = len(chunks)
+    return [_title_prefix(title, i, len(chunks)) + chunk for i, chunk in enumerate(chunks, 1)]
+
+
+# ==========================================
+# 各渠道的消息格式
+# ==========================================
+def _build_payload(webhook_url, text):
+    """按 Webhook 域名生成请求体：飞书 / 钉钉 / 企业微信 (默认)"""
+    if "feishu.cn" in webhook_url or "larksuite.com" in webhook_url:
+        return {"msg_type": "text", "content": {"text": text}}
+    # 企业微信和钉钉的文本消息格式一致
+    return {"msgtype": "text", "text": {"content": text}}
+
+
+def _is_success(resp_json):
+    """企业微信/钉钉返回 errcode，飞书返回 code (旧版 StatusCode)"""
+    for key in ("errcode", "code", "StatusCode"):
+        if key in resp_json:
+            return resp_json[key] == 0
+    return False
+
+
+def _post(webhook_url, text):
+    """发送一条消息，失败按退避重试，返回是否成功"""
+    for attempt in range(1, NOTIFY_RETRY_TIMES + 1):
+        try:
+            resp = _session.post(webhook_url, json=_build_payload(webhook_url, text), timeout=NOTIFY_TIMEOUT)
+            if resp.status_code == 200:
+                res_json = resp.json()
+                if _is_success(res_json):
+                    return True
+                print(f"   ⚠️ 推送失败，API返回: {res_json}")
+            else:
+                print(f"   ⚠️ 推送网络请求失败: {resp.status_code}")
+        except Exception as e:
+            print(f"   ⚠️ 推送过程发生错误: {e}")
+
+        profiler.add("retries", 1)
+        if attempt < NOTIFY_RETRY_TIMES:
+            time.sleep(backoff_delay(attempt, NOTIFY_BASE_DELAY, NOTIFY_MAX_DELAY, random))
+    return False
+
 
-    headers = {'Content-Type': 'application/json'}
+def _mask(webhook_url):
+    """日志里只显示 Webhook 的末尾几位，避免泄露 key"""
+    return f"...{webhook_url[-6:]}"
 
-    # 构造纯文本内容
-    # 简单拼接标题和正文
-    final_content = f"【{title}】\n\n{content}"
 
-    data = {
-        "msgtype": "text",  # <--- 改为 text
-        "text": {
-            "content": final_content
-        }
-    }
+def parse_webhooks(webhook_urls):
+    """支持单个地址、逗号/空白分隔的多个地址、或地址列表"""
+    if not webhook_urls:
+        return []
+    if isinstance(webhook_urls, str):
+        webhook_urls = re.split(r"[,\s]+", webhook_urls)
+    return [url for url in webhook_urls if url]
 
+
+# ==========================================
+# 发件箱
+# ==========================================
+def _load_outbox():
+    return load_json(OUTBOX_FILE, [])
+
+
+def _save_outbox(messages):
+    if messages:
+        save_json_atomic(OUTBOX_FILE, messages, "发件箱")
+        return
     try:
-        resp = requests.post(webhook_url, headers=headers, data=json.dumps(data))
+        if os.path.exists(OUTBOX_FILE):
+            os.remove(OUTBOX_FILE)
+    except OSError as e:
+        print(f"   ⚠️ 发件箱保存失败: {e}")
+
+
+def _enqueue(failed):
+    """把发送失败的消息追加到发件箱"""
+    with _outbox_lock:
+        _save_outbox(_load_outbox() + failed)
+    print(f"📮 {len(failed)} 条消息发送失败，已存入发件箱，下次运行时重发")
+
 
-        if resp.status_code == 200:
-            res_json = resp.json()
-            if res_json.get('errcode') == 0:
-                print("✅ 企业微信推送成功")
+def outbox_pending():
+    """发件箱里是否有待重发的消息 (只检查文件，入口处调用开销极小)"""
+    return os.path.exists(OUTBOX_FILE)
+
+
+@profiler.timed()
+def flush_outbox():
+    """
+    重发发件箱中的消息，同一 Webhook 按原顺序发送，遇到失败就停止该 Webhook 留到下次
+    过期消息直接丢弃；返回成功重发的条数
+    """
+    with _outbox_lock:
+        messages = _load_outbox()
+        if not messages:
+            return 0
+
+        now = time.time()
+        fresh = [m for m in messages if now - m.get("created", 0) <= OUTBOX_MAX_AGE]
+        if len(fresh) < len(messages):
+            print(f"🗑️ 丢弃 {len(messages) - len(fresh)} 条过期的待发消息")
+
+        print(f"📮 发件箱有 {len(fresh)} 条待发消息，开始重发...")
+        remaining, sent, blocked = [], 0, set()
+        for message in fresh:
+            if message["url"] not in blocked and _post(message["url"], message["text"]):
+                sent += 1
             else:
-                print(f"❌ 推送失败，API返回: {res_json}")
-        else:
-            print(f"❌ 推送网络请求失败: {resp.status_code}")
+                blocked.add(message["url"])
+                message["attempts"] = message.get("attempts", 0) + 1
+                remaining.append(message)
+        _save_outbox(remaining)
 
-    except Exception as e:
-        print(f"❌ 推送过程发生错误: {e}")
\ No newline at end of file
+    print(f"📮 重发成功 {sent} 条，剩余 {len(remaining)} 条")
+    return sent
+
+
+# ==========================================
+# 对外接口
+# ==========================================
+def _send_to(webhook_url, texts):
+    """按顺序推送到一个 Webhook，某段失败后剩余分段一起进发件箱，保证顺序不乱"""
+    for i, text in enumerate(texts):
+        if not _post(webhook_url, text):
+            created = time.time()
+            return [{"url": webhook_url, "text": t, "created": created, "attempts": 1} for t in texts[i:]]
+    return []
+
+
+@profiler.timed()
+def send_wecom_webhook(webhook_url, title, content):
+    """
+    发送企业微信 Webhook 通知 (纯文本模式)
+    兼容性最好，支持在个人微信中查看
+    webhook_url: 单个地址、逗号分隔的多个地址或地址列表 (也支持钉钉/飞书机器人)
+    报告超长时在板块边界切成多条，各 Webhook 并发推送，失败的消息存入发件箱
+    返回：是否全部发送成功
+    """
+    urls = parse_webhooks(webhook_url)
+    if not urls:
+        print("❌ 未配置 Webhook URL，跳过发送")
+        return False
+
+    # 构造纯文本内容：标题 + 正文，超长时分段并在标题后标注序号
+    texts = titled_chunks(title, content)
+
+    with ThreadPoolExecutor(max_workers=min(NOTIFY_MAX_WORKERS, len(urls)), thread_name_prefix="notify") as pool:
+        results = list(pool.map(lambda url: _send_to(url, texts), urls))
+
+    failed = [message for result in results for message in result]
+    for url, result in zip(urls, results):
+        if result:
+            print(f"❌ 推送失败 ({_mask(url)})，{len(result)}/{len(texts)} 条未发出")
+        else:
+            print(f"✅ 推送成功 ({_mask(url)})，共 {len(texts)} 条")
+    if failed:
+        _enqueue(failed)
+    return not failed
@@ -0,0 +1,47 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from utils import profiler
+
+# --- 并发抓取配置 ---
+MAX_STAGE_WORKERS = 4      # 同时运行的抓取阶段数 (东财/巨潮/新浪 各自独立)
+
+
+def run_stages(stages, fallbacks=None, max_workers=MAX_STAGE_WORKERS):
+    """
+    并发执行相互独立的数据抓取阶段
+    各主机的礼貌间隔由 _call_api 按主机控制，这里只负责把不同数据源并行起来
+    参数：
+      stages: {阶段名: 无参可调用对象}
+      fallbacks: {阶段名: 阶段异常时使用的默认结果}
+    返回：(results, timings)
+      results: {阶段名: 阶段返回值}
+      timings: {阶段名: 墙钟耗时(秒)}
+    """
+    fallbacks = fallbacks or {}
+    results = {}
+    timings = {}
+
+    def _timed(name, func):
+        start = time.perf_counter()
+        try:
+            with profiler.span(f"stage:{name}"):
+                return func()
+        finally:
+            timings[name] = time.perf_counter() - start
+
+    run_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="stage") as pool:
+        futures = {name: pool.submit(_timed, name, func) for name, func in stages.items()}
+        for name, future in futures.items():
+            try:
+                results[name] = future.result()
+            except Exception as e:
+                print(f"❌ [{name}] 阶段执行失败: {e}")
+                results[name] = fallbacks.get(name)
+    total = time.perf_counter() - run_start
+
+    summary = " | ".join(f"{name} {timings.get(name, 0):.1f}s" for name in stages)
+    print(f"⏱️ 阶段耗时: {summary} | 总计 {total:.1f}s")
+
+    return results, timings
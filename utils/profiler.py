@@ -0,0 +1,297 @@
+"""
+轻量级运行剖析：记录各阶段耗时、接口等待/网络耗时、重试次数、行数与内存 (含进程峰值常驻内存)
+用法：
+  with profiler.span("my_stage") as sp:
+      ...
+      sp.add("rows", len(df))
+
+  @profiler.timed()
+  def fetch_xxx(): ...
+
+运行结束调用 write_run_profile()，输出 JSON 运行档案 + Prometheus textfile
+"""
+import collections
+import datetime
+import functools
+import glob
+import json
+import os
+import sys
+import threading
+import time
+
+# --- 剖析输出配置 ---
+PROFILE_DIR = os.environ.get(
+    "LOF_PROFILE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "profiles"),
+)
+PROFILE_KEEP = 30                      # 保留最近多少份 JSON 运行档案
+PROM_FILE_NAME = "lof_job.prom"        # 供 node_exporter textfile collector 采集
+METRIC_PREFIX = "lof"
+MAX_RECORDS = 20000                    # 内存中最多保留的区间数，盯盘模式长时间运行时丢弃最早的
+# 内存预算(MB)：本次运行峰值常驻内存超出时告警，并列出推高峰值最多的阶段；不设置则只记录不告警
+MEMORY_BUDGET_MB = float(os.environ.get("LOF_MEMORY_BUDGET_MB", "0")) or None
+MEMORY_TOP_STAGES = 3
+
+_records = collections.deque(maxlen=MAX_RECORDS)
+_records_lock = threading.Lock()
+_local = threading.local()
+_run_started = time.time()
+
+
+class Span:
+    """一次计时区间，attrs 中的数值指标可累加"""
+    __slots__ = ("name", "start", "duration", "attrs", "thread")
+
+    def __init__(self, name, attrs=None):
+        self.name = name
+        self.start = time.time()
+        self.duration = 0.0
+        self.attrs = dict(attrs or {})
+        self.thread = threading.current_thread().name
+
+    def add(self, key, value):
+        self.attrs[key] = self.attrs.get(key, 0) + value
+
+    def set(self, key, value):
+        self.attrs[key] = value
+
+    def to_dict(self):
+        return {"name": self.name, "start": self.start, "duration": self.duration,
+                "thread": self.thread, **self.attrs}
+
+
+def rss():
+    """
+    返回 (当前常驻内存, 进程启动以来的峰值常驻内存)，单位字节
+    Linux 读 /proc/self/status；其他系统只能取到峰值，当前值为 None；都取不到时返回 (None, None)
+    """
+    try:
+        current = peak = None
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    current = int(line.split()[1]) * 1024
+                elif line.startswith("VmHWM:"):
+                    peak = int(line.split()[1]) * 1024
+        return current, peak
+    except OSError:
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # macOS 单位是字节，其他系统是 KB
+        return None, peak if sys.platform == "darwin" else peak * 1024
+    except (ImportError, OSError):
+        return None, None
+
+
+def _stack():
+    if not hasattr(_local, "stack"):
+        _local.stack = []
+    return _local.stack
+
+
+def current_span():
+    stack = _stack()
+    return stack[-1] if stack else None
+
+
+def add(key, value):
+    """给当前线程正在进行的区间累加指标，没有区间时忽略"""
+    sp = current_span()
+    if sp is not None:
+        sp.add(key, value)
+
+
+class span:
+    """计时上下文管理器，退出时把区间记录到本次运行"""
+
+    def __init__(self, name, **attrs):
+        self._span = Span(name, attrs)
+
+    def __enter__(self):
+        self._span.start = time.time()
+        _, self._peak0 = rss()
+        self._t0 = time.perf_counter()
+        _stack().append(self._span)
+        return self._span
+
+    def __exit__(self, exc_type, exc, tb):
+        self._span.duration = time.perf_counter() - self._t0
+        current, peak = rss()
+        if current is not None:
+            self._span.set("rss_bytes", current)
+        if peak is not None:
+            # 进程峰值只增不减：区间结束时的峰值 + 本区间把峰值推高了多少 (并发阶段会互相计入)
+            self._span.set("peak_rss_bytes", peak)
+            if self._peak0 is not None and peak > self._peak0:
+                self._span.set("peak_rss_growth_bytes", peak - self._peak0)
+        if exc_type is not None:
+            self._span.set("error", exc_type.__name__)
+        stack = _stack()
+        if stack and stack[-1] is self._span:
+            stack.pop()
+        with _records_lock:
+            _records.append(self._span)
+        return False
+
+
+def describe_result(sp, result):
+    """记录返回值的行数和 DataFrame 内存占用 (浅统计，开销很小)"""
+    # 不主动导入 pandas：还没加载 pandas 时返回值也不可能是 DataFrame，保证入口快速启动
+    pd = sys.modules.get("pandas")
+    if pd is not None and isinstance(result, pd.DataFrame):
+        sp.set("rows", len(result))
+        sp.set("memory_bytes", int(result.memory_usage(index=True, deep=False).sum()))
+    elif isinstance(result, (list, dict)):
+        sp.set("rows", len(result))
+
+
+def timed(name=None):
+    """函数计时装饰器，自动记录返回值的行数/内存"""
+    def decorator(func):
+        span_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(span_name) as sp:
+                result = func(*args, **kwargs)
+                describe_result(sp, result)
+                return result
+        return wrapper
+    return decorator
+
+
+# --- 汇总与导出 ---
+def reset():
+    """开始新的一次运行"""
+    global _run_started
+    with _records_lock:
+        _records.clear()
+    _run_started = time.time()
+
+
+def records():
+    with _records_lock:
+        return [sp.to_dict() for sp in _records]
+
+
+# 这些指标是某一时刻的水位，汇总时取最大值而不是求和
+MAX_KEYS = ("rss_bytes", "peak_rss_bytes")
+
+
+def summarize():
+    """按区间名汇总：次数、总耗时、以及各数值指标之和 (内存水位取最大值)"""
+    summary = {}
+    for rec in records():
+        item = summary.setdefault(rec["name"], {"count": 0, "seconds": 0.0})
+        item["count"] += 1
+        item["seconds"] += rec["duration"]
+        for key, value in rec.items():
+            if key in ("name", "start", "duration", "thread") or isinstance(value, bool):
+                continue
+            if key in MAX_KEYS:
+                item[key] = max(item.get(key, 0), value)
+            elif isinstance(value, (int, float)):
+                item[key] = item.get(key, 0) + value
+    return summary
+
+
+def _mb(value):
+    return f"{value / 1024 / 1024:.1f}MB"
+
+
+def check_memory(summary, budget_mb=None):
+    """
+    汇报本次运行的峰值常驻内存；超出预算时列出推高峰值最多的阶段
+    返回峰值字节数，取不到时返回 None
+    """
+    _, peak = rss()
+    if peak is None:
+        return None
+    budget_mb = budget_mb or MEMORY_BUDGET_MB
+    if budget_mb and peak > budget_mb * 1024 * 1024:
+        top = sorted(((item.get("peak_rss_growth_bytes", 0), name) for name, item in summary.items()),
+                     reverse=True)[:MEMORY_TOP_STAGES]
+        stages = ", ".join(f"{name} +{_mb(growth)}" for growth, name in top if growth)
+        print(f"⚠️ 峰值内存 {_mb(peak)} 超出预算 {budget_mb:.0f}MB，推高峰值最多的阶段: {stages or '无'}")
+    return peak
+
+
+def _prom_escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def to_prometheus(summary, run_seconds, peak_rss=None):
+    """生成 Prometheus textfile 格式的指标文本"""
+    metrics = {
+        "span_seconds": ("gauge", "各区间累计耗时(秒)", "seconds"),
+        "span_calls": ("gauge", "各区间调用次数", "count"),
+        "span_rows": ("gauge", "各区间返回的行数", "rows"),
+        "span_memory_bytes": ("gauge", "各区间返回 DataFrame 的内存(字节)", "memory_bytes"),
+        "span_sleep_seconds": ("gauge", "限速/退避等待耗时(秒)", "sleep_seconds"),
+        "span_network_seconds": ("gauge", "等待上游接口返回的耗时(秒)", "network_seconds"),
+        "span_retries": ("gauge", "接口重试次数", "retries"),
+        "span_peak_rss_bytes": ("gauge", "区间结束时进程的峰值常驻内存(字节)", "peak_rss_bytes"),
+        "span_peak_rss_growth_bytes": ("gauge", "区间内进程峰值常驻内存的增长(字节)", "peak_rss_growth_bytes"),
+    }
+    lines = []
+    for metric, (kind, help_text, key) in metrics.items():
+        full = f"{METRIC_PREFIX}_{metric}"
+        samples = [(name, item[key]) for name, item in sorted(summary.items()) if key in item]
+        if not samples:
+            continue
+        lines.append(f"# HELP {full} {help_text}")
+        lines.append(f"# TYPE {full} {kind}")
+        for name, value in samples:
+            lines.append(f'{full}{{span="{_prom_escape(name)}"}} {value}')
+
+    lines.append(f"# HELP {METRIC_PREFIX}_run_seconds 本次运行总耗时(秒)")
+    lines.append(f"# TYPE {METRIC_PREFIX}_run_seconds gauge")
+    lines.append(f"{METRIC_PREFIX}_run_seconds {run_seconds}")
+    if peak_rss is not None:
+        lines.append(f"# HELP {METRIC_PREFIX}_run_peak_rss_bytes 本次运行进程峰值常驻内存(字节)")
+        lines.append(f"# TYPE {METRIC_PREFIX}_run_peak_rss_bytes gauge")
+        lines.append(f"{METRIC_PREFIX}_run_peak_rss_bytes {peak_rss}")
+    lines.append(f"# HELP {METRIC_PREFIX}_run_timestamp_seconds 本次运行结束时间")
+    lines.append(f"# TYPE {METRIC_PREFIX}_run_timestamp_seconds gauge")
+    lines.append(f"{METRIC_PREFIX}_run_timestamp_seconds {time.time():.0f}")
+    return "\n".join(lines) + "\n"
+
+
+def _atomic_write(path, text):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def write_run_profile(profile_dir=None):
+    """
+    写出本次运行档案：run-时间戳.json (全部区间明细 + 汇总) 和 Prometheus textfile
+    返回 JSON 文件路径，写入失败返回 None
+    """
+    profile_dir = profile_dir or PROFILE_DIR
+    run_seconds = time.time() - _run_started
+    summary = summarize()
+    peak_rss = check_memory(summary)
+    try:
+        os.makedirs(profile_dir, exist_ok=True)
+        stamp = datetime.datetime.fromtimestamp(_run_started).strftime("%Y%m%d-%H%M%S")
+        json_path = os.path.join(profile_dir, f"run-{stamp}.json")
+        profile = {"started": _run_started, "run_seconds": run_seconds, "peak_rss_bytes": peak_rss,
+                   "summary": summary, "spans": records()}
+        _atomic_write(json_path, json.dumps(profile, ensure_ascii=False, indent=2, default=str))
+        _atomic_write(os.path.join(profile_dir, PROM_FILE_NAME), to_prometheus(summary, run_seconds, peak_rss))
+
+        # 只保留最近 PROFILE_KEEP 份档案
+        for old in sorted(glob.glob(os.path.join(profile_dir, "run-*.json")))[:-PROFILE_KEEP]:
+            os.remove(old)
+    except OSError as e:
+        print(f"⚠️ 运行档案写入失败: {e}")
+        return None
+
+    peak_txt = f"，峰值内存 {_mb(peak_rss)}" if peak_rss is not None else ""
+    print(f"📊 运行档案已保存: {json_path} (总耗时 {run_seconds:.1f}s{peak_txt})")
+    return json_path
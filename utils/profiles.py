@@ -0,0 +1,234 @@
+"""
+多账户评估：行情快照只抓一次，按账户 (白名单 / 门槛 / 费率 / 可转债条件 / 推送地址) 批量筛选
+所有账户的 LOF 白名单拼成一张长表 (全市场扫描的账户取分类索引里的全部 LOF)，与行情大表只连接一次，
+门槛/费率按行取各自账户和基金类别的参数，溢价、折价两侧一次筛完；
+可转债按账户参数做一次矩阵筛选，下修公告对所有账户选中的转债合并后只查一次
+"""
+import numpy as np
+import pandas as pd
+
+from config import (COMMISSION_RATE, COST_RATE, DISCOUNT_COMMODITY, DISCOUNT_LOCAL, DISCOUNT_QDII, LOF_UNIVERSE_SCAN,
+                    MIN_VOLUME, PREMIUM_PERCENTILE_ALERT, PROFILES, TARGET_LOFS, THRESHOLD_COMMODITY,
+                    THRESHOLD_LOCAL, THRESHOLD_QDII, WECOM_WEBHOOK_URL)
+from utils import profiler
+from utils.frames import records
+from utils.lof_index import CATEGORY_COMMODITY, CATEGORY_QDII, classify_funds
+from utils.strategy import analyze_lof_frame, check_bonds_news, filter_double_low_cb
+
+# 账户参数中参与向量化计算的数值字段
+LOF_PARAMS = ['min_volume', 'threshold_qdii', 'threshold_local', 'threshold_commodity',
+              'discount_qdii', 'discount_local', 'discount_commodity', 'percentile', 'cost_rate', 'commission']
+CB_PARAMS = ['cb_limit', 'cb_price_low', 'cb_price_high', 'cb_min_volume']
+# LOF 筛选和策略分析用到的大表列 (后四列可选)，估值/净值明细列不进入长表
+LOF_POOL_COLUMNS = ['symbol', 'name', 'price', 'volume', 'premium_rate', 'source',
+                    'category', 'lag', 'subscribe_fee', 'redeem_fee', 'premium_pctl']
+
+
+def default_profile():
+    """由 config 全局设置组成的默认账户"""
+    return {
+        "name": "默认账户",
+        # None 表示全市场扫描，类别取自 LOF 分类索引
+        "whitelist": None if LOF_UNIVERSE_SCAN else TARGET_LOFS,
+        "cost_rate": COST_RATE,
+        "commission": COMMISSION_RATE,
+        "min_volume": MIN_VOLUME,
+        "threshold_qdii": THRESHOLD_QDII,
+        "threshold_local": THRESHOLD_LOCAL,
+        "threshold_commodity": THRESHOLD_COMMODITY,
+        "discount_qdii": DISCOUNT_QDII,
+        "discount_local": DISCOUNT_LOCAL,
+        "discount_commodity": DISCOUNT_COMMODITY,
+        "percentile": PREMIUM_PERCENTILE_ALERT,
+        "cb_limit": 5,
+        "cb_price_low": 90,
+        "cb_price_high": 130,
+        "cb_min_volume": 10000000,
+        "webhook": WECOM_WEBHOOK_URL,
+    }
+
+
+def load_profiles(profiles=None):
+    """
+    读取账户列表，每个账户未填写的字段沿用默认账户
+    profiles 为空时使用 config.PROFILES；两者都为空则只有默认账户
+    """
+    profiles = PROFILES if profiles is None else profiles
+    base = default_profile()
+    if not profiles:
+        return [base]
+
+    loaded = []
+    for i, item in enumerate(profiles, 1):
+        profile = {**base, "name": f"账户{i}", **item}
+        if profile["name"] in {p["name"] for p in loaded}:
+            raise ValueError(f"账户名称重复: {profile['name']}")
+        loaded.append(profile)
+    return loaded
+
+
+def _param_frame(profiles, fields):
+    """账户参数表：行号即账户序号，None 转成 NaN"""
+    return pd.DataFrame(
+        [[np.nan if p[f] is None else p[f] for f in fields] for p in profiles],
+        columns=fields, dtype=float,
+    )
+
+
+def _membership(df, profiles):
+    """
+    账户 x 基金 长表 (账户序号, 代码, 类型)
+    白名单账户的类型取白名单里填写的；全市场扫描账户取大表的 category 列 (没有时按名称分类)
+    """
+    parts = []
+    white = [(i, str(symbol), lof_type) for i, p in enumerate(profiles) if p["whitelist"] is not None
+             for symbol, lof_type in p["whitelist"].items()]
+    if white:
+        parts.append(pd.DataFrame(white, columns=['profile', 'symbol', 'lof_type']))
+
+    universe = [i for i, p in enumerate(profiles) if p["whitelist"] is None]
+    if universe:
+        base = df.drop_duplicates('symbol')
+        category = base['category'] if 'category' in base.columns else None
+        if category is None or category.isna().any():
+            guessed = classify_funds(base['name'], pd.Series("", index=base.index))['category']
+            category = guessed if category is None else category.fillna(guessed)
+        base = pd.DataFrame({'symbol': base['symbol'], 'lof_type': category})
+        parts.extend(base.assign(profile=i) for i in universe)
+
+    if not parts:
+        return pd.DataFrame(columns=['profile', 'symbol', 'lof_type'])
+    return pd.concat(parts, ignore_index=True)[['profile', 'symbol', 'lof_type']]
+
+
+def _loosest(profiles, fields):
+    """所有账户这几个门槛里最低的一个，全为 None 时为 NaN"""
+    values = [p[f] for p in profiles for f in fields if p[f] is not None]
+    return min(values) if values else np.nan
+
+
+def _candidates(df, profiles):
+    """
+    按所有账户里最宽松的门槛粗筛：成交额不够、溢价/折价达不到任何账户任何类别门槛的基金，不进入 账户 x 基金 长表
+    开启分位数门槛的账户看历史分位，溢价为正的基金都先保留
+    大表同代码只取第一条，只带 LOF_POOL_COLUMNS 里的列，去重、粗筛、选列一次索引完成
+    """
+    premium = df['premium_rate']
+    hot = premium > _loosest(profiles, ['threshold_qdii', 'threshold_commodity', 'threshold_local'])
+    if 'premium_pctl' in df.columns and any(p['percentile'] is not None for p in profiles):
+        hot |= premium > 0
+    cold = premium < -_loosest(profiles, ['discount_qdii', 'discount_commodity', 'discount_local'])
+    liquid = df['volume'] >= min(p['min_volume'] for p in profiles)
+    keep = liquid & (hot | cold) & ~df['symbol'].duplicated()
+    return df.loc[keep, [c for c in LOF_POOL_COLUMNS if c in df.columns]]
+
+
+def _by_type(pool, qdii, commodity, local):
+    """按基金类别取各自账户的参数列"""
+    lof_type = pool['lof_type']
+    return np.select([lof_type == CATEGORY_QDII, lof_type == CATEGORY_COMMODITY],
+                     [pool[qdii], pool[commodity]], pool[local])
+
+
+@profiler.timed()
+def evaluate_lof_profiles(df, profiles):
+    """
+    一次性为所有账户筛选 LOF 机会 (规则与 main.filter_opportunities 相同)
+    df: LOF 大表 (fetch_lof_data 的输出，可带 premium_pctl / category / lag 列)
+    溢价超过类别溢价门槛，或折价幅度超过类别折价门槛的基金都算机会 (side 为 premium / discount)
+    返回：{账户名: 机会列表}
+    """
+    results = {p["name"]: [] for p in profiles}
+    # 0. 全市场扫描时大部分基金一个门槛都够不上，先粗筛再展开长表
+    df = _candidates(df, profiles) if not df.empty else df
+    if df.empty:
+        return results
+
+    # 1. 账户 x 基金 长表，与行情大表只连接一次
+    membership = _membership(df, profiles)
+    if membership.empty:
+        return results
+    pool = membership.merge(df, on='symbol', how='inner')
+    pool = pool.join(_param_frame(profiles, LOF_PARAMS), on='profile')
+
+    # 2. 按账户参数和基金类别整列过滤 (溢价、折价两侧)
+    hot = pool['premium_rate'] > _by_type(pool, 'threshold_qdii', 'threshold_commodity', 'threshold_local')
+    if 'premium_pctl' in pool.columns:
+        # 开启分位数门槛的账户，历史充足的基金改用分位数判断
+        use_pctl = pool['percentile'].notna() & pool['premium_pctl'].notna()
+        by_pctl = (pool['premium_pctl'] >= pool['percentile']) & (pool['premium_rate'] > 0)
+        hot = hot.where(~use_pctl, by_pctl)
+    # 折价门槛为 NaN (不看折价) 时比较结果为 False
+    cold = pool['premium_rate'] < -_by_type(pool, 'discount_qdii', 'discount_commodity', 'discount_local')
+    pool = pool[(pool['volume'] >= pool['min_volume']) & (hot | cold)]
+    if pool.empty:
+        return results
+    pool = pool.assign(side=np.where(pool['premium_rate'] < 0, 'discount', 'premium'))
+
+    # 3. 策略分析 (每行用各自账户的费率/佣金)，按账户分组、按扣除全部成本后的净收益从高到低
+    pool = pool.join(analyze_lof_frame(pool, cost_rate=pool['cost_rate'], commission=pool['commission']))
+    pool = pool.sort_values(['profile', 'net_premium'], ascending=[True, False], kind='stable')
+
+    lag = pool['lag'] if 'lag' in pool.columns else pd.Series(np.nan, index=pool.index)
+    opps = pd.DataFrame({
+        "code": pool['symbol'],
+        "name": pool['name'],
+        "price": pool['price'],
+        "premium": pool['premium_rate'].round(2),
+        "volume": pool['volume'].astype(int),
+        "tag": pool['risk_tag'],
+        "net_prem": pool['net_premium'],
+        "advice": pool['advice'],
+        "side": pool['side'],
+        # 申赎到账周期，分类索引里没有的基金为空
+        "settle": ("T+" + lag.astype('Int64').astype(str)).where(lag.notna(), ""),
+    })
+    for index, group in opps.groupby(pool['profile'], sort=False):
+        results[profiles[index]["name"]] = records(group)
+    return results
+
+
+@profiler.timed()
+def evaluate_cb_profiles(df, profiles):
+    """
+    一次性为所有账户筛选双低可转债 (规则与 strategy.filter_double_low_cb 相同)
+    先用 账户 x 转债 的矩阵选出各账户的前 N 名，再把选中转债的正股合并后只查一次下修公告
+    返回：{账户名: 转债列表}
+    """
+    results = {p["name"]: [] for p in profiles}
+    if df.empty:
+        return results
+
+    params = _param_frame(profiles, CB_PARAMS)
+    price = df['price'].to_numpy(dtype=float)
+    volume = df['volume'].to_numpy(dtype=float)
+    double_low = df['double_low'].to_numpy(dtype=float)
+
+    eligible = (
+        (price[None, :] < params['cb_price_high'].to_numpy()[:, None])
+        & (price[None, :] > params['cb_price_low'].to_numpy()[:, None])
+        & (volume[None, :] > params['cb_min_volume'].to_numpy()[:, None])
+        & ~np.isnan(double_low)[None, :]
+    )
+    score = np.where(eligible, double_low[None, :], np.inf)
+    order = np.argsort(score, axis=1, kind='stable')
+
+    selected = []
+    for i, profile in enumerate(profiles):
+        limit = int(profile["cb_limit"])
+        top = order[i, :limit]
+        selected.append(top[eligible[i, top]])
+
+    # 所有账户选中的转债合并，下修公告只查一次
+    news_map = {}
+    union = np.unique(np.concatenate(selected)) if selected else np.array([], dtype=int)
+    if 'stock_code' in df.columns and len(union):
+        print(f"   正在检查 {len(union)} 只转债的下修公告 ({len(profiles)} 个账户合并查询)...")
+        news_map = check_bonds_news(df['stock_code'].iloc[union].tolist())
+
+    for profile, rows in zip(profiles, selected):
+        results[profile["name"]] = filter_double_low_cb(
+            df.iloc[np.sort(rows)], limit=int(profile["cb_limit"]), price_low=profile["cb_price_low"],
+            price_high=profile["cb_price_high"], min_volume=profile["cb_min_volume"], news_map=news_map,
+        )
+    return results
@@ -0,0 +1,152 @@
+"""
+多数据源对冲请求
+同一份逻辑数据 (LOF 行情、基金净值、可转债行情、打新日历、逆回购利率) 配置多个候选数据源，
+各数据源的结果先规整成相同的列结构：
+  1. 按历史延迟/失败率给数据源排名，先请求排第一的
+  2. 超过延迟预算还没返回，就向下一个数据源发出对冲请求；某个数据源报错则立刻换下一个
+  3. 第一个返回有效结果的胜出，其余请求在后台跑完后只用于更新延迟统计
+"""
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from utils import profiler
+from utils.state import load_json, save_json_atomic
+
+# --- 排名配置 ---
+STATS_ALPHA = 0.3               # 指数滑动平均的权重，越大越看重最近几次
+FAILURE_PENALTY_SECONDS = 30    # 失败率折算成的延迟惩罚：得分 = 平均延迟 + 失败率 * 该值
+
+
+class ProviderError(Exception):
+    """所有数据源都失败"""
+
+
+class InvalidResultError(Exception):
+    """数据源返回了空表或缺少必需列"""
+
+
+class ProviderStats:
+    """
+    各数据源的延迟/失败率统计 (指数滑动平均)
+    state_file 不为空时每次更新都原子写入 JSON，定时任务跨运行也能积累排名
+    """
+
+    def __init__(self, state_file=None, alpha=STATS_ALPHA):
+        self.state_file = state_file
+        self.alpha = alpha
+        self._stats = load_json(state_file, {})
+        self._lock = threading.Lock()
+
+    def record(self, dataset, provider, seconds, ok):
+        with self._lock:
+            item = self._stats.setdefault(dataset, {}).get(provider)
+            if item is None:
+                item = {"latency": seconds, "failure_rate": 0.0 if ok else 1.0, "samples": 0}
+            else:
+                item["latency"] += self.alpha * (seconds - item["latency"])
+                item["failure_rate"] += self.alpha * ((0.0 if ok else 1.0) - item["failure_rate"])
+            item["samples"] += 1
+            self._stats[dataset][provider] = item
+            save_json_atomic(self.state_file, self._stats, "数据源统计")
+
+    def get(self, dataset, provider):
+        with self._lock:
+            item = self._stats.get(dataset, {}).get(provider)
+            return dict(item) if item else None
+
+    def score(self, dataset, provider):
+        """越小越好；没有样本的数据源返回 None"""
+        item = self.get(dataset, provider)
+        if item is None:
+            return None
+        return item["latency"] + item["failure_rate"] * FAILURE_PENALTY_SECONDS
+
+    def rank(self, dataset, providers):
+        """
+        providers: [(名称, 函数), ...]，顺序即默认优先级
+        有样本的按得分排序，没样本的排在后面并保持配置顺序
+        """
+        def key(indexed):
+            index, (name, _) = indexed
+            score = self.score(dataset, name)
+            return (score is None, score or 0.0, index)
+
+        return [item for _, item in sorted(enumerate(providers), key=key)]
+
+
+
+def has_columns(*columns):
+    """生成结果校验函数：非空 DataFrame 且包含全部必需列"""
+    def validate(df):
+        return df is not None and not df.empty and all(c in df.columns for c in columns)
+    return validate
+
+
+def hedged_fetch(dataset, providers, hedge_after, validate=None, stats=None, **kwargs):
+    """
+    对冲请求：按排名依次启动数据源，返回第一个有效结果
+    providers: [(名称, 函数)]，函数接收 **kwargs 并返回已规整的结果
+    hedge_after: 延迟预算(秒)，当前请求超过该时间未返回就并行请求下一个数据源
+    validate: 结果校验函数，返回 False 视为失败
+    返回：(胜出的数据源名称, 结果)；全部失败抛出 ProviderError
+    """
+    validate = validate or (lambda result: result is not None)
+    queue = stats.rank(dataset, providers) if stats else list(providers)
+    if not queue:
+        raise ProviderError(f"[{dataset}] 未配置数据源")
+
+    def run(name, func):
+        start = time.perf_counter()
+        ok = False
+        try:
+            result = func(**kwargs)
+            ok = validate(result)
+            if not ok:
+                raise InvalidResultError(f"{name} 返回空表或缺少必需列")
+            return result
+        finally:
+            if stats:
+                stats.record(dataset, name, time.perf_counter() - start, ok)
+
+    pool = ThreadPoolExecutor(max_workers=len(queue), thread_name_prefix=f"hedge-{dataset}")
+    pending = {}
+    errors = []
+
+    def launch():
+        name, func = queue.pop(0)
+        pending[pool.submit(run, name, func)] = name
+
+    with profiler.span(f"hedge:{dataset}") as sp:
+        try:
+            launch()
+            while pending:
+                done, _ = wait(list(pending), timeout=hedge_after if queue else None,
+                               return_when=FIRST_COMPLETED)
+                if not done:
+                    print(f"   🔀 [{dataset}] {'/'.join(pending.values())} 超过 {hedge_after}s 未返回，"
+                          f"对冲请求 {queue[0][0]}")
+                    sp.add("hedges", 1)
+                    launch()
+                    continue
+
+                for future in done:
+                    name = pending.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        errors.append(f"{name}: {e}")
+                        print(f"   ⚠️ [{dataset}] 数据源 {name} 失败: {e}")
+                        continue
+                    sp.set("provider", name)
+                    if errors or sp.attrs.get("hedges"):
+                        print(f"   🏁 [{dataset}] 采用数据源 {name}")
+                    return name, result
+
+                # 有数据源失败，立刻换下一个，不再等延迟预算
+                if queue:
+                    launch()
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    raise ProviderError(f"[{dataset}] 全部数据源失败: {'; '.join(errors)}")
@@ -0,0 +1,189 @@
+"""
+新浪行情批量客户端 (hq.sinajs.cn)
+一次请求可以带多个代码，适合 LOF / 可转债 / 国债逆回购 这类小范围代码列表的快速刷新：
+  1. 长连接池复用 TCP 连接
+  2. 按 URL 长度把任意代码列表切成安全的批次，多批并发请求
+  3. GBK 文本逐行解析成列表，最后一次性构建 DataFrame
+除 A 股格式外，也能批量拉取估值用的代理标的 (国内/外盘期货、美股指数、港股指数、汇率)
+"""
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+
+# --- 新浪行情配置 ---
+# 可用环境变量指向本地替身服务做离线测试
+SINA_QUOTE_URL = os.environ.get("LOF_SINA_URL", "http://hq.sinajs.cn")
+SINA_HEADERS = {'Referer': 'http://finance.sina.com.cn/'}
+SINA_MAX_URL_LEN = 2000      # 单个请求 URL 的最大长度，超出则拆批
+QUOTE_MAX_WORKERS = 4        # 并发批次数 (也是连接池大小)
+QUOTE_TIMEOUT = 5            # 单次请求超时(秒)
+
+# 输出列：A股通用行情格式的前 10 个字段 + 日期时间
+# 对 LOF/ETF/可转债 price 是最新价、amount 是成交额(元)；对国债逆回购 price 就是年化利率
+QUOTE_COLUMNS = ['code', 'name', 'open', 'prev_close', 'price', 'high', 'low', 'volume', 'amount',
+                 'date', 'time']
+_NUMERIC_FIELDS = [('open', 1), ('prev_close', 2), ('price', 3), ('high', 4), ('low', 5),
+                   ('volume', 8), ('amount', 9)]
+
+
+# 代理标的行情：新浪代码前缀 -> 字段位置 (不同品种的行情字段排列不同)
+# price: 最新价；prev_close: 昨收/昨结算 (估值锚点)；没有昨收字段的品种用 最新价 - change 推算
+PROXY_COLUMNS = ['proxy', 'name', 'price', 'prev_close']
+PROXY_FORMATS = {
+    "nf_": {"name": 0, "price": 8, "prev_close": 10},     # 国内期货连续合约 (如 nf_AG0 沪银主力)，昨结算
+    "hf_": {"name": 13, "price": 0, "prev_close": 7},     # 外盘期货 (如 hf_GC COMEX黄金、hf_CL 原油)，昨结算
+    "gb_": {"name": 0, "price": 1, "change": 4},          # 美股及指数 (如 gb_$ndx 纳指100、gb_xop)
+    "rt_hk": {"name": 1, "price": 6, "prev_close": 3},    # 港股及指数 (如 rt_hkHSI 恒生指数)
+    "fx_": {"name": 9, "price": 8, "prev_close": 3},      # 汇率 (如 fx_susdcny 美元兑人民币)
+    "": {"name": 0, "price": 3, "prev_close": 2},         # 沪深股票/基金/指数 (sh/sz 前缀)
+}
+
+
+def _proxy_format(symbol):
+    return next(fmt for prefix, fmt in PROXY_FORMATS.items() if symbol.startswith(prefix))
+
+
+def sina_symbol(code):
+    """6 位代码 -> 带交易所前缀的新浪代码 (已带 sh/sz 前缀的原样返回)"""
+    code = str(code)
+    if code[:2] in ('sh', 'sz'):
+        return code
+    # 上海：股票 6xx、基金 5xx、B股 9xx、国债 10x、可转债 11x、逆回购 204xxx
+    if code.startswith(('5', '6', '9', '10', '11', '204')):
+        return f"sh{code}"
+    return f"sz{code}"
+
+
+def _num(text):
+    try:
+        return float(text) if text else math.nan
+    except ValueError:
+        return math.nan
+
+
+def parse_sina(text):
+    """
+    解析新浪行情文本，返回 {列名: 值列表}
+    每行形如 var hq_str_sh204001="名称,今开,昨收,最新,最高,最低,...";
+    空行情 (代码不存在/停牌无数据) 直接跳过
+    """
+    cols = {c: [] for c in QUOTE_COLUMNS}
+    for line in text.splitlines():
+        head, sep, body = line.partition('="')
+        if not sep:
+            continue
+        fields = body.rstrip('";').split(',')
+        if len(fields) < 10 or not fields[0]:
+            continue
+        cols['code'].append(head[-6:])
+        cols['name'].append(fields[0])
+        for col, i in _NUMERIC_FIELDS:
+            cols[col].append(_num(fields[i]))
+        cols['date'].append(fields[30] if len(fields) > 31 else "")
+        cols['time'].append(fields[31] if len(fields) > 31 else "")
+    return cols
+
+
+def parse_sina_proxy(text):
+    """
+    解析代理标的行情文本 (按代码前缀取 PROXY_FORMATS 中的字段位置)，返回 {列名: 值列表}
+    proxy 为完整的新浪代码 (如 nf_AG0)；空行情和字段不全的直接跳过
+    """
+    cols = {c: [] for c in PROXY_COLUMNS}
+    for line in text.splitlines():
+        head, sep, body = line.partition('="')
+        if not sep:
+            continue
+        symbol = head.rpartition('hq_str_')[2]
+        fields = body.rstrip('";').split(',')
+        fmt = _proxy_format(symbol)
+        if len(fields) <= max(fmt.values()):
+            continue
+        price = _num(fields[fmt["price"]])
+        if "prev_close" in fmt:
+            prev_close = _num(fields[fmt["prev_close"]])
+        else:
+            prev_close = price - _num(fields[fmt["change"]])
+        cols['proxy'].append(symbol)
+        cols['name'].append(fields[fmt["name"]])
+        cols['price'].append(price)
+        cols['prev_close'].append(prev_close)
+    return cols
+
+
+def split_batches(symbols, base_len, max_url_len=SINA_MAX_URL_LEN):
+    """按 URL 长度切批：base_len 为不含代码部分的长度，代码之间用逗号分隔"""
+    batches, current, length = [], [], base_len
+    for sym in symbols:
+        extra = len(sym) + (1 if current else 0)
+        if current and length + extra > max_url_len:
+            batches.append(current)
+            current, length = [], base_len
+            extra = len(sym)
+        current.append(sym)
+        length += extra
+    if current:
+        batches.append(current)
+    return batches
+
+
+class SinaQuoteClient:
+    """
+    新浪行情批量客户端
+    call: 请求包装函数，签名 call(func, *args)，用于接入限流/重试 (如 data_fetcher._call_api)
+          为 None 时直接请求
+    """
+
+    def __init__(self, base_url=None, max_workers=QUOTE_MAX_WORKERS, timeout=QUOTE_TIMEOUT,
+                 max_url_len=SINA_MAX_URL_LEN, call=None):
+        self.base_url = (base_url or SINA_QUOTE_URL).rstrip('/')
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.max_url_len = max_url_len
+        self._call = call or (lambda func, *args: func(*args))
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update(SINA_HEADERS)
+
+    def sina_hq(self, batch, parser=parse_sina):
+        """请求一批代码，返回解析后的 {列名: 值列表}"""
+        res = self.session.get(f"{self.base_url}/list={','.join(batch)}", timeout=self.timeout)
+        res.raise_for_status()
+        return parser(res.content.decode('gbk', errors='replace'))
+
+    def _fetch_batches(self, symbols, parser, columns):
+        """按 URL 长度切批、多批并发请求，合并成一张表"""
+        if not symbols:
+            return pd.DataFrame(columns=columns)
+
+        batches = split_batches(symbols, len(self.base_url) + len("/list="), self.max_url_len)
+        if len(batches) == 1:
+            parts = [self._call(self.sina_hq, batches[0], parser)]
+        else:
+            with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="sina") as pool:
+                parts = list(pool.map(lambda b: self._call(self.sina_hq, b, parser), batches))
+
+        cols = {c: [v for part in parts for v in part[c]] for c in columns}
+        return pd.DataFrame(cols, columns=columns)
+
+    def fetch(self, codes):
+        """
+        批量获取行情，返回列为 QUOTE_COLUMNS 的 DataFrame (code 为 6 位代码)
+        任一批次失败则抛出异常，由调用方决定是否退回其他数据源
+        """
+        symbols = list(dict.fromkeys(sina_symbol(c) for c in codes))
+        return self._fetch_batches(symbols, parse_sina, QUOTE_COLUMNS)
+
+    def fetch_proxies(self, symbols):
+        """
+        批量获取代理标的行情 (期货/指数/汇率，使用完整新浪代码)，返回列为 PROXY_COLUMNS 的 DataFrame
+        任一批次失败则抛出异常
+        """
+        return self._fetch_batches(list(dict.fromkeys(symbols)), parse_sina_proxy, PROXY_COLUMNS)
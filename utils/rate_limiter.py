@@ -0,0 +1,257 @@
+import random
+import threading
+import time
+
+from utils import profiler
+from utils.state import load_json, save_json_atomic
+
+
+class CircuitOpenError(Exception):
+    """接口处于熔断状态，直接失败不再请求"""
+
+
+class TokenBucket:
+    """
+    令牌桶限速器
+    rate: 每秒补充的令牌数; capacity: 桶容量 (允许的突发次数)
+    令牌不足时按预约方式排队：先扣减令牌再在锁外等待，多线程下依旧保持平均速率
+    """
+
+    def __init__(self, rate, capacity=1, clock=time.time, sleep=time.sleep):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = float(capacity)
+        self._last = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """取一个令牌，返回实际等待的秒数"""
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            self._tokens -= 1
+            wait = 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+        if wait > 0:
+            self._sleep(wait)
+        return wait
+
+
+class CircuitBreaker:
+    """
+    熔断器：连续失败 failure_threshold 次后打开，reset_timeout 秒内直接拒绝请求
+    冷却结束后进入半开状态，只发放一个试探令牌：拿到令牌的请求成功则关闭，失败则重新打开，
+    试探结果出来之前其他调用方一律拒绝 (试探超过 reset_timeout 仍无结果时重新发放，避免卡死)
+    """
+
+    def __init__(self, failure_threshold=3, reset_timeout=1800, clock=time.time):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self._probe_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if self._clock() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state != "half_open":
+                return state == "closed"
+            now = self._clock()
+            if self._probe_at is not None and now - self._probe_at < self.reset_timeout:
+                return False
+            self._probe_at = now
+            return True
+
+    def record_success(self):
+        with self._lock:
+            changed = self.failures > 0 or self.opened_at is not None
+            self.failures = 0
+            self.opened_at = None
+            self._probe_at = None
+            return changed
+
+    def record_failure(self):
+        """记录一次失败，返回熔断器是否因此打开"""
+        with self._lock:
+            self.failures += 1
+            self._probe_at = None
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                self.opened_at = self._clock()
+                return True
+            return False
+
+
+def backoff_delay(attempt, base_delay, max_delay, rng=random):
+    """
+    指数退避 + 抖动 (equal jitter)
+    第 n 次重试的等待时间落在 [d/2, d] 区间内，d = min(max_delay, base_delay * 2^(n-1))
+    """
+    delay = min(max_delay, base_delay * (2 ** (attempt - 1)))
+    return delay / 2 + rng.uniform(0, delay / 2)
+
+
+def retry_after_seconds(exc):
+    """
+    从异常中解析 Retry-After 冷却时间 (秒)
+    支持 requests 的 HTTPError (响应头 Retry-After / 429、503 状态码) 以及自带 retry_after 属性的异常
+    """
+    value = getattr(exc, "retry_after", None)
+    if value is not None:
+        return float(value)
+
+    response = getattr(exc, "response", None)
+    if response is None:
+        return None
+    header = getattr(response, "headers", {}).get("Retry-After")
+    if header:
+        try:
+            return float(header)
+        except ValueError:
+            return None
+    if getattr(response, "status_code", None) in (429, 503):
+        return 0.0
+    return None
+
+
+class RateLimiter:
+    """
+    接口调用限流层
+    1. 每个上游主机一个令牌桶，健康接口不再被固定的 sleep 拖慢
+    2. 失败后指数退避 + 抖动重试，服务端给出 Retry-After 时整个主机进入冷却
+    3. 每个接口一个熔断器，持续报错的接口直接失败，状态可持久化到文件跨运行保留
+
+    host_limits: {主机: {"rate": 每秒次数, "burst": 突发次数}}，必须包含 "default"
+    policies: {函数名: 策略字典}，未列出的字段使用 default_policy
+    clock/sleep/rng 可注入，便于离线用假时钟测试
+    """
+
+    def __init__(self, host_limits, default_policy, policies=None, state_file=None,
+                 clock=time.time, sleep=time.sleep, rng=random):
+        self.host_limits = host_limits
+        self.default_policy = default_policy
+        self.policies = policies or {}
+        self.state_file = state_file
+        self._clock = clock
+        self._sleep = sleep
+        self._rng = rng
+        self._buckets = {}
+        self._breakers = {}
+        self._cooldown_until = {}
+        self._lock = threading.Lock()
+        self._load_state()
+
+    def policy(self, name):
+        merged = dict(self.default_policy)
+        merged.update(self.policies.get(name, {}))
+        return merged
+
+    def bucket(self, host):
+        with self._lock:
+            if host not in self._buckets:
+                limit = self.host_limits.get(host, self.host_limits["default"])
+                self._buckets[host] = TokenBucket(limit["rate"], limit.get("burst", 1),
+                                                  clock=self._clock, sleep=self._sleep)
+            return self._buckets[host]
+
+    def breaker(self, name):
+        with self._lock:
+            if name not in self._breakers:
+                policy = self.policy(name)
+                self._breakers[name] = CircuitBreaker(policy["failure_threshold"], policy["reset_timeout"],
+                                                      clock=self._clock)
+            return self._breakers[name]
+
+    def _wait_cooldown(self, host):
+        wait = self._cooldown_until.get(host, 0) - self._clock()
+        if wait > 0:
+            print(f"   🧊 [{host}] 冷却中，等待 {wait:.1f}秒...")
+            self._sleep(wait)
+            return wait
+        return 0.0
+
+    def call(self, func, *args, retry_times=None, base_delay=None, **kwargs):
+        """按接口策略调用 func，成功返回结果，失败重试，达到上限或熔断时抛出异常"""
+        name = getattr(func, "__name__", repr(func))
+        with profiler.span(f"api:{name}") as sp:
+            result = self._call(sp, name, func, args, kwargs, retry_times, base_delay)
+            profiler.describe_result(sp, result)
+            return result
+
+    def _call(self, sp, name, func, args, kwargs, retry_times, base_delay):
+        policy = self.policy(name)
+        host = policy["host"]
+        retry_times = retry_times or policy["retry_times"]
+        base_delay = base_delay or policy["base_delay"]
+        breaker = self.breaker(name)
+
+        for attempt in range(1, retry_times + 1):
+            if not breaker.allow():
+                sp.set("circuit_open", True)
+                if breaker.state == "half_open":
+                    raise CircuitOpenError(f"[{name}] 熔断半开，等待试探请求结果，直接跳过")
+                raise CircuitOpenError(f"[{name}] 已熔断，{breaker.reset_timeout}秒冷却期内直接跳过")
+
+            sp.add("sleep_seconds", self._wait_cooldown(host))
+            sp.add("sleep_seconds", self.bucket(host).acquire())
+            start = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                sp.add("network_seconds", time.perf_counter() - start)
+                print(f"   ⚠️ [{name}] 第{attempt}/{retry_times}次调用失败: {e}")
+                opened = breaker.record_failure()
+                if opened:
+                    self._save_state()
+
+                cooldown = retry_after_seconds(e)
+                if cooldown:
+                    cooldown = min(cooldown, policy["max_delay"])
+                    self._cooldown_until[host] = max(self._cooldown_until.get(host, 0), self._clock() + cooldown)
+
+                if opened:
+                    print(f"   ❌ [{name}] 连续失败 {breaker.failures} 次，触发熔断")
+                    raise
+                if attempt < retry_times:
+                    delay = backoff_delay(attempt, base_delay, policy["max_delay"], self._rng)
+                    print(f"   ⏳ {delay:.1f}秒后重试...")
+                    sp.add("retries", 1)
+                    sp.add("sleep_seconds", delay)
+                    self._sleep(delay)
+                else:
+                    print(f"   ❌ [{name}] 已达最大重试次数，放弃此接口")
+                    raise
+            else:
+                sp.add("network_seconds", time.perf_counter() - start)
+                if breaker.record_success():
+                    self._save_state()
+                return result
+
+    # --- 熔断状态持久化 ---
+    def _load_state(self):
+        for name, item in load_json(self.state_file, {}).items():
+            breaker = self.breaker(name)
+            breaker.failures = item.get("failures", 0)
+            breaker.opened_at = item.get("opened_at")
+
+    def _save_state(self):
+        if not self.state_file:
+            return
+        with self._lock:
+            state = {
+                name: {"failures": b.failures, "opened_at": b.opened_at}
+                for name, b in self._breakers.items()
+                if b.failures or b.opened_at is not None
+            }
+            save_json_atomic(self.state_file, state, "熔断状态")
@@ -0,0 +1,181 @@
+"""
+声明式策略规则：条件写成数据 (Python 字典或 YAML)，编译成整列布尔掩码，再用 np.select 一次性给整表打标签
+规则格式：
+  conditions:                      # 具名条件，可在其他条件/规则中直接用名字引用
+    is_commodity:
+      any:
+        - {col: symbol, contains: "161226"}
+        - {col: name, matches: "白银|黄金"}
+  filter: {col: price, lt: $price_high}   # 可选，筛选条件；$xxx 引用调用时传入的参数
+  outputs:                         # 每个输出列：自上而下第一条满足的规则生效，都不满足用 default
+    risk_tag:
+      rules:
+        - {when: is_commodity, value: "[商品基]"}
+      default: "[普通]"
+
+条件写法：
+  {col: 列名或参数名, 运算符: 值}  运算符: gt/ge/lt/le/eq/ne/in/contains/matches/isna/notna
+  {all: [...]} / {any: [...]} / {not: 条件} / "具名条件"
+  col 不是表中的列时，取调用时传入的同名参数 (如 cost_rate)，按标量广播到整列
+"""
+import operator
+
+import numpy as np
+import pandas as pd
+
+_COMPARE = {
+    "gt": operator.gt,
+    "ge": operator.ge,
+    "lt": operator.lt,
+    "le": operator.le,
+    "eq": operator.eq,
+    "ne": operator.ne,
+}
+
+
+_CACHE_KEY = "__named_masks__"
+
+
+class RuleError(ValueError):
+    """规则写法有误 (编译期发现)"""
+
+
+def _value(value, params):
+    """$xxx 形式的值引用调用参数"""
+    if isinstance(value, str) and value.startswith("$"):
+        key = value[1:]
+        if key not in params:
+            raise RuleError(f"缺少规则参数: {key}")
+        return params[key]
+    return value
+
+
+def _column(df, name, params):
+    """取列；不是表中的列时取同名参数并广播成整列"""
+    if name in df.columns:
+        return df[name]
+    if name in params:
+        return pd.Series(params[name], index=df.index)
+    raise RuleError(f"规则引用了不存在的列/参数: {name}")
+
+
+def _compile_leaf(spec):
+    col = spec["col"]
+    ops = [k for k in spec if k != "col"]
+    if len(ops) != 1:
+        raise RuleError(f"每个条件只能有一个运算符: {spec}")
+    op = ops[0]
+    target = spec[op]
+
+    if op in _COMPARE:
+        func = _COMPARE[op]
+
+        def mask(df, params):
+            return func(_column(df, col, params), _value(target, params)).to_numpy(dtype=bool, na_value=False)
+    elif op == "in":
+        def mask(df, params):
+            return _column(df, col, params).isin(_value(target, params)).to_numpy(dtype=bool)
+    elif op in ("contains", "matches"):
+        regex = op == "matches"
+
+        def mask(df, params):
+            text = _column(df, col, params).astype(str)
+            return text.str.contains(_value(target, params), regex=regex).to_numpy(dtype=bool, na_value=False)
+    elif op in ("isna", "notna"):
+        want_na = (op == "isna") == bool(target)
+
+        def mask(df, params):
+            na = _column(df, col, params).isna().to_numpy()
+            return na if want_na else ~na
+    else:
+        raise RuleError(f"未知运算符: {op}")
+    return mask
+
+
+def compile_condition(spec, named=None):
+    """把条件编译成 mask(df, params) -> 布尔 ndarray"""
+    named = named or {}
+    if isinstance(spec, str):
+        if spec not in named:
+            raise RuleError(f"未定义的具名条件: {spec}")
+        func = named[spec]
+
+        def mask(df, params):
+            # 具名条件每次调用只算一遍，多条规则共用 (结果缓存在本次调用的参数里)
+            cache = params.setdefault(_CACHE_KEY, {})
+            if spec not in cache:
+                cache[spec] = func(df, params)
+            return cache[spec]
+        return mask
+    if not isinstance(spec, dict):
+        raise RuleError(f"条件必须是字典或具名条件: {spec!r}")
+
+    if "all" in spec or "any" in spec:
+        key = "all" if "all" in spec else "any"
+        parts = [compile_condition(s, named) for s in spec[key]]
+        combine = np.logical_and if key == "all" else np.logical_or
+
+        def mask(df, params):
+            result = np.full(len(df), key == "all")
+            for part in parts:
+                result = combine(result, part(df, params))
+            return result
+        return mask
+    if "not" in spec:
+        inner = compile_condition(spec["not"], named)
+        return lambda df, params: ~inner(df, params)
+    if "col" in spec:
+        return _compile_leaf(spec)
+    raise RuleError(f"无法识别的条件: {spec}")
+
+
+class Strategy:
+    """
+    编译好的一套规则
+    mask(df, **params): 筛选掩码 (没有 filter 时全为 True)
+    label(df, **params): 与 df 同索引的输出表，列为 spec["outputs"] 中定义的各列
+    """
+
+    def __init__(self, spec):
+        named = {}
+        for name, cond in spec.get("conditions", {}).items():
+            # 按定义顺序编译，后面的条件可以引用前面的
+            named[name] = compile_condition(cond, named)
+
+        self._filter = compile_condition(spec["filter"], named) if "filter" in spec else None
+        self._outputs = []
+        for column, output in spec.get("outputs", {}).items():
+            rules = [(compile_condition(r["when"], named), r["value"]) for r in output.get("rules", [])]
+            self._outputs.append((column, rules, output.get("default", "")))
+
+    def mask(self, df, **params):
+        if self._filter is None:
+            return np.ones(len(df), dtype=bool)
+        params[_CACHE_KEY] = {}
+        return self._filter(df, params)
+
+    def label(self, df, **params):
+        params[_CACHE_KEY] = {}
+        result = pd.DataFrame(index=df.index)
+        for column, rules, default in self._outputs:
+            if not rules:
+                result[column] = default
+                continue
+            conds = [func(df, params) for func, _ in rules]
+            result[column] = np.select(conds, [_value(v, params) for _, v in rules], default=default)
+        return result
+
+
+def compile_strategy(spec):
+    """编译整套规则 (写法见模块说明)，规则有误时抛出 RuleError"""
+    return Strategy(spec)
+
+
+def load_rules_file(path):
+    """读取 YAML 规则文件 (需要 PyYAML)，返回 {策略名: 规则}"""
+    try:
+        import yaml
+    except ImportError as e:
+        raise RuleError("读取 YAML 规则需要安装 PyYAML: pip install pyyaml") from e
+    with open(path, "r", encoding="utf-8") as f:
+        return yaml.safe_load(f) or {}
@@ -0,0 +1,39 @@
+"""
+JSON 状态文件读写 (只依赖标准库)
+熔断状态、数据源统计、费率表、LOF 分类索引、估值锚点、休市表、发件箱都落盘为仓库根目录下的 JSON：
+  1. 读取时文件不存在或内容损坏一律视为没有状态，不影响主流程
+  2. 写入先落到按进程/线程区分的临时文件再 os.replace，并发写入或中途崩溃都不会留下半个文件
+调用方在持有自己的状态锁时调用 save_json_atomic，落盘顺序与内存中的修改顺序一致
+"""
+import json
+import os
+import threading
+
+
+def load_json(path, default=None):
+    """读取 JSON 状态文件；path 为空、文件不存在或内容损坏时返回 default"""
+    if not path or not os.path.exists(path):
+        return default
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+
+def save_json_atomic(path, data, label="状态文件"):
+    """
+    原子写入 JSON 状态文件，path 为空时不落盘
+    写入失败只打印警告 (label 为提示中的名称)，返回是否写入成功
+    """
+    if not path:
+        return False
+    tmp_file = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_file, path)
+        return True
+    except OSError as e:
+        print(f"   ⚠️ {label}保存失败: {e}")
+        return False
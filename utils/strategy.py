@@ -1,209 +1,364 @@
-from config import COST_RATE
+from concurrent.futures import ThreadPoolExecutor
+
+from config import CAPITAL_COST_RATE, COMMISSION_RATE, COST_RATE, STRATEGY_RULES_FILE
 import akshare as ak
 import datetime
+import functools
+import numpy as np
+import pandas as pd
+
+from utils.data_fetcher import _call_api
+from utils import profiler
+from utils.fees import net_arbitrage
+from utils.rules import compile_strategy, load_rules_file
+from utils.trade_calendar import get_calendar
+
+# --- LOF 品种识别关键词 ---
+COMMODITY_PATTERN = '白银|黄金'
+QDII_PATTERN = 'QDII|标普|纳指|恒生|教育'
+
+# ==========================================
+# 策略规则 (写法见 utils/rules.py)
+# 标签/建议都是自上而下第一条满足的规则生效；config.STRATEGY_RULES_FILE 可用 YAML 覆盖同名策略
+# ==========================================
+LOF_RULES = {
+    "conditions": {
+        # --- A. 白银/商品类 (如 161226) ---
+        "is_commodity": {"any": [
+            {"col": "category", "eq": "COMMODITY"},
+            {"col": "symbol", "contains": "161226"},
+            {"col": "name", "matches": COMMODITY_PATTERN},
+        ]},
+        # --- B. QDII 类 (如 161128, 161130) ---
+        # 优先看分类索引 (按基金类型识别)；没有分类时名字带 QDII/标普/纳指 等跨市场关键词，且不在商品里
+        "is_qdii": {"all": [{"not": "is_commodity"}, {"any": [
+            {"col": "category", "eq": "QDII"},
+            {"col": "name", "matches": QDII_PATTERN},
+        ]}]},
+        # --- D. 折价机会 (场内买入 -> 场外赎回) ---
+        "is_discount": {"col": "side", "eq": "discount"},
+        # --- C. 国内/其他 LOF ---
+    },
+    "outputs": {
+        "risk_tag": {
+            "rules": [
+                {"when": "is_commodity", "value": "[商品基]"},
+                {"when": "is_qdii", "value": "[QDII]"},
+            ],
+            "default": "[普通]",
+        },
+        "advice": {
+            "rules": [
+                {"when": {"all": ["is_discount", "is_qdii"]},
+                 "value": "💸 折价：场内买入后赎回，QDII 赎回到账慢 (T+2 以上)，期间承担外盘波动。"},
+                {"when": "is_discount",
+                 "value": "💸 折价：场内买入当日即可赎回，注意持有不满7天的惩罚性赎回费(1.5%)。"},
+                {"when": {"all": ["is_commodity", {"col": "premium_rate", "gt": 10}]},
+                 "value": "⚠️ 必限购(约100元)！务必先试单。溢价极高，适合小资金/拖拉机账户参与。"},
+                {"when": {"all": ["is_commodity", {"col": "source", "eq": "代理估值"}]},
+                 "value": "📈 估值已按[商品期货]实时涨跌折算，收盘前再确认一次期货走势。"},
+                {"when": "is_commodity",
+                 "value": "⚠️ 数据基于昨晚净值。请人工扣除今日[商品期货]涨跌幅。"},
+                {"when": {"all": ["is_qdii", {"col": "net_premium", "gt": 2.5}]},
+                 "value": "🔥 重点关注！收盘前务必确认[美股期货]未大跌。T+2风险较高。"},
+                {"when": {"all": ["is_qdii", {"col": "net_premium", "gt": 1.0}]},
+                 "value": "😐 鸡肋。扣费后肉少，除非赌今晚美股大涨，否则不建议操作。"},
+                {"when": "is_qdii",
+                 "value": "❌ 没肉。扣费+T+2风险后期望值为负。"},
+            ],
+            "default": "关注流动性，警惕成交额过低卖不出去。",
+        },
+    },
+}
+
+CB_RULES = {
+    # 1. 价格在区间内 (不做高价妖债，防强赎风险)  2. 成交额达标 (保证流动性)
+    "filter": {"all": [
+        {"col": "price", "lt": "$price_high"},
+        {"col": "price", "gt": "$price_low"},
+        {"col": "volume", "gt": "$min_volume"},
+    ]},
+    "outputs": {
+        "advice": {
+            "rules": [
+                # 如果查到了下修公告，把 advice 变得很显眼
+                {"when": {"all": [{"col": "news", "contains": "向下修正"}, {"not": {"col": "news", "contains": "不"}}]},
+                 "value": "🔥 突发利好！提议下修！"},
+                {"when": {"col": "news", "matches": "不向下|不修正"}, "value": "❄️ 利空：公司决定不下修"},
+                # 简单评级
+                {"when": {"col": "double_low", "lt": 115}, "value": "⭐⭐⭐ 极品双低"},
+                {"when": {"col": "double_low", "lt": 125}, "value": "⭐⭐ 优质配置"},
+            ],
+            "default": "⭐ 普通关注",
+        },
+    },
+}
+
+REPO_RULES = {
+    # bonus_days = 计息天数 - 资金占用天数 (成交日到资金可用日的自然日数)
+    #   > 0: 节假日前借出，不能用钱的日子也计息 (周四、节前最后两天)
+    #   < 0: 资金在假期被占用却不计息 (周五、节前最后一天的 1 天期)
+    "conditions": {
+        "has_bonus": {"col": "bonus_days", "gt": 0},
+        "is_idle": {"col": "bonus_days", "lt": 0},
+    },
+    "outputs": {
+        "tag": {
+            "rules": [
+                # 1. 假期红利  2. 假期闲置  3. 高息提醒 (按实际占用天数折算的年化)
+                {"when": "has_bonus", "value": "🔥 [假期红利]"},
+                {"when": "is_idle", "value": "⚠️ [假期闲置]"},
+                {"when": {"col": "effective_rate", "gt": 3.5}, "value": "🚀 [高息机会]"},
+                {"when": {"col": "effective_rate", "gt": 2.5}, "value": "💰 [稳健理财]"},
+            ],
+            "default": "💤 [鸡肋]",
+        },
+        "advice": {
+            "rules": [
+                {"when": "has_bonus", "value": "计息天数多于资金占用天数，资金可用后仍在计息，闲钱优先做。"},
+                {"when": "is_idle",
+                 "value": "资金在休市日被占用却不计息，除非利率极高(>5%)，否则不如货基或换更长期限。"},
+                {"when": {"col": "effective_rate", "gt": 3.5}, "value": "年化利率较高，闲钱可撸。"},
+                {"when": {"col": "effective_rate", "gt": 2.5}, "value": "比活期强，适合闲钱过夜。"},
+            ],
+            "default": "利率一般，无更好机会再做。",
+        },
+    },
+}
+
+DEFAULT_RULES = {"lof": LOF_RULES, "cb": CB_RULES, "repo": REPO_RULES}
+
+
+@functools.lru_cache(maxsize=None)
+def get_strategy(name):
+    """
+    编译并缓存指定策略 (lof / cb / repo)
+    配置了 YAML 规则文件时，文件中同名策略的 filter 整体替换，conditions / outputs 按名字逐项覆盖默认规则
+    """
+    spec = DEFAULT_RULES[name]
+    if STRATEGY_RULES_FILE:
+        custom = load_rules_file(STRATEGY_RULES_FILE).get(name)
+        if custom:
+            print(f"   📐 策略 [{name}] 使用自定义规则: {STRATEGY_RULES_FILE}")
+            spec = {
+                **spec, **custom,
+                "conditions": {**spec.get("conditions", {}), **custom.get("conditions", {})},
+                "outputs": {**spec.get("outputs", {}), **custom.get("outputs", {})},
+            }
+    return compile_strategy(spec)
+
+
+@profiler.timed()
+def analyze_lof_frame(df, cost_rate=COST_RATE, commission=COMMISSION_RATE, capital_rate=CAPITAL_COST_RATE):
+    """
+    对一批基金做向量化深度分析 (规则编译成整列掩码，不逐行调用)
+    输入需包含 symbol / name / premium_rate 列
+    (可选 source 列：IOPV 来源；category / lag 列：分类索引的类别和到账周期；side 列：premium / discount；
+     subscribe_fee / redeem_fee 列：费率表，带上时按实际费率和资金成本算净收益)
+    cost_rate / commission: 综合成本 / 佣金(%)，可以是标量，也可以是与 df 同索引的 Series (多账户批量评估时每行不同)
+    返回：与 df 同索引的 DataFrame，列为 net_premium / risk_tag / advice
+    """
+    # 1. 计算净收益：有费率表时按 申购->卖出 / 买入->赎回 两条路径实际测算，否则扣综合成本
+    side = df['side'] if 'side' in df.columns else pd.Series("premium", index=df.index)
+    if 'subscribe_fee' in df.columns:
+        net_subscribe, net_redeem = net_arbitrage(
+            df['premium_rate'].to_numpy(dtype=float), df['subscribe_fee'].to_numpy(dtype=float),
+            df['redeem_fee'].to_numpy(dtype=float), df['lag'] if 'lag' in df.columns else np.nan,
+            np.asarray(commission, dtype=float), capital_rate, np.asarray(cost_rate, dtype=float),
+        )
+        net = pd.Series(np.where(side == "discount", net_redeem, net_subscribe), index=df.index)
+    else:
+        net = df['premium_rate'].where(side != "discount", -df['premium_rate']) - cost_rate
+    frame = pd.DataFrame({
+        "symbol": df['symbol'],
+        "name": df['name'],
+        "premium_rate": df['premium_rate'],
+        "net_premium": net,
+        "source": df['source'] if 'source' in df.columns else "",
+        "category": df['category'].fillna("") if 'category' in df.columns else "",
+        "side": side,
+    }, index=df.index)
+
+    # 2. 识别品种与风险定性
+    labels = get_strategy("lof").label(frame)
+    return pd.DataFrame(
+        {"net_premium": frame['net_premium'].round(2), "risk_tag": labels['risk_tag'], "advice": labels['advice']},
+        index=df.index
+    )
+
 
 def analyze_single_lof(row):
     """
-    对单只基金进行深度分析
+    对单只基金进行深度分析 (analyze_lof_frame 的单行版本)
     返回：净溢价、风险等级、实战建议
     """
-    code = str(row['symbol'])
-    name = row['name']
-    premium = row['premium_rate']
+    result = analyze_lof_frame(pd.DataFrame([row]))
+    return result.iloc[0].to_dict()
 
-    # 1. 计算净溢价 (扣除手续费)
-    net_premium = premium - COST_RATE
-
-    # 2. 识别品种与风险定性
-    advice = ""
-    risk_tag = ""
-
-    # --- A. 白银/商品类 (如 161226) ---
-    if '161226' in code or '白银' in name or '黄金' in name:
-        risk_tag = "[商品基]"
-        if premium > 10:
-            advice = "⚠️ 必限购(约100元)！务必先试单。溢价极高，适合小资金/拖拉机账户参与。"
-        else:
-            advice = "⚠️ 数据基于昨晚净值。请人工扣除今日[商品期货]涨跌幅。"
-
-    # --- B. QDII 类 (如 161128, 161130) ---
-    # 简单粗暴判断：代码是 16 开头且不在商品里，或者名字带 LOF 且大概率是跨市场的
-    elif 'QDII' in name or '标普' in name or '纳指' in name or '恒生' in name or '教育' in name:
-        risk_tag = "[QDII]"
-        if net_premium > 2.5:
-            advice = "🔥 重点关注！收盘前务必确认[美股期货]未大跌。T+2风险较高。"
-        elif net_premium > 1.0:
-            advice = "😐 鸡肋。扣费后肉少，除非赌今晚美股大涨，否则不建议操作。"
-        else:
-            advice = "❌ 没肉。扣费+T+2风险后期望值为负。"
-
-    # --- C. 国内/其他 LOF ---
-    else:
-        risk_tag = "[普通]"
-        advice = "关注流动性，警惕成交额过低卖不出去。"
 
-    return {
-        "net_premium": round(net_premium, 2),
-        "risk_tag": risk_tag,
-        "advice": advice
-    }
+# --- 下修公告检查配置 ---
+NEWS_MAX_WORKERS = 4          # 并发查询公告的线程数 (实际速率仍受 _call_api 主机令牌桶约束)
+NEWS_LOOKBACK_DAYS = 7        # 只看最近几天的公告
+NEWS_KEYWORDS = '向下修正|下修|不修正|不向下'
 
 
-def filter_double_low_cb(df, limit=5):
+@profiler.timed()
+def filter_double_low_cb(df, limit=5, price_low=90, price_high=130, min_volume=10000000, news_map=None):
     """
     筛选【双低策略】可转债
-    条件：
+    条件 (CB_RULES)：
     1. 价格 < 130 (不做高价妖债，防强赎风险)
-    2. 溢价率 < 10 (保证进攻性)
+    2. 价格 > 90
     3. 成交额 > 1000万 (保证流动性)
-    4. 未停牌
-    """
-    # 筛选池
-    pool = df[
-        (df['price'] < 130) &
-        (df['price'] > 90) &
-        (df['volume'] > 10000000)  # 1000万以上
-        ].copy()
-
-    # 按双低值从小到大排序
-    pool.sort_values(by='double_low', ascending=True, inplace=True)
-
-    # 取前 N 名
-    top_list = []
-    for _, row in pool.head(limit).iterrows():
-        advice = ""
-        # 简单评级
-        if row['double_low'] < 115:
-            advice = "⭐⭐⭐ 极品双低"
-        elif row['double_low'] < 125:
-            advice = "⭐⭐ 优质配置"
-        else:
-            advice = "⭐ 普通关注"
-
-        news_tag = ""
-        if 'stock_code' in row:
-            print(f"   正在检查 {row['name']} 的下修公告...")
-            news_tag = check_bond_news(row['stock_code'])
-
-        # 如果查到了下修公告，不仅要加进去，还要把 advice 变得很显眼
-        if "向下修正" in news_tag and "不" not in news_tag:
-            advice = "🔥 突发利好！提议下修！"
-        elif "不向下" in news_tag or "不修正" in news_tag:
-            advice = "❄️ 利空：公司决定不下修"
-
-        top_list.append({
-            "code": row['symbol'],
-            "name": row['name'],
-            "price": row['price'],
-            "premium": row['premium_rate'],
-            "double_low": row['double_low'],
-            "advice": advice,
-            "news": news_tag
-        })
-
-    return top_list
+    news_map: 已查好的 {正股代码: 公告提示}，传入时不再请求 (多账户共用一次查询)
+    """
+    strategy = get_strategy("cb")
+    # 筛选池，按双低值从小到大取前 N 名
+    keep = strategy.mask(df, price_low=price_low, price_high=price_high, min_volume=min_volume)
+    pool = df[keep].nsmallest(limit, 'double_low')
+
+    # 并发查询正股公告 (同一正股当日只查一次)
+    news = pd.Series("", index=pool.index)
+    if 'stock_code' in pool.columns and not pool.empty:
+        if news_map is None:
+            print(f"   正在检查 {len(pool)} 只转债的下修公告...")
+            news_map = check_bonds_news(pool['stock_code'].tolist())
+        news = pool['stock_code'].map(news_map).fillna("")
+
+    # 公告与双低值一起评级
+    advice = strategy.label(pool.assign(news=news))['advice']
+
+    top_list = pd.DataFrame({
+        "code": pool['symbol'],
+        "name": pool['name'],
+        "price": pool['price'],
+        "premium": pool['premium_rate'],
+        "double_low": pool['double_low'],
+        # 理论价值/定价偏离 (%)，数据不全无法定价时为 NaN
+        "theo_value": pool.get('theo_value', np.nan),
+        "mispricing": pool.get('mispricing', np.nan),
+        "advice": advice,
+        "news": news,
+    })
+    return top_list.to_dict('records')
+
+
+@profiler.timed()
+def check_bonds_news(stock_codes, max_workers=NEWS_MAX_WORKERS):
+    """
+    批量检查多只正股的下修公告 (有界线程池并发)
+    返回：{正股代码: 公告提示文本}
+    """
+    codes = list(dict.fromkeys(c for c in stock_codes if c))
+    if not codes:
+        return {}
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="news") as pool:
+        return dict(zip(codes, pool.map(check_bond_news, codes)))
 
 
 def check_bond_news(stock_code):
     """
     检查指定正股最近一周的公告，看有没有[下修]相关的关键词
     返回：公告提示文本 (或空字符串)
+    结果按交易日缓存 (stock_news_em 的缓存策略)，上午查过的下午不再请求
     """
     try:
-        # 获取个股公告 (限制最近 10 条，减少耗时)
-        # 接口: stock_notice_report 或者是 stock_news_em
-        # 这里用 stock_zh_a_spot_em 的逻辑太重，建议直接搜特定接口
-        # 简单起见，我们模拟一个“是否有下修”的判断，
-        # 实战中 Akshare 获取公告列表较慢，建议只对 Top 5 跑
-
         # 注意：akshare 获取公告的接口经常变，这里用一个比较通用的新闻接口代替
-        news_df = ak.stock_news_em(symbol=stock_code)
+        news_df = _call_api(ak.stock_news_em, symbol=stock_code).head(10)
+
+        # 动态找列名 (新旧版本列名不同)
+        title_col = next((c for c in news_df.columns if "标题" in c or c == "title"), None)
+        time_col = next((c for c in news_df.columns if "时间" in c or c == "public_time"), None)
+        if not title_col or not time_col:
+            return ""
 
         # 只要最近 7 天的
         today = datetime.datetime.now()
-        seven_days_ago = (today - datetime.timedelta(days=7)).strftime('%Y-%m-%d')
-
-        target_news = []
-        keywords = ['向下修正', '下修', '不修正', '不向下']
+        since = (today - datetime.timedelta(days=NEWS_LOOKBACK_DAYS)).strftime('%Y-%m-%d')
 
-        for _, row in news_df.head(10).iterrows():
-            title = row['title']
-            date = row['public_time'][:10]  # 截取日期
+        titles = news_df[title_col].astype(str)
+        dates = news_df[time_col].astype(str).str[:10]  # 截取日期
+        hits = (dates >= since) & titles.str.contains(NEWS_KEYWORDS)
+        if not hits.any():
+            return ""
 
-            if date >= seven_days_ago:
-                for kw in keywords:
-                    if kw in title:
-                        return f"📢 {date} 公告: {title}"
-
-        return ""
+        first = hits.idxmax()
+        return f"📢 {dates[first]} 公告: {titles[first]}"
 
     except:
         return ""  # 查不到就拉倒，不卡程序
 
 
-def analyze_repo_strategy(repo_df):
+# --- 逆回购计息 ---
+REPO_PRINCIPAL = 100000       # 收益按 10 万元本金估算
+# 佣金 (占本金 %)，按期限天数分档：不超过该天数的最短一档生效
+REPO_FEE_TIERS = [(1, 0.001), (2, 0.002), (3, 0.003), (4, 0.004), (7, 0.005), (14, 0.01), (28, 0.02), (182, 0.03)]
+
+
+def repo_schedule(tenors, today=None, calendar=None):
+    """
+    按交易日历向量化推算各期限逆回购的关键日期 (tenors 为期限天数数组)
+      成交日 T：今天 (非交易日顺延到下一个交易日)
+      首次清算日：T 的下一个交易日，从这天起计息
+      到期日：首次清算日 + 期限天数，遇休市顺延到下一个交易日；计息天数 = 到期日 - 首次清算日
+      资金可用日：到期日的前一个交易日 (可买股票)；资金可取日：到期日
+    返回：DataFrame (trade_day / interest_days / usable / withdrawable / occupied_days)
+    """
+    calendar = calendar or get_calendar()
+    tenors = np.asarray(tenors, dtype=np.int64)
+    trade_day = calendar.ceil(today or datetime.date.today())
+    first_settle = np.datetime64(calendar.shift(trade_day, 1), "D")
+    maturity = calendar.ceil(first_settle + tenors.astype("timedelta64[D]"))
+    usable = calendar.shift(maturity, -1)
+    return pd.DataFrame({
+        "trade_day": np.datetime64(trade_day, "D"),
+        "interest_days": (maturity - first_settle).astype(np.int64),
+        "usable": usable,
+        "withdrawable": maturity,
+        "occupied_days": (usable - np.datetime64(trade_day, "D")).astype(np.int64),
+    })
+
+
+@profiler.timed()
+def analyze_repo_strategy(repo_df, today=None):
     """
-    分析逆回购策略
+    分析逆回购策略 (沪深全部期限)
     逻辑：
-    1. 判断是否周四 (1天计3天息)
-    2. 判断是否周五 (1天计1天息，资金周末不可用，通常不推荐)
-    3. 判断利率高低
+    1. 按交易日历算出各期限的实际计息天数、资金可用日/可取日 (节假日前后计息天数会变)
+    2. 实际年化 = 扣佣金后的利息 / 资金占用天数，衡量这笔钱真正被锁住期间的收益
+    3. 判断利率高低，按实际年化从高到低排序
+    标签与建议见 REPO_RULES
     """
-    results = []
     if repo_df.empty:
-        return results
-
-    # 获取今天是星期几 (0=周一, 3=周四, 4=周五)
-    weekday = datetime.datetime.now().weekday()
-
-    is_thursday = (weekday == 3)
-    is_friday = (weekday == 4)
-
-    for _, row in repo_df.iterrows():
-        code = row['code']
-        rate = row['rate']
-        name = row['name']
-
-        advice = ""
-        tag = ""
-
-        # --- 策略逻辑 ---
-
-        # 1. 周四特效
-        if is_thursday:
-            tag = "🔥 [周四红利]"
-            advice = "今日卖出1天期，享 3天 利息！资金周五可用(买股)，下周一可取。"
-
-        # 2. 周五避坑
-        elif is_friday:
-            tag = "⚠️ [周五慎做]"
-            advice = "今日卖出1天期，仅享1天利息，资金周末被占用。除非利率极高(>5%)，否则不如货基。"
-
-        # 3. 高息提醒 (平日)
-        else:
-            if rate > 3.5:
-                tag = "🚀 [高息机会]"
-                advice = "年化利率较高，闲钱可撸。"
-            elif rate > 2.5:
-                tag = "💰 [稳健理财]"
-                advice = "比活期强，适合闲钱过夜。"
-            else:
-                tag = "💤 [鸡肋]"
-                advice = "利率一般，无更好机会再做。"
-
-        # 计算每10万元一天的预估收益 (扣除大概手续费，1天期约十万分之一)
-        # 收益 = 本金 * 利率% / 365 * 计息天数
-        days = 3 if is_thursday else 1
-        # 粗略估算 10万元 的收益
-        profit_10w = (100000 * (rate / 100) / 365 * days) - 1  # 减去1块钱手续费
-
-        results.append({
-            "code": code,
-            "name": name,
-            "rate": rate,
-            "tag": tag,
-            "advice": advice,
-            "profit_txt": f"{profit_10w:.2f}元"  # 每10w收益
-        })
-
-    return results
\ No newline at end of file
+        return []
+
+    tenors = repo_df['tenor'].to_numpy()
+    schedule = repo_schedule(tenors, today)
+    interest_days = schedule['interest_days'].to_numpy()
+    occupied_days = np.maximum(schedule['occupied_days'].to_numpy(), 1)
+    fee = np.asarray([next(rate for days, rate in REPO_FEE_TIERS if t <= days) for t in tenors])
+    # 收益 = 本金 * (利率% / 365 * 计息天数 - 佣金%)
+    rate = repo_df['rate'].to_numpy(dtype=float)
+    net = rate / 365 * interest_days - fee
+    frame = pd.DataFrame({
+        "rate": rate,
+        "bonus_days": interest_days - occupied_days,
+        "effective_rate": net / occupied_days * 365,
+    }, index=repo_df.index)
+    labels = get_strategy("repo").label(frame)
+
+    results = pd.DataFrame({
+        "code": repo_df['code'],
+        "name": repo_df['name'],
+        "rate": repo_df['rate'],
+        "tenor": tenors,
+        "interest_days": interest_days,
+        "usable": schedule['usable'].dt.strftime("%m-%d").to_numpy(),
+        "withdrawable": schedule['withdrawable'].dt.strftime("%m-%d").to_numpy(),
+        "effective_rate": frame['effective_rate'].round(2),
+        "tag": labels['tag'],
+        "advice": labels['advice'],
+        "profit_txt": pd.Series(REPO_PRINCIPAL * net / 100, index=repo_df.index).map("{:.2f}元".format),  # 每10w收益
+    })
+    results = results[results['rate'] > 0].sort_values('effective_rate', ascending=False, kind='stable')
+    return results.to_dict('records')
@@ -0,0 +1,139 @@
+"""
+交易日历：沪深交易所开市日，预先展开成按自然日下标的数组，任意日期的查询都是 O(1) 的数组取值
+  1. 休市表见 utils/exchange_holidays.py (内置近几年的休市安排 + 落盘的交易所休市表)，没有休市数据的年份只排除周末
+  2. data_fetcher.refresh_trade_calendar 拉取新浪历史交易日表，把交易所实际休市的工作日落盘为 JSON，
+     与内置表合并；拉取失败不影响使用
+  3. 查询同时支持单个日期和整列日期 (逆回购各期限的到期日/计息天数一次算完)
+"""
+import datetime
+import threading
+
+import numpy as np
+
+from utils.exchange_holidays import CALENDAR_FILE, HOLIDAYS, load_holidays
+from utils.state import save_json_atomic
+
+# --- 交易日历配置 ---
+CALENDAR_FIRST_YEAR = 2005   # 日历展开的起始年份 (历史回填/回测够用)
+CALENDAR_YEARS_AHEAD = 1     # 向后多展开几年 (182 天期逆回购跨年)
+YEAR_END_MONTH_DAY = "12-24"  # 交易日表最后一天不早于该日，才认为这一年的休市安排完整
+
+
+def _to_days(dates):
+    """单个日期或整列日期 (字符串 / date / datetime / datetime64) -> datetime64[D] 数组"""
+    dates = np.atleast_1d(dates)
+    if dates.dtype == object:
+        dates = np.array([np.datetime64(d, "D") for d in dates], dtype="datetime64[D]")
+    return dates.astype("datetime64[D]")
+
+
+class TradingCalendar:
+    """
+    holidays: {年份: ['MM-DD', ...]} 工作日休市日
+    构造时把 [first_year, last_year] 的每个自然日展开成数组：
+      _open[i]: 第 i 天是否开市；_rank[i]: 不晚于第 i 天的最后一个交易日在 _days 中的位置
+    之后所有查询都是对这两个数组的下标运算
+    """
+
+    def __init__(self, holidays, first_year=CALENDAR_FIRST_YEAR, last_year=None):
+        last_year = last_year or max([datetime.date.today().year, *holidays]) + CALENDAR_YEARS_AHEAD
+        self.start = np.datetime64(f"{first_year}-01-01", "D")
+        self.end = np.datetime64(f"{last_year}-12-31", "D")
+        calendar_days = np.arange(self.start, self.end + 1, dtype="datetime64[D]")
+        # 1970-01-01 是周四，(天数 + 3) % 7 即 0=周一 ... 6=周日
+        is_open = (calendar_days.astype(np.int64) + 3) % 7 < 5
+        closed = np.array([f"{year}-{md}" for year, days in holidays.items() for md in days], dtype="datetime64[D]")
+        closed = closed[(closed >= self.start) & (closed <= self.end)]
+        is_open[(closed - self.start).astype(np.int64)] = False
+
+        self.years = sorted(int(y) for y in holidays)
+        self._open = is_open
+        self._days = calendar_days[is_open]
+        self._rank = np.cumsum(is_open) - 1
+
+    def _offsets(self, dates):
+        days = _to_days(dates)
+        if days.size and (days.min() < self.start or days.max() > self.end):
+            raise ValueError(f"日期超出交易日历范围 {self.start} ~ {self.end}")
+        return (days - self.start).astype(np.int64)
+
+    def _result(self, dates, positions):
+        days = self._days[positions]
+        return days[0].item() if np.ndim(dates) == 0 else days
+
+    def is_open(self, dates):
+        """是否交易日；单个日期返回 bool，整列返回布尔数组"""
+        opened = self._open[self._offsets(dates)]
+        return bool(opened[0]) if np.ndim(dates) == 0 else opened
+
+    def session(self, dates):
+        """不晚于该日的最后一个交易日 (周末/节假日归属到节前最后一个交易日)"""
+        return self._result(dates, self._rank[self._offsets(dates)])
+
+    def ceil(self, dates):
+        """不早于该日的第一个交易日"""
+        offsets = self._offsets(dates)
+        return self._result(dates, self._rank[offsets] + ~self._open[offsets])
+
+    def shift(self, dates, n):
+        """往后 (n > 0) / 往前 (n < 0) 数第 n 个交易日，不含当天"""
+        offsets = self._offsets(dates)
+        rank = self._rank[offsets]
+        positions = rank + n if n > 0 else rank + n + ~self._open[offsets]
+        return self._result(dates, positions)
+
+
+def years_covered(trade_dates):
+    """交易日表中休市安排完整的年份：最后一个交易日不早于 YEAR_END_MONTH_DAY 的那些年"""
+    last = {}
+    for day in _to_days(trade_dates).tolist():
+        last[day.year] = max(last.get(day.year, day), day)
+    return sorted(year for year, day in last.items() if day.strftime("%m-%d") >= YEAR_END_MONTH_DAY)
+
+
+def holidays_from_trade_dates(trade_dates, first_year=CALENDAR_FIRST_YEAR):
+    """交易日表 -> {年份: 工作日休市日} (只取休市安排完整的年份)"""
+    opened = _to_days(trade_dates)
+    result = {}
+    for year in years_covered(trade_dates):
+        if year < first_year:
+            continue
+        days = np.arange(f"{year}-01-01", f"{year + 1}-01-01", dtype="datetime64[D]")
+        weekdays = days[np.is_busday(days)]
+        result[year] = [d.strftime("%m-%d") for d in weekdays[~np.isin(weekdays, opened)].tolist()]
+    return result
+
+
+_calendar = None
+_lock = threading.Lock()
+
+
+def get_calendar():
+    """进程内共享的交易日历 (内置休市表 + 落盘的交易所休市表)，首次使用时构建"""
+    global _calendar
+    if _calendar is None:
+        with _lock:
+            if _calendar is None:
+                _calendar = TradingCalendar(load_holidays(CALENDAR_FILE))
+    return _calendar
+
+
+def update_calendar(trade_dates, state_file=CALENDAR_FILE):
+    """
+    用交易所交易日表更新休市表：落盘并重建共享日历
+    返回新增覆盖的年份列表
+    """
+    global _calendar
+    fetched = holidays_from_trade_dates(trade_dates)
+    if not fetched:
+        return []
+    with _lock:
+        holidays = load_holidays(state_file)
+        added = sorted(set(fetched) - set(holidays))
+        saved = {year: days for year, days in holidays.items() if year not in HOLIDAYS}
+        saved.update(fetched)
+        if state_file:
+            save_json_atomic(state_file, {str(y): saved[y] for y in sorted(saved)}, "交易日历")
+            load_holidays.cache_clear()
+        _calendar = TradingCalendar({**holidays, **fetched})
+    return added
@@ -0,0 +1,114 @@
+"""
+代理估值：没有实时估值的基金 (白银等商品基、部分 QDII) 用 最新官方净值 x 跟踪标的涨跌 (x 汇率变动) 自算 IOPV
+  估值 = 净值 x (1 + 仓位 x ((标的现价 / 标的锚点) x (汇率现价 / 汇率锚点) - 1))
+锚点是净值日当天标的的收盘价/结算价：
+  1. 每次拉取代理行情时，把各标的的昨收记为上一交易日的收盘，存入锚点文件
+  2. 估值时按基金的净值日期查锚点，查不到 (刚开始使用/净值日太久远) 时用标的的昨收
+QDII 净值通常比 A 股晚一天公布，锚点按日期积累后就能对上正确的那一天
+"""
+import datetime
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from utils.state import load_json, save_json_atomic
+from utils.trade_calendar import get_calendar
+
+# --- 代理估值配置 ---
+ANCHOR_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".proxy_anchors.json")
+ANCHOR_KEEP_DAYS = 10        # 每个标的保留最近多少个交易日的锚点
+
+
+def previous_session(today=None):
+    """上一个交易日 (YYYY-MM-DD)，跳过周末和节假日"""
+    return get_calendar().shift(today or datetime.date.today(), -1).strftime("%Y-%m-%d")
+
+
+class AnchorStore:
+    """
+    各代理标的按日期记录的收盘价 {标的: {日期: 收盘价}}
+    state_file 不为空时每次记录都原子写入 JSON，跨运行积累
+    """
+
+    def __init__(self, state_file=None, keep_days=ANCHOR_KEEP_DAYS):
+        self.state_file = state_file
+        self.keep_days = keep_days
+        self._anchors = load_json(state_file, {})
+        self._lock = threading.Lock()
+
+    def record(self, quotes, session_date):
+        """quotes: 代理行情表 (proxy / prev_close)，昨收记为 session_date 的收盘"""
+        valid = quotes[quotes['prev_close'] > 0]
+        if valid.empty:
+            return
+        with self._lock:
+            for proxy, close in zip(valid['proxy'], valid['prev_close']):
+                days = self._anchors.setdefault(proxy, {})
+                days[session_date] = float(close)
+                for old in sorted(days)[:-self.keep_days]:
+                    del days[old]
+            save_json_atomic(self.state_file, self._anchors, "估值锚点")
+
+    def lookup(self, proxies, dates):
+        """按 (标的, 日期) 批量查锚点，查不到的为 NaN"""
+        with self._lock:
+            return np.array([self._anchors.get(p, {}).get(d, np.nan) for p, d in zip(proxies, dates)],
+                            dtype=float)
+
+
+
+def proxy_table(mapping):
+    """
+    代理配置 {基金代码: {"proxy": ..., "weight": ..., "fx": ...}} -> 按 symbol 索引的表
+    列：proxy / weight / fx (人民币资产 fx 为空)
+    """
+    rows = [(str(symbol), item["proxy"], float(item.get("weight", 1.0)), item.get("fx") or "")
+            for symbol, item in mapping.items()]
+    return pd.DataFrame(rows, columns=['symbol', 'proxy', 'weight', 'fx']).set_index('symbol')
+
+
+def proxy_symbols(table):
+    """需要拉取行情的全部代理标的 (含汇率)，去重后保持配置顺序"""
+    return list(dict.fromkeys([*table['proxy'], *[fx for fx in table['fx'] if fx]]))
+
+
+def _anchored(codes, nav_dates, quotes, anchors):
+    """
+    各行标的的 (现价, 锚点)：锚点优先取净值日的收盘价，查不到用昨收
+    价格 <= 0 (新浪空字段解析成 0) 视为缺失，否则仓位不足 100% 的基金会算出一个很低但为正的估值
+    """
+    quotes = quotes.drop_duplicates('proxy').set_index('proxy')
+    price = quotes['price'].reindex(codes).to_numpy(dtype=float)
+    anchor = quotes['prev_close'].reindex(codes).to_numpy(dtype=float)
+    if anchors is not None:
+        stored = anchors.lookup(codes, nav_dates)
+        anchor = np.where(np.isnan(stored), anchor, stored)
+    return np.where(price > 0, price, np.nan), np.where(anchor > 0, anchor, np.nan)
+
+
+def estimate_iopv(ref, table, quotes, anchors=None):
+    """
+    向量化估算所有映射基金的 IOPV
+    ref: 按 symbol 索引、含 nav_official / nav_date 的参考净值表
+    table: proxy_table 的输出；quotes: 代理行情表 (proxy / price / prev_close)
+    返回：按 symbol 索引的估值 Series (缺净值/缺行情的基金不出现)
+    """
+    funds = table.join(ref[['nav_official', 'nav_date']], how='inner')
+    funds = funds[funds['nav_official'] > 0]
+    if funds.empty or quotes.empty:
+        return pd.Series(dtype=float, name='iopv_proxy')
+
+    nav_dates = funds['nav_date'].astype(str).str[:10].tolist()
+    price, anchor = _anchored(funds['proxy'].tolist(), nav_dates, quotes, anchors)
+    ratio = price / anchor
+
+    has_fx = (funds['fx'] != "").to_numpy()
+    fx_price, fx_anchor = _anchored(funds['fx'].tolist(), nav_dates, quotes, anchors)
+    fx_ratio = np.where(has_fx, fx_price / fx_anchor, 1.0)
+
+    weight = funds['weight'].to_numpy(dtype=float)
+    estimate = funds['nav_official'].to_numpy(dtype=float) * (1 + weight * (ratio * fx_ratio - 1))
+    estimate = pd.Series(estimate, index=funds.index, name='iopv_proxy').round(4)
+    return estimate[np.isfinite(estimate) & (estimate > 0)]
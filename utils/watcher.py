@@ -0,0 +1,189 @@
+import time
+
+from utils.data_fetcher import (NARROW_FETCH_MAX, apply_proxy_iopv, attach_lof_fees, build_lof_reference,
+                                classify_lofs, fetch_lof_iopv, fetch_lof_nav, fetch_lof_price,
+                                fetch_lof_reference_narrow, fetch_proxy_iopv)
+
+# --- 盘中盯盘配置 ---
+WATCH_INTERVAL = 10          # 行情轮询间隔(秒)
+WATCH_IOPV_REFRESH = 300     # 实时估值表刷新间隔(秒)
+WATCH_NAV_REFRESH = 3600     # 官方净值表刷新间隔(秒)，一个交易日内基本不变，由本地缓存兜底
+WATCH_ALERT_STEP = 1.0       # 已提醒过的机会，溢价(折价)幅度再扩大多少个百分点才再次提醒
+
+
+class LofWatcher:
+    """
+    LOF 盘中盯盘器
+    1. 每轮只拉取行情价格表，估值/净值表常驻内存，到期才刷新
+    2. 只对价格变动(或参考净值变动)的基金重算溢价率，不再三表重新合并
+       配置了代理标的的基金每轮重算代理估值 (一次批量行情请求)，估值跟着期货/指数实时走
+    3. 只把重算过的基金交给 filter_func 重新筛选，结果合并进上一轮的机会集 (筛选规则逐行独立，未变动的基金结论不变)
+       只有成交额变动、价格不变的基金沿用上一轮结论，下次价格变动时再按成交额门槛重评；代码列表变化时整表重新筛选
+    4. 新出现的机会或溢价率继续走高 WATCH_ALERT_STEP 的机会才提醒，避免刷屏
+
+    filter_func: 机会筛选函数，输入 LOF 大表，返回按 net_prem 排序的机会列表 (与 main.filter_opportunities 一致)
+    notify_func: 提醒回调，输入本轮需要提醒的机会列表
+    symbols: 只盯这些基金时传入 (如白名单)，估值/净值改为逐只窄抓取
+    """
+
+    def __init__(self, filter_func, notify_func, interval=WATCH_INTERVAL,
+                 iopv_refresh=WATCH_IOPV_REFRESH, nav_refresh=WATCH_NAV_REFRESH, alert_step=WATCH_ALERT_STEP,
+                 symbols=None):
+        self.filter_func = filter_func
+        self.notify_func = notify_func
+        self.interval = interval
+        self.iopv_refresh = iopv_refresh
+        self.nav_refresh = nav_refresh
+        self.alert_step = alert_step
+        self.symbols = None
+        if symbols is not None and len(symbols) <= NARROW_FETCH_MAX:
+            self.symbols = sorted({str(s) for s in symbols})
+
+        self.frame = None            # 按 symbol 索引的 LOF 大表 (含 premium_rate)
+        self.ref = None              # 按 symbol 索引的参考净值表 (含代理估值)
+        self._base_ref = None        # 估值/净值表合成的参考净值表 (不含代理估值)
+        self._df_iopv = None
+        self._df_nav = None
+        self._iopv_at = 0.0
+        self._nav_at = 0.0
+        self.alerted = {}            # {代码: 上次提醒时的溢价率}
+        self.opps = {}               # {代码: 机会}，增量合并后的当前机会集
+        self._dirty = None           # 上一次 apply_prices 重算过的代码，None 表示整表重建
+
+    # --- 参考净值 ---
+    def _refresh_reference(self, now):
+        """到期才重新拉取估值/净值表，代理估值每轮都重算；返回参考净值是否可能有变化"""
+        refreshed = False
+        if self.symbols is not None and (self._df_iopv is None or now - self._iopv_at >= self.iopv_refresh):
+            # 窄抓取一次同时拿到估值和净值，失败时本轮退回全表
+            reference = fetch_lof_reference_narrow(self.symbols)
+            if reference is not None:
+                self._df_iopv, self._df_nav = reference
+                self._iopv_at = self._nav_at = now
+                refreshed = True
+        if self._df_nav is None or now - self._nav_at >= self.nav_refresh:
+            self._df_nav = fetch_lof_nav()
+            self._nav_at = now
+            refreshed = True
+        if self._df_iopv is None or now - self._iopv_at >= self.iopv_refresh:
+            self._df_iopv = fetch_lof_iopv(use_cache=False)
+            self._iopv_at = now
+            refreshed = True
+        if refreshed or self._base_ref is None:
+            self._base_ref = build_lof_reference(self._df_iopv, self._df_nav)
+
+        proxy_iopv = fetch_proxy_iopv(self._base_ref)
+        self.ref = apply_proxy_iopv(self._base_ref, proxy_iopv)
+        return refreshed or not proxy_iopv.empty
+
+    # --- 增量更新 ---
+    @staticmethod
+    def _premium(frame):
+        return (frame['price'] - frame['iopv']) / frame['iopv'].where(frame['iopv'] > 0.001) * 100
+
+    def _rebuild(self, prices):
+        frame = prices.join(self.ref[['iopv', 'source']])
+        frame['premium_rate'] = self._premium(frame)
+        self.frame = frame
+        self._dirty = None
+        return len(frame)
+
+    def apply_prices(self, df_price, ref_changed=False):
+        """
+        用最新行情更新内存大表，只重算价格或参考净值变动的基金
+        代码列表变化时整表重建
+        返回：本轮重算溢价率的基金数量
+        """
+        prices = df_price.drop_duplicates('symbol').set_index('symbol')[['name', 'price', 'volume']]
+        if self.frame is None or not prices.index.sort_values().equals(self.frame.index.sort_values()):
+            return self._rebuild(prices)
+
+        prices = prices.reindex(self.frame.index)
+        self.frame['volume'] = prices['volume']
+        dirty = _changed(prices['price'], self.frame['price'])
+        self.frame['price'] = prices['price']
+
+        if ref_changed:
+            ref = self.ref[['iopv', 'source']].reindex(self.frame.index)
+            dirty |= _changed(ref['iopv'], self.frame['iopv'])
+            self.frame['iopv'] = ref['iopv']
+            self.frame['source'] = ref['source']
+
+        idx = dirty[dirty].index
+        self._dirty = idx
+        if idx.empty:
+            return 0
+        self.frame.loc[idx, 'premium_rate'] = self._premium(self.frame.loc[idx])
+        return len(idx)
+
+    def snapshot(self, symbols=None):
+        """当前可用于策略筛选的 LOF 大表 (与 fetch_lof_data 的输出同构)；symbols 给定时只取这些基金"""
+        frame = self.frame if symbols is None else self.frame.loc[symbols]
+        frame = frame.dropna(subset=['premium_rate'])
+        # 分类索引查表很快，只有出现新代码时才会请求基金类型；费率表只查本地，不在盘中刷新
+        return attach_lof_fees(classify_lofs(frame.rename_axis('symbol').reset_index()), refresh=False)
+
+    def rescore(self):
+        """
+        重新筛选上一次 apply_prices 重算过的基金，合并进机会集
+        返回：按净收益从高到低排列的当前全部机会
+        """
+        if self._dirty is None:
+            self.opps = {}
+            fresh = self.filter_func(self.snapshot())
+        else:
+            for code in self._dirty:
+                self.opps.pop(code, None)
+            fresh = self.filter_func(self.snapshot(self._dirty)) if len(self._dirty) else []
+        self.opps.update((item['code'], item) for item in fresh)
+        return sorted(self.opps.values(), key=lambda item: item['net_prem'], reverse=True)
+
+    # --- 提醒去重 ---
+    def select_alerts(self, opps):
+        """只保留新出现或溢价(折价)幅度继续扩大的机会，并更新提醒记录"""
+        alerts = []
+        current = {}
+        for item in opps:
+            code = item['code']
+            last = self.alerted.get(code)
+            if last is None or abs(item['premium']) >= abs(last) + self.alert_step:
+                alerts.append(item)
+                current[code] = item['premium']
+            else:
+                current[code] = last
+        # 跌出机会列表的基金清掉记录，下次重新出现时再提醒
+        self.alerted = current
+        return alerts
+
+    # --- 主循环 ---
+    def tick(self):
+        """执行一轮：刷新行情 -> 增量重算 -> 增量筛选 -> 提醒"""
+        now = time.monotonic()
+        ref_changed = self._refresh_reference(now)
+        df_price = fetch_lof_price(use_cache=False, symbols=self.symbols)
+        moved = self.apply_prices(df_price, ref_changed)
+
+        alerts = []
+        if moved:
+            alerts = self.select_alerts(self.rescore())
+            if alerts:
+                self.notify_func(alerts)
+        return moved, alerts
+
+    def run(self, keep_running=lambda: True):
+        """循环盯盘，直到 keep_running() 返回 False"""
+        print(f"👀 进入盯盘模式，每 {self.interval} 秒刷新一次行情...")
+        while keep_running():
+            start = time.monotonic()
+            try:
+                moved, alerts = self.tick()
+                print(f"   {time.strftime('%H:%M:%S')} 重算 {moved} 只，提醒 {len(alerts)} 条")
+            except Exception as e:
+                print(f"   ⚠️ 本轮刷新失败: {e}")
+            time.sleep(max(0.0, self.interval - (time.monotonic() - start)))
+        print("👋 盯盘结束。")
+
+
+def _changed(new, old):
+    """逐元素比较两列是否变化 (两边都是 NaN 视为未变)"""
+    return new.ne(old) & ~(new.isna() & old.isna())